@@ -0,0 +1,139 @@
+import csv
+import gzip
+import io
+import json
+import zlib
+from typing import IO, Iterator, Optional, Tuple, Union
+
+# ----------------------------
+# Supported upload formats
+# ----------------------------
+# Every format may also be uploaded gzip-compressed by appending ".gz".
+FORMATS = {
+    ".txt": "txt",
+    ".csv": "csv",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
+}
+SUPPORTED_EXTENSIONS = tuple(FORMATS) + tuple(f"{ext}.gz" for ext in FORMATS)
+
+# Header names recognised when no CSV column / NDJSON key is selected
+DEFAULT_FIELDS = ("domain", "host", "hostname", "fqdn")
+
+
+class BulkImportError(ValueError):
+    """Raised when an uploaded file cannot be decoded or parsed."""
+
+
+def detect_format(filename: str) -> Tuple[Optional[str], bool]:
+    """
+    Resolve the upload format from its file name.
+    :return: (format|None, gzip_compressed)
+    """
+    name = (filename or "").strip().lower()
+    compressed = name.endswith(".gz")
+    if compressed:
+        name = name[:-3]
+    for ext, fmt in FORMATS.items():
+        if name.endswith(ext):
+            return fmt, compressed
+    return None, compressed
+
+
+def _open_text(stream: IO[bytes], compressed: bool) -> IO[str]:
+    """Wrap a binary stream in an incremental (optionally gunzipping) text reader."""
+    if compressed:
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+    return io.TextIOWrapper(stream, encoding="utf-8", errors="strict", newline="")
+
+
+def _iter_txt(text: IO[str]) -> Iterator[str]:
+    for line in text:
+        yield line
+
+
+def _iter_csv(text: IO[str], column: Optional[Union[str, int]]) -> Iterator[str]:
+    reader = csv.reader(text)
+    first = next(reader, None)
+    if first is None:
+        return
+
+    header = [cell.strip().lower() for cell in first]
+    index, first_is_header = 0, False
+
+    if isinstance(column, str) and not column.strip().isdigit():
+        wanted = column.strip().lower()
+        if wanted not in header:
+            raise BulkImportError(f"CSV column '{column}' not found in header")
+        index, first_is_header = header.index(wanted), True
+    elif column is not None:
+        index = int(column)
+        first_is_header = index < len(header) and header[index] in DEFAULT_FIELDS
+    else:
+        for i, cell in enumerate(header):
+            if cell in DEFAULT_FIELDS:
+                index, first_is_header = i, True
+                break
+
+    if not first_is_header and index < len(first):
+        yield first[index]
+
+    for row in reader:
+        if index < len(row):
+            yield row[index]
+
+
+def _iter_ndjson(text: IO[str], column: Optional[Union[str, int]]) -> Iterator[str]:
+    keys = (str(column),) if column is not None else DEFAULT_FIELDS
+    for line in text:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            # Surface the raw line so it is reported as invalid instead of aborting the import
+            yield line
+            continue
+        if isinstance(item, str):
+            yield item
+        elif isinstance(item, dict):
+            yield next((str(item[k]) for k in keys if isinstance(item.get(k), str)), line)
+        else:
+            yield line
+
+
+def iter_domains(stream: IO[bytes], filename: str,
+                 column: Optional[Union[str, int]] = None) -> Iterator[str]:
+    """
+    Lazily yield raw (un-normalized) domain strings from an uploaded file.
+    Decompression, decoding and parsing all happen incrementally, so memory
+    stays bounded by the longest line instead of the file size.
+
+    :param stream: binary file-like object (e.g. werkzeug FileStorage.stream)
+    :param filename: original file name, used to pick the format
+    :param column: CSV header name / 0-based index, or NDJSON object key
+    """
+    fmt, compressed = detect_format(filename)
+    if fmt is None:
+        raise BulkImportError(
+            f"Unsupported file type; allowed: {', '.join(SUPPORTED_EXTENSIONS)}"
+        )
+
+    text = _open_text(stream, compressed)
+    try:
+        if fmt == "csv":
+            rows = _iter_csv(text, column)
+        elif fmt == "ndjson":
+            rows = _iter_ndjson(text, column)
+        else:
+            rows = _iter_txt(text)
+
+        for raw in rows:
+            raw = raw.strip()
+            if raw:
+                yield raw
+    except (OSError, EOFError, zlib.error, csv.Error, UnicodeError) as e:
+        raise BulkImportError(f"Could not read file: {e}") from e
+    finally:
+        text.detach()
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+
+from DomainModel import DomainRecord
+
+
+class ChangeLog:
+    """
+    Per-user, version-stamped log of domain upserts and deletes.
+
+    Every change made through the engine bumps the user's version and
+    appends one entry per affected domain; the last `capacity` entries per
+    user are kept. changes_since() collapses the entries after a client's
+    version into the current upserts and deletes. When the log cannot answer
+    (the version predates the retained entries or a whole-list replace, or
+    comes from an earlier process run) it asks the client to reload instead.
+    Versions are handed out as "<boot id>-<n>" tokens.
+    """
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity = capacity
+        self.boot_id = f"{int(time.time() * 1000):x}"
+        self._lock = threading.Lock()
+        self._versions: Dict[str, int] = {}
+        self._entries: Dict[str, Deque[Tuple[int, str, Optional[DomainRecord]]]] = {}
+        self._horizon: Dict[str, int] = {}    # changes at or before this version are not answerable
+
+    def version(self, user: str) -> int:
+        with self._lock:
+            return self._versions.get(user, 0)
+
+    def token(self, user: str) -> str:
+        return f"{self.boot_id}-{self.version(user)}"
+
+    def record(self, user: str, upserts: Iterable[DomainRecord] = (),
+               deletes: Iterable[str] = ()) -> int:
+        """Log one change (records are stored by reference and must not be mutated afterwards)."""
+        with self._lock:
+            version = self._versions.get(user, 0) + 1
+            self._versions[user] = version
+            log = self._entries.get(user)
+            if log is None:
+                log = self._entries[user] = deque()
+            for record in upserts:
+                log.append((version, record.domain, record))
+            for domain in deletes:
+                log.append((version, domain, None))
+            while len(log) > self.capacity:
+                dropped, _, _ = log.popleft()
+                self._horizon[user] = max(self._horizon.get(user, 0), dropped)
+            return version
+
+    def reset(self, user: str) -> int:
+        """Log a change that cannot be expressed as a delta (e.g. a whole-list replace)."""
+        with self._lock:
+            version = self._versions.get(user, 0) + 1
+            self._versions[user] = version
+            self._entries.pop(user, None)
+            self._horizon[user] = version
+            return version
+
+    def changes_since(self, user: str, token: Optional[str]) -> Dict[str, Any]:
+        """
+        Return {"version", "reset", "upserts", "deletes"} for the changes after
+        `token`; with reset=True the client must reload the whole list.
+        """
+        with self._lock:
+            current = self._versions.get(user, 0)
+            out = {"version": f"{self.boot_id}-{current}", "reset": False, "upserts": [], "deletes": []}
+
+            boot, _, number = (token or "").rpartition("-")
+            since = int(number) if boot == self.boot_id and number.isdigit() else None
+            if since is None or since > current or since < self._horizon.get(user, 0):
+                out["reset"] = True
+                return out
+
+            latest: Dict[str, Optional[DomainRecord]] = {}
+            for version, domain, record in reversed(self._entries.get(user, ())):
+                if version <= since:
+                    break
+                latest.setdefault(domain, record)
+        for domain, record in sorted(latest.items()):
+            if record is None:
+                out["deletes"].append(domain)
+            else:
+                out["upserts"].append(record.to_dict())
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"users": len(self._versions), "entries": sum(len(e) for e in self._entries.values())}
+
+
+def from_env() -> ChangeLog:
+    """Build a change log sized by DOMAIN_CHANGELOG_SIZE (entries kept per user)."""
+    return ChangeLog(capacity=int(os.environ.get("DOMAIN_CHANGELOG_SIZE", "1000")))
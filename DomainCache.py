@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from logger import setup_logger
+from DomainStorage import DomainStorage, user_key
+from DomainModel import DomainRecord, SortedDomainList
+
+logger = setup_logger("DomainCache")
+
+# Rough per-object overheads used to size cache entries without walking them
+_LIST_OVERHEAD = 56
+_RECORD_OVERHEAD = 72 + 28      # DomainRecord with 5 slots + expiry int (status/issuer are shared)
+_INDEX_OVERHEAD = 16 + 49 + 100  # key list slot, lowercased key str, dict slot
+_VALUE_OVERHEAD = 49
+
+
+def _record_size(record: DomainRecord) -> int:
+    """Approximate in-memory size (bytes) of one record, including its index slots."""
+    size = _RECORD_OVERHEAD + _INDEX_OVERHEAD + 2 * (_VALUE_OVERHEAD + len(record.domain))
+    if record.extra:
+        size += 232 + sum(len(k) + len(str(v)) + 2 * _VALUE_OVERHEAD for k, v in record.extra.items())
+    return size
+
+
+class _Entry:
+    __slots__ = ("records", "size", "dirty", "pending", "replaced", "version", "fingerprint", "checked_at",
+                 "flushing", "flushed")
+
+    def __init__(self, records: List[DomainRecord], fingerprint: Any):
+        self.records = SortedDomainList(records)
+        self.size = _LIST_OVERHEAD + sum(_record_size(r) for r in records)
+        self.dirty = False
+        self.pending: Dict[str, Optional[DomainRecord]] = {}    # unflushed changes, see apply_changes()
+        self.replaced = False           # the whole list was replaced since the last flush
+        self.version = 0
+        self.fingerprint = fingerprint
+        self.checked_at = time.monotonic()
+        self.flushing = False           # a flush is writing this entry to the backend
+        self.flushed = 0                # completed flushes, to spot fingerprints read before one
+
+
+class CachedStorage(DomainStorage):
+    """
+    Write-back cache in front of another DomainStorage.
+
+    Parsed lists are kept as SortedDomainList containers in an LRU bounded by
+    estimated byte size, so hot users are served from memory and single-domain
+    changes are applied in place without re-sorting. Writes only mark the entry
+    dirty; a background flusher persists dirty entries every `flush_interval`
+    seconds, or sooner once `flush_threshold` users are dirty. Entries are
+    revalidated against the backend fingerprint at most every
+    `revalidate_interval` seconds, so external edits (e.g. a file rewritten by
+    another process) are picked up.
+
+    Each entry remembers which domains changed since its last flush, and the
+    flusher writes only those (DomainStorage.apply_changes), so row-level
+    backends never rewrite a whole list. If the stored list changed
+    externally in the meantime, the pending changes are applied on top of
+    it and the entry is reloaded: acknowledged writes are never discarded.
+
+    Lists read from the backend are passed through `share` (if given), which
+    may swap records for equal shared objects (see HostRegistry.share).
+
+    Like every backend, callers serialise writes for the same user.
+    """
+
+    def __init__(self, backend: DomainStorage, max_bytes: int = 64 * 1024 * 1024,
+                 flush_interval: float = 1.0, flush_threshold: int = 32,
+                 revalidate_interval: float = 1.0,
+                 share: Optional[Callable[[List[DomainRecord]], List[DomainRecord]]] = None):
+        self.backend = backend
+        self.share = share
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.revalidate_interval = revalidate_interval
+
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stats = {"hits": 0, "misses": 0, "reloads": 0, "conflicts": 0,
+                       "evictions": 0, "flushes": 0, "flushed_users": 0}
+
+        if self.flush_interval > 0:
+            threading.Thread(target=self._flush_loop, name="domain-cache-flusher", daemon=True).start()
+        atexit.register(self.flush)
+
+    # ----------------------------
+    # Entry management
+    # ----------------------------
+    def _install(self, key: str, entry: _Entry) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict(keep=key)
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """Drop clean least-recently-used entries (except `keep`) until the byte budget is met."""
+        if self._bytes <= self.max_bytes:
+            return
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            if key != keep and not self._entries[key].dirty:
+                self._drop(key)
+                self._stats["evictions"] += 1
+        if self._bytes > self.max_bytes:
+            # Only dirty entries are left over budget: flush them so they can be evicted
+            self._wake.set()
+
+    def _entry(self, username: str) -> _Entry:
+        """Return the live cache entry for `username`, loading or revalidating as needed."""
+        key = user_key(username)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            due = entry is not None and now - entry.checked_at >= self.revalidate_interval
+            flushed = entry.flushed if entry is not None else 0
+
+        if entry is not None and due:
+            fingerprint = self.backend.fingerprint(key)
+            with self._lock:
+                if self._revalidate(key, entry, fingerprint, flushed, now):
+                    entry = None
+
+        if entry is not None:
+            with self._lock:
+                current = self._entries.get(key)
+                if current is not None:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return current
+
+        records = self.backend.load(key)
+        fingerprint = self.backend.fingerprint(key)
+        if self.share is not None:
+            records = self.share(records)
+        with self._lock:
+            self._stats["misses"] += 1
+            current = self._entries.get(key)
+            if current is not None:
+                return current
+            entry = _Entry(records, fingerprint)
+            self._install(key, entry)
+            return entry
+
+    def _revalidate(self, key: str, entry: _Entry, fingerprint: Any, flushed: int, now: float) -> bool:
+        """
+        Drop `entry` if the stored list no longer matches it (caller holds the
+        lock); return True if it was dropped. A dirty entry is kept and
+        flushed right away instead: the flusher merges its pending changes
+        into the external copy. `flushed` is entry.flushed when `fingerprint`
+        was read: a fingerprint taken during or before one of our own flushes
+        proves nothing.
+        """
+        if entry.flushing or entry.flushed != flushed:
+            return False
+        if fingerprint == entry.fingerprint or self._entries.get(key) is not entry:
+            entry.checked_at = now
+            return False
+        if entry.dirty:
+            self._wake.set()
+            return False
+        self._drop(key)
+        self._stats["reloads"] += 1
+        return True
+
+    def _mutate(self, username: str, change: Callable[[_Entry], Tuple[Optional[int], Any]]) -> Any:
+        """
+        Apply `change(entry) -> (size_delta|None, result)` in place to the
+        cached container, recording what it touched in entry.pending (or
+        setting entry.replaced). Returning None as the delta means nothing
+        changed.
+        """
+        key = user_key(username)
+        while True:
+            entry = self._entry(username)
+            with self._lock:
+                # Retry if the entry was evicted or invalidated in between
+                if self._entries.get(key) is not entry:
+                    continue
+                delta, result = change(entry)
+                if delta is None:
+                    return result
+                entry.size += delta
+                self._bytes += delta
+                entry.dirty = True
+                entry.version += 1
+                self._entries.move_to_end(key)
+                dirty = sum(1 for e in self._entries.values() if e.dirty)
+                break
+
+        if self.flush_interval <= 0:
+            self.flush(key)
+        elif dirty >= self.flush_threshold:
+            self._wake.set()
+        return result
+
+    # ----------------------------
+    # DomainStorage interface
+    # ----------------------------
+    def load(self, username: str) -> List[DomainRecord]:
+        entry = self._entry(username)
+        with self._lock:
+            return entry.records.records()
+
+    def page(self, username: str, **query: Any) -> Tuple[List[DomainRecord], Optional[Tuple], int]:
+        entry = self._entry(username)
+        with self._lock:
+            records, after = entry.records.page(**query)
+            return records, after, len(entry.records)
+
+    def save(self, username: str, records: List[DomainRecord]) -> None:
+        def change(entry):
+            old_size = sum(_record_size(r) for r in entry.records)
+            entry.records.reset(records)
+            entry.pending.clear()
+            entry.replaced = True
+            return sum(_record_size(r) for r in records) - old_size, None
+        self._mutate(username, change)
+
+    def insert(self, username: str, records: List[DomainRecord]) -> List[str]:
+        def change(entry):
+            added = [r for r in records if entry.records.add(r)]
+            if not added:
+                return None, []
+            entry.pending.update((r.domain.lower(), r) for r in added)
+            return sum(_record_size(r) for r in added), [r.domain for r in added]
+        return self._mutate(username, change)
+
+    def update(self, username: str, records: List[DomainRecord]) -> List[DomainRecord]:
+        def change(entry):
+            delta, changed = 0, []
+            for result in records:
+                old = entry.records.get(result.domain)
+                record = entry.records.merge(result) if old is not None else None
+                if record is not None:
+                    delta += _record_size(record) - _record_size(old)
+                    changed.append(record)
+                    entry.pending[record.domain.lower()] = record
+            # Unchanged scan results leave the entry clean: nothing to flush
+            return (delta if changed else None), changed
+        return self._mutate(username, change)
+
+    def delete(self, username: str, domains_to_remove: Iterable[str]) -> List[str]:
+        def change(entry):
+            removed = [r for r in (entry.records.remove(d) for d in set(domains_to_remove)) if r is not None]
+            if not removed:
+                return None, []
+            entry.pending.update((r.domain.lower(), None) for r in removed)
+            return -sum(_record_size(r) for r in removed), [r.domain for r in removed]
+        return self._mutate(username, change)
+
+    def list_users(self) -> List[str]:
+        with self._lock:
+            cached = set(self._entries)
+        return sorted(cached.union(self.backend.list_users()))
+
+    def fingerprint(self, username: str) -> Any:
+        """
+        The backend fingerprint. A clean cached copy that no longer matches it
+        is dropped right away, so data read next is at least as new as the
+        fingerprint (dirty copies are reconciled by the flusher as usual).
+        """
+        key = user_key(username)
+        with self._lock:
+            entry = self._entries.get(key)
+            flushed = entry.flushed if entry is not None else 0
+        fingerprint = self.backend.fingerprint(key)
+        with self._lock:
+            if entry is not None:
+                self._revalidate(key, entry, fingerprint, flushed, time.monotonic())
+        return fingerprint
+
+    # ----------------------------
+    # Write-back
+    # ----------------------------
+    def flush(self, key: Optional[str] = None) -> int:
+        """Persist dirty entries (all, or only `key`); return how many users were written."""
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                targets = []
+                for k, e in self._entries.items():
+                    if e.dirty and (key is None or k == key):
+                        # Until the new fingerprint is recorded, revalidation
+                        # must not mistake our own write for an external change
+                        targets.append((k, e, e.version, e.records.records() if e.replaced else None, e.pending))
+                        e.pending, e.replaced, e.flushing = {}, False, True
+
+            for k, entry, version, records, pending in targets:
+                try:
+                    conflict = self.backend.fingerprint(k) != entry.fingerprint
+                    if records is not None:
+                        self.backend.save(k, records)
+                    else:
+                        self.backend.apply_changes(k, pending)
+                    fingerprint = self.backend.fingerprint(k)
+                    stored = self.backend.load(k) if conflict else None
+                    if stored is not None and self.share is not None:
+                        stored = self.share(stored)
+                except Exception as e:
+                    logger.error(f"Failed to flush cached domains for {k}: {e}")
+                    with self._lock:
+                        # Keep the changes for the next attempt (a newer whole-list save covers them)
+                        if records is not None:
+                            entry.replaced = True
+                        elif not entry.replaced:
+                            entry.pending = {**pending, **entry.pending}
+                        entry.flushing = False
+                    continue
+                with self._lock:
+                    if stored is not None:
+                        logger.warning(f"{k}: stored list changed externally; merged unflushed cached changes into it")
+                        self._stats["conflicts"] += 1
+                        self._reload(k, entry, stored)
+                    entry.fingerprint = fingerprint
+                    entry.checked_at = time.monotonic()
+                    entry.flushing = False
+                    entry.flushed += 1
+                    if entry.version == version:
+                        entry.dirty = False
+                written += 1
+
+            with self._lock:
+                self._stats["flushes"] += 1
+                self._stats["flushed_users"] += written
+                self._evict()
+        return written
+
+    def _reload(self, key: str, entry: _Entry, stored: List[DomainRecord]) -> None:
+        """Replace `entry`'s records with `stored` plus the changes made since its flush began (lock held)."""
+        if entry.replaced:
+            return
+        records = SortedDomainList(stored)
+        for domain, record in entry.pending.items():
+            records.remove(domain)
+            if record is not None:
+                records.add(record)
+        size = _LIST_OVERHEAD + sum(_record_size(r) for r in records)
+        if self._entries.get(key) is entry:
+            self._bytes += size - entry.size
+        entry.records, entry.size = records, size
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Domain cache flush failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/flush counters and current occupancy."""
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "dirty": sum(1 for e in self._entries.values() if e.dirty),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def from_env(backend: DomainStorage,
+             share: Optional[Callable[[List[DomainRecord]], List[DomainRecord]]] = None) -> DomainStorage:
+    """
+    Wrap `backend` in a CachedStorage (with `share`) configured from the environment:
+    DOMAIN_CACHE_BYTES (0 disables the cache), DOMAIN_CACHE_FLUSH_INTERVAL
+    (seconds, 0 = write-through), DOMAIN_CACHE_FLUSH_THRESHOLD (dirty users)
+    and DOMAIN_CACHE_REVALIDATE (seconds between external-change checks).
+    """
+    max_bytes = int(os.environ.get("DOMAIN_CACHE_BYTES", str(64 * 1024 * 1024)))
+    if max_bytes <= 0:
+        return backend
+    return CachedStorage(
+        backend,
+        max_bytes=max_bytes,
+        flush_interval=float(os.environ.get("DOMAIN_CACHE_FLUSH_INTERVAL", "1.0")),
+        flush_threshold=int(os.environ.get("DOMAIN_CACHE_FLUSH_THRESHOLD", "32")),
+        revalidate_interval=float(os.environ.get("DOMAIN_CACHE_REVALIDATE", "1.0")),
+        share=share,
+    )
@@ -0,0 +1,113 @@
+import calendar
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set
+from DomainModel import DomainRecord, DomainStatus
+
+# ----------------------------
+# Export formats
+# ----------------------------
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+EXPORT_FIELDS = ["domain", "status", "ssl_expiration", "ssl_issuer"]
+
+
+class ExportError(ValueError):
+    """Raised for invalid export parameters (e.g. an unknown status or malformed window)."""
+
+
+def parse_statuses(statuses: Optional[Iterable[str]]) -> Set[DomainStatus]:
+    """Parse status names (case-insensitive); an empty result means "any status"."""
+    wanted = set()
+    for name in statuses or []:
+        if name and name.strip():
+            status = DomainStatus.parse(name.strip())
+            if status.value.lower() != name.strip().lower():
+                raise ExportError(f"Unknown status: {name.strip()}")
+            wanted.add(status)
+    return wanted
+
+
+def parse_horizon(expires_within: Optional[str]) -> Optional[int]:
+    """Turn an 'expires within N days' parameter into an epoch horizon (None = no limit)."""
+    if expires_within in (None, ""):
+        return None
+    try:
+        days = int(expires_within)
+    except (TypeError, ValueError):
+        raise ExportError("'expires_within' must be an integer number of days")
+    if days < 0:
+        raise ExportError("'expires_within' must not be negative")
+    horizon_date = datetime.now(timezone.utc).date() + timedelta(days=days)
+    return calendar.timegm(horizon_date.timetuple())
+
+
+def build_filter(statuses: Optional[Iterable[str]] = None,
+                 expires_within: Optional[str] = None) -> Callable[[DomainRecord], bool]:
+    """
+    Build a row predicate from the export query parameters.
+    :param statuses: keep only these statuses (case-insensitive); None keeps all
+    :param expires_within: keep only certificates expiring within N days
+                           (already expired certificates are included)
+    """
+    wanted = parse_statuses(statuses)
+    horizon = parse_horizon(expires_within)
+
+    def predicate(record: DomainRecord) -> bool:
+        if wanted and record.status not in wanted:
+            return False
+        if horizon is not None and not 0 < record.expires_at <= horizon:
+            return False
+        return True
+
+    return predicate
+
+
+def iter_rows(dme, usernames: Iterable[str],
+              predicate: Callable[[DomainRecord], bool],
+              with_username: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Lazily yield filtered export rows, one user at a time, so memory is
+    bounded by the largest single user rather than by the whole export.
+    """
+    for username in usernames:
+        for record in dme.list_domains(username):
+            if not predicate(record):
+                continue
+            row = record.to_dict()
+            row = {field: row[field] for field in EXPORT_FIELDS}
+            if with_username:
+                row = {"username": username, **row}
+            yield row
+
+
+def ndjson_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Serialize rows as newline-delimited JSON, one line per row."""
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def csv_lines(rows: Iterable[Dict[str, Any]], fields: List[str]) -> Iterator[str]:
+    """Serialize rows as CSV (header first), reusing a single small buffer."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields, extrasaction="ignore")
+
+    writer.writeheader()
+    for row in rows:
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(row)
+    yield buf.getvalue()
+
+
+def render(fmt: str, rows: Iterable[Dict[str, Any]], with_username: bool = False) -> Iterator[str]:
+    """Return a chunk generator for `rows` in the requested format."""
+    if fmt == "csv":
+        fields = (["username"] if with_username else []) + EXPORT_FIELDS
+        return csv_lines(rows, fields)
+    return ndjson_lines(rows)
@@ -1,17 +1,60 @@
 from __future__ import annotations
 
-import json
 import os
 import re
+import time
+import zlib
 from datetime import datetime, timezone
-from threading import RLock
-from typing import Dict, List, Tuple, Any, Optional
+from typing import IO, Dict, Iterable, List, Tuple, Any, Optional
 from logger import setup_logger
+import BulkImport
+import ChangeLog
+import DomainCache
+import StatusHistory
+from DomainStorage import DomainStorage, create_storage, user_key
+from UserLocks import LockTable
+from DomainModel import PROBE_FIELDS, DomainRecord, epoch_to_expiry
+from HostRegistry import HostRegistry
+from StatusTable import StatusTable
+from ExpiryIndex import ExpiryIndex
+from DomainSearch import DomainSearchIndex
+from RollingStats import RollingStats
 
 # ----------------------------
-# Thread-safety for file IO
+# Thread-safety for storage IO
 # ----------------------------
-_lock = RLock()
+# Per-user readers/writer locks, striped by username hash: dashboard reads
+# never block each other and one user's writes do not stall other users.
+_locks = LockTable(stripes=int(os.environ.get("DOMAIN_LOCK_STRIPES", "64")))
+
+# ----------------------------
+# Unique hosts shared by all users
+# ----------------------------
+# Each host (and its latest probe result) is kept once per process; users
+# only hold subscriptions to it, and cached lists reference its record
+# instead of holding a copy. Per-user files keep their existing format.
+_hosts = HostRegistry()
+
+# Column snapshot of every loaded user's records for cross-user queries
+_status_table = StatusTable()
+
+# Day-bucketed certificate expiries, per user and global
+_expiry = ExpiryIndex()
+
+# Reversed-label tries for suffix/prefix/substring search, built on first search
+_search = DomainSearchIndex()
+
+# Rolling 24h/7d/30d uptime and latency per host, updated on every probe
+_rolling = RollingStats()
+
+# ----------------------------
+# Per-user list versions and change feed
+# ----------------------------
+# Every change made through the engine bumps the user's version and is logged
+# as upserts/deletes. The version (with the storage fingerprint, which catches
+# changes made elsewhere) is also the list's ETag.
+_changes = ChangeLog.from_env()
+
 
 # ----------------------------
 # Base directory for per-user JSON files
@@ -19,6 +62,9 @@ _lock = RLock()
 BASE_DIR = os.path.dirname(__file__)
 USERS_DATA_DIR = os.path.join(BASE_DIR, "UsersData")
 
+# Append-only per-host probe history (raw, hourly and daily segments), fed by scans
+_history = StatusHistory.from_env(os.path.join(USERS_DATA_DIR, "history"))
+
 
 def _utc_now_iso() -> str:
     """Return current UTC timestamp in ISO-8601 with 'Z' suffix."""
@@ -27,22 +73,30 @@ def _utc_now_iso() -> str:
 
 def _domains_path(username: str) -> str:
     """Generate per-user JSON file path."""
-    safe_user = re.sub(r"[^A-Za-z0-9_.-]", "_", username.strip())
-    return os.path.join(USERS_DATA_DIR, f"{safe_user}_domains.json")
+    return os.path.join(USERS_DATA_DIR, f"{user_key(username)}_domains.json")
+
+
+def _new_record(host: str) -> DomainRecord:
+    """Return the record stored for a freshly added (not yet scanned) domain."""
+    return DomainRecord(host)
 
 
 class DomainManagementEngine:
     """
-    File-backed user domain storage and domain validation/CRUD.
+    User domain storage and domain validation/CRUD.
+
+    Persistence is delegated to a DomainStorage backend: per-user JSON files
+    (default) or SQLite, selected with the DOMAIN_STORAGE environment variable,
+    fronted by an in-memory write-back cache (see DomainCache).
 
-    JSON structure example (UsersData/alex_domains.json):
+    Domains are handled as DomainRecord objects; their JSON form
+    (UsersData/alex_domains.json and the API) is:
     [
         {
-          "host": "example.com",
-          "added_at": "2025-09-15T12:34:56.000Z",
-          "last_check": "2025-09-15T14:10:40.000Z",
-          "http": null,
-          "ssl":  null
+          "domain": "example.com",
+          "status": "Live",
+          "ssl_expiration": "2026-01-05",
+          "ssl_issuer": "Google Trust Services"
         }
     ]
     
@@ -53,8 +107,14 @@ class DomainManagementEngine:
         r"^(?=.{1,253}$)(?!-)([A-Za-z0-9-]{1,63}(?<!-)\.)+[A-Za-z]{2,63}$"
     )
 
-    def __init__(self):
+    def __init__(self, storage: Optional[DomainStorage] = None):
         os.makedirs(USERS_DATA_DIR, exist_ok=True)
+        self.storage = storage or DomainCache.from_env(create_storage(USERS_DATA_DIR), share=_hosts.share)
+        self.hosts = _hosts
+        self.status_table = _status_table
+        self.expiry = _expiry
+        self.history = _history
+        self.rolling = _rolling
 
     @staticmethod
     def _normalize_domain(raw: str) -> str:
@@ -99,44 +159,252 @@ class DomainManagementEngine:
         """Return a fresh user document structure."""
         return {"username": username, "domains": []}
 
-    def load_user_domains(self, username: str) -> List[Dict[str, Any]]:
+    def load_user_domains(self, username: str) -> List[DomainRecord]:
+        """
+        Load (or initialize) user's domain list, sorted by domain.
+        With the JSON backend the file contains only a list of domain objects.
+        """
+        with _locks.read(user_key(username)):
+            records = self.storage.load(username)
+        if not _hosts.is_loaded(user_key(username)):
+            self.sync_hosts(username, records)
+        return records
+
+    def _ensure_hosts(self, username: str) -> None:
+        """Register the user's stored hosts before applying incremental subscription changes."""
+        if not _hosts.is_loaded(user_key(username)):
+            self.sync_hosts(username, self.storage.load(username))
+
+    def sync_hosts(self, username: str, records: List[DomainRecord]) -> None:
+        """Make the user's host subscriptions and in-memory indexes match `records` (e.g. after external edits)."""
+        _hosts.sync_user(user_key(username), records)
+        _status_table.replace_user(user_key(username), records)
+        _expiry.replace_user(user_key(username), records)
+        _search.sync(user_key(username), (r.domain for r in records))
+
+    @staticmethod
+    def _index_added(username: str, records: List[DomainRecord]) -> None:
+        """Register freshly inserted records in the change feed and the in-memory indexes."""
+        if not records:
+            return
+        domains = [r.domain for r in records]
+        _changes.record(user_key(username), upserts=records)
+        _hosts.subscribe(user_key(username), records)
+        _status_table.upsert(user_key(username), records)
+        _search.add(user_key(username), domains)
+
+    @staticmethod
+    def _index_removed(username: str, domains: List[str]) -> None:
+        if not domains:
+            return
+        _changes.record(user_key(username), deletes=domains)
+        _hosts.unsubscribe(user_key(username), domains)
+        _status_table.remove(user_key(username), domains)
+        _expiry.remove(user_key(username), domains)
+        _search.remove(user_key(username), domains)
+        _rolling.discard([d for d in domains if not _hosts.subscribers(d)])
+
+    def save_user_domains(self, username: str, data: List[DomainRecord]) -> None:
+        """Replace the user's whole domain list in storage."""
+        with _locks.write(user_key(username)):
+            self.storage.save(username, data)
+            self.sync_hosts(username, data)
+            _changes.reset(user_key(username))
+
+    def update_domains(self, username: str, records: List[DomainRecord]) -> int:
+        """
+        Merge scan results into the stored records that match them by domain.
+        Only records whose status, expiry or issuer changed are written (extra
+        fields are kept); domains removed in the meantime are not re-created
+        and a scan that changed nothing writes nothing.
+        :return: number of records changed
         """
-        Load (or initialize) user's domain list.
-        The JSON file contains only a list of domain objects.
+        with _locks.write(user_key(username)):
+            self._ensure_hosts(username)
+            changed = self.storage.update(username, records)
+            _status_table.update(user_key(username), records, checked_at=time.time())
+            if changed:
+                _expiry.update(user_key(username), changed)
+                _changes.record(user_key(username), upserts=changed)
+            return len(changed)
+
+    def set_probe_profile(self, username: str, raw_domain: str, profile: str,
+                          reported: Iterable[str] = PROBE_FIELDS) -> Optional[DomainRecord]:
         """
-        path = _domains_path(username)
-        with _lock:
-            if not os.path.exists(path):
-                os.makedirs(USERS_DATA_DIR, exist_ok=True)
-                with open(path, "w", encoding="utf-8") as f:
-                    json.dump([], f, ensure_ascii=False, indent=2)
-                return []
-
-            with open(path, "r", encoding="utf-8") as f:
-                try:
-                    data = json.load(f)
-                    if not isinstance(data, list):
-                        data = []
-                except json.JSONDecodeError:
-                    data = []
-            return sorted(data, key=lambda x: x["domain"].lower())
-
-
-    def save_user_domains(self, username: str, data: List[Dict[str, Any]]) -> None:
-        """Save user's domain list to disk."""
-        path = _domains_path(username)
-        with _lock:
-            os.makedirs(USERS_DATA_DIR, exist_ok=True)
-            with open(path, "w", encoding="utf-8") as f:
-                json.dump(sorted(data, key=lambda x: x["domain"].lower()), 
-                          f, ensure_ascii=False, indent=2)
-
-    def list_domains(self, username: str) -> List[Dict[str, Any]]:
+        Choose how one of the user's domains is probed (a ProbePipeline
+        profile name, "default" for the deployment's default); it is kept in
+        the record's "probe_profile" field. Probe fields the new profile does
+        not report (not in `reported`) are cleared; the others are kept.
+        :return: the updated record, or None if the user does not monitor the domain
+        """
+        domain = self._normalize_domain(raw_domain)
+        with _locks.write(user_key(username)):
+            current = next((r for r in self.storage.load(username) if r.domain.lower() == domain), None)
+            if current is None:
+                return None
+            kept = set(reported)
+            extra = {k: v for k, v in (current.extra or {}).items() if k not in PROBE_FIELDS or k in kept}
+            extra["probe_profile"] = profile
+            record = DomainRecord(current.domain, current.status, current.expires_at, current.issuer, extra)
+            changed = self.storage.update(username, [record])
+            if changed:
+                _changes.record(user_key(username), upserts=changed)
+                return changed[0]
+            return current
+
+    def domains_version(self, username: str) -> str:
+        """
+        Opaque token that changes whenever the user's domain list changes,
+        computed without loading the list (usable as an HTTP ETag).
+        """
+        with _locks.read(user_key(username)):
+            version = _changes.token(user_key(username))
+            fingerprint = self.storage.fingerprint(username)
+        stored = zlib.crc32(f"{user_key(username)}:{fingerprint!r}".encode("utf-8"))
+        return f"{version}-{stored:08x}"
+
+    def change_token(self, username: str) -> str:
+        """Current change-feed version of the user's list (pass it back to changes_since)."""
+        return _changes.token(user_key(username))
+
+    def changes_since(self, username: str, token: Optional[str]) -> Dict[str, Any]:
+        """
+        Changes made through the engine after `token`:
+        {"version", "reset", "upserts": [record dicts], "deletes": [domains]}.
+        With reset=True the delta is unavailable and the whole list must be reloaded.
+        """
+        with _locks.read(user_key(username)):
+            return _changes.changes_since(user_key(username), token)
+
+    def list_domains(self, username: str) -> List[DomainRecord]:
         return self.load_user_domains(username)
 
+    def page_domains(self, username: str, **query: Any) -> Tuple[List[DomainRecord], Optional[Tuple], int]:
+        """
+        Return one page of the user's domains from the sorted indexes, the
+        sort key to continue after (None on the last page) and the total
+        number of domains. See DomainPaging.parse_args for the query.
+        """
+        with _locks.read(user_key(username)):
+            return self.storage.page(username, **query)
+
+    @staticmethod
+    def lock_stats() -> Dict[str, Any]:
+        """Return per-mode lock acquisition and wait-time counters."""
+        return _locks.stats()
+
+    def cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Return cache hit/miss/flush counters, or None when the cache is disabled."""
+        stats = getattr(self.storage, "stats", None)
+        return stats() if stats else None
+
+    def storage_stats(self) -> Optional[Dict[str, Any]]:
+        """Return backend write counters (group commit), if the backend keeps any."""
+        backend = getattr(self.storage, "backend", self.storage)
+        stats = getattr(backend, "writer_stats", None)
+        return stats() if stats else None
+
+    @staticmethod
+    def host_stats() -> Dict[str, Any]:
+        """Return unique-host and subscription counts of the shared host registry."""
+        return {**_hosts.stats(), "status_table": _status_table.stats(),
+                "expiry_index": _expiry.stats(), "search": _search.stats(), "changes": _changes.stats(),
+                "history": _history.stats(), "rolling": _rolling.stats()}
+
+    def is_monitored(self, raw_domain: str) -> bool:
+        """True if any user (whose list has been loaded) monitors this domain."""
+        return _hosts.is_monitored(self._normalize_domain(raw_domain))
+
+    def search_domains(self, username: str, query: str, mode: str = "suffix",
+                       limit: int = 100) -> Dict[str, Any]:
+        """
+        Search the user's domains: "suffix" ("example.co.il" or "*.example.co.il"),
+        "prefix" or "substring". Raises DomainSearch.SearchError for bad queries.
+        :return: {"results": [domain, ...], "total": n|None}
+        """
+        with _locks.read(user_key(username)):
+            return _search.search(user_key(username),
+                                  lambda: [r.domain for r in self.storage.load(username)],
+                                  query, mode, limit)
+
+    def domain_history(self, username: str, raw_domain: str, since: int, until: int,
+                       resolution: str = "hour") -> Optional[List[Dict[str, Any]]]:
+        """
+        Probe history of one of the user's domains between `since` and `until`
+        (epoch): raw probes, or hourly/daily uptime and latency buckets.
+        :return: the points, or None if the user does not monitor the domain
+        """
+        domain = self._normalize_domain(raw_domain)
+        with _locks.read(user_key(username)):
+            self._ensure_hosts(username)
+        host_id = _hosts.host_id(domain)
+        if host_id is None or host_id not in _hosts.user_host_ids(user_key(username)):
+            return None
+        if resolution == "raw":
+            return _history.samples(domain, since, until)
+        return _history.buckets(domain, since, until, resolution)
+
+    def uptime(self, username: str, domains: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Rolling 24h/7d/30d uptime and latency percentiles of the user's
+        domains (only `domains` if given), keyed by domain; domains that were
+        never probed are left out.
+        """
+        owned = {r.domain for r in self.load_user_domains(username)}
+        return _rolling.summaries(owned if domains is None else owned.intersection(domains))
+
+    @staticmethod
+    def uptime_overview(limit: int = 20) -> Dict[str, Any]:
+        """Rolling aggregates over every monitored host and the `limit` least available ones."""
+        return _rolling.overview(limit)
+
+    def upcoming_expirations(self, username: Optional[str] = None, limit: int = 50,
+                             until: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Certificates expiring from today on (up to `until`, epoch), soonest
+        first, for one user or - with username=None - for every loaded user.
+        """
+        owner = None
+        if username is not None:
+            self.load_user_domains(username)      # make sure the user is indexed
+            owner = user_key(username)
+        today = int(time.time()) // 86400 * 86400
+        return [{
+            "username": row["username"],
+            "domain": row["domain"],
+            "ssl_expiration": epoch_to_expiry(row["expires_at"]),
+            "days_left": (row["expires_at"] - today) // 86400,
+        } for row in _expiry.upcoming(today, limit, until, owner=owner)]
+
+    def warm_hosts(self) -> int:
+        """
+        Register every stored user's hosts and status rows, and refill the
+        rolling aggregates from the probe history (hourly rollups for the
+        days whose raw probes were compacted); return the number of users
+        loaded.
+        """
+        users = self.list_users()
+        for username in users:
+            self.load_user_domains(username)
+        if not _rolling.stats()["hosts"]:
+            since = int(time.time()) - 30 * 86400
+            _rolling.load_rollups(_history.replay_rollups(since))
+            _rolling.load(_history.replay(since))
+        return len(users)
+
+    def flush(self, username: Optional[str] = None) -> None:
+        """Write any cached, not yet persisted changes (of every user, or only `username`) to storage."""
+        flush = getattr(self.storage, "flush", None)
+        if flush:
+            flush(user_key(username) if username is not None else None)
+
+    def list_users(self) -> List[str]:
+        """Return the (storage-safe) usernames that have a domain list, sorted."""
+        return self.storage.list_users()
+
     def set_last_full_check_now(self, username: str) -> None:
         """Update last full check timestamp (to be called after MonitoringSystem run)."""
-        with _lock:
+        with _locks.write(user_key(username)):
             data = self.load_user_domains(username)
             data["last_full_check"] = _utc_now_iso()
             self.save_user_domains(username, data)
@@ -146,33 +414,20 @@ class DomainManagementEngine:
         if not ok or not host:
             return False
 
-        with _lock:
-            domains = self.load_user_domains(username)
-            existing = {d.get("domain") for d in domains}
-            if host in existing:
-                return False
-
-            domains.append({
-                "domain": host,
-                "status": "Pending",
-                "ssl_expiration": "N/A",
-                "ssl_issuer": "N/A"
-            })
+        with _locks.write(user_key(username)):
+            self._ensure_hosts(username)
+            record = _new_record(host)
+            inserted = self.storage.insert(username, [record])
+            self._index_added(username, [record] if inserted else [])
+            return bool(inserted)
 
-            self.save_user_domains(username, domains)
-            return True
 
-
-    def bulk_upload(self, username: str, file_path: str) -> Dict[str, Any]:
+    def bulk_upload(self, username: str, file_path: str, column: Optional[str] = None) -> Dict[str, Any]:
         """
-        Bulk upload domains from a text file.
-        Each valid line is added as:
-        {
-            "domain": "<domain>",
-            "status": "Pending",
-            "ssl_expiration": "N/A",
-            "ssl_issuer": "N/A"
-        }
+        Bulk upload domains from a file on disk.
+        Accepts every format supported by BulkImport (.txt, .csv, .ndjson/.jsonl
+        and their .gz variants).
+        Each valid entry is added as a Pending DomainRecord with no SSL details.
         Returns a summary dict.
         """
         logger = setup_logger("bulk_upload")
@@ -182,43 +437,61 @@ class DomainManagementEngine:
             return {"ok": False, "error": "File not found"}
 
         try:
-            with open(file_path, "r", encoding="utf-8") as f:
-                domains_to_add = [line.strip().lower() for line in f if line.strip()]
-        except Exception as e:
+            with open(file_path, "rb") as f:
+                result = self.bulk_upload_stream(username, f, os.path.basename(file_path), column)
+        except OSError as e:
             logger.exception(f"Failed to read bulk upload file: {e}")
             return {"ok": False, "error": "Could not read file"}
 
-        if not domains_to_add:
+        if result.get("ok") and not any(result["summary"].values()):
             return {"ok": False, "error": "File is empty or invalid"}
+        return result
 
-        added, duplicates, invalid = [], [], []
+    def bulk_upload_stream(self, username: str, stream: IO[bytes], filename: str,
+                           column: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Bulk upload domains from a binary stream (e.g. an uploaded file).
+        The stream is decompressed and parsed incrementally and all new
+        domains are inserted in a single storage call.
+        :param column: CSV column (header name or 0-based index) / NDJSON key
+        Returns a summary dict.
+        """
+        logger = setup_logger("bulk_upload")
 
-        with _lock:
-            domains = self.load_user_domains(username)
-            existing = {d.get("domain") for d in domains}
+        added, duplicates, invalid = [], [], []
+        candidates, seen = [], set()
 
-            for raw in domains_to_add:
+        try:
+            for raw in BulkImport.iter_domains(stream, filename, column):
                 ok, normalized, reason = self.validate_domain(raw)
                 if not ok or not normalized:
                     logger.warning(f"Invalid domain skipped: {raw} ({reason})")
                     invalid.append({"input": raw, "reason": reason})
                     continue
 
-                if normalized in existing:
+                if normalized in seen:
                     logger.warning(f"Duplicate domain skipped: {normalized}")
                     duplicates.append(normalized)
                     continue
 
-                domains.append({
-                    "domain": normalized,
-                    "status": "Pending",
-                    "ssl_expiration": "N/A",
-                    "ssl_issuer": "N/A"
-                })
-                added.append(normalized)
-                existing.add(normalized)
-
-            self.save_user_domains(username, domains)
+                seen.add(normalized)
+                candidates.append(normalized)
+        except BulkImport.BulkImportError as e:
+            logger.error(f"Bulk upload failed for {username}: {e}")
+            return {"ok": False, "error": str(e)}
+
+        with _locks.write(user_key(username)):
+            self._ensure_hosts(username)
+            records = [_new_record(d) for d in candidates]
+            inserted = set(self.storage.insert(username, records))
+            self._index_added(username, [r for r in records if r.domain in inserted])
+
+        for domain in candidates:
+            if domain in inserted:
+                added.append(domain)
+            else:
+                logger.warning(f"Duplicate domain skipped: {domain}")
+                duplicates.append(domain)
 
         summary = {
             "ok": True,
@@ -228,7 +501,8 @@ class DomainManagementEngine:
                 "invalid": invalid
             }
         }
-        logger.info(f"Bulk upload summary for {username}: {summary}")
+        logger.info(f"Bulk upload summary for {username}: {len(added)} added, "
+                    f"{len(duplicates)} duplicates, {len(invalid)} invalid")
         return summary
 
     def remove_domains(self, username: str, hosts: List[str]) -> Dict[str, List[str]]:
@@ -240,20 +514,13 @@ class DomainManagementEngine:
         to_remove = {self._normalize_domain(h) for h in (hosts or []) if h and h.strip()}
         to_remove.discard("")
 
-        removed, not_found = [], []
-
-        with _lock:
-            domains = self.load_user_domains(username)
-            current = {d.get("domain") for d in domains}
-
-            # Remove matching entries
-            new_list = [d for d in domains if d.get("domain") not in to_remove]
-            removed = list(current.intersection(to_remove))
-
-            # Track domains that didn't exist
-            not_found = list(to_remove - current)
+        with _locks.write(user_key(username)):
+            self._ensure_hosts(username)
+            removed = self.storage.delete(username, to_remove)
+            self._index_removed(username, removed)
 
-            self.save_user_domains(username, new_list)
+        # Track domains that didn't exist
+        not_found = list(to_remove - set(removed))
 
         return {"removed": removed, "not_found": not_found}
 
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import calendar
+import sys
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from enum import Enum
+from heapq import merge
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+NOT_AVAILABLE = "N/A"
+EXPIRY_FORMAT = "%Y-%m-%d"
+
+
+class DomainStatus(Enum):
+    """Monitoring status of a domain; the value is what the API and UI show."""
+    PENDING = "Pending"
+    LIVE = "Live"
+    DOWN = "Down"
+    EXPIRED_SSL = "Expired SSL"
+
+    def __str__(self) -> str:
+        return self.value
+
+    @classmethod
+    def _missing_(cls, value: Any) -> Optional["DomainStatus"]:
+        text = str(value).strip().lower()
+        return next((s for s in cls if s.value.lower() == text), None)
+
+    @classmethod
+    def parse(cls, value: Any) -> "DomainStatus":
+        """Parse a stored status string; unknown or empty values count as Pending."""
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.PENDING
+
+    @property
+    def code(self) -> int:
+        """Small integer code (declaration order), e.g. for compact columns."""
+        return _STATUS_CODES[self]
+
+
+_STATUS_CODES = {status: i for i, status in enumerate(DomainStatus)}
+STATUS_BY_CODE = list(DomainStatus)
+
+
+def expiry_to_epoch(value: Any) -> int:
+    """Parse a stored 'YYYY-MM-DD' expiration into epoch seconds (UTC); 'N/A'/garbage -> 0."""
+    try:
+        return calendar.timegm(datetime.strptime(str(value), EXPIRY_FORMAT).timetuple())
+    except ValueError:
+        return 0
+
+
+def epoch_to_expiry(epoch: int) -> str:
+    """Format epoch seconds as the stored 'YYYY-MM-DD' expiration (0 -> 'N/A')."""
+    if not epoch:
+        return NOT_AVAILABLE
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).strftime(EXPIRY_FORMAT)
+
+
+class DomainRecord:
+    """
+    One monitored domain of one user.
+
+    Compact replacement for the per-domain dict: the status is an enum, the
+    certificate expiry is an epoch int (0 = unknown) and the issuer string is
+    interned, so the handful of distinct issuers is stored once. Any unknown
+    keys read from storage are kept in `extra` and written back unchanged.
+    to_dict()/from_dict() convert to and from the JSON/API shape:
+    {"domain", "status", "ssl_expiration", "ssl_issuer"}.
+    """
+
+    __slots__ = ("domain", "status", "expires_at", "issuer", "extra")
+
+    def __init__(self, domain: str, status: DomainStatus = DomainStatus.PENDING,
+                 expires_at: int = 0, issuer: str = NOT_AVAILABLE,
+                 extra: Optional[Dict[str, Any]] = None):
+        self.domain = domain
+        self.status = status
+        self.expires_at = expires_at
+        self.issuer = sys.intern(issuer)
+        self.extra = extra or None
+
+    @property
+    def ssl_expiration(self) -> str:
+        return epoch_to_expiry(self.expires_at)
+
+    @property
+    def ssl_issuer(self) -> str:
+        return self.issuer
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DomainRecord":
+        extra = {k: v for k, v in data.items() if k not in _DICT_FIELDS}
+        return cls(
+            domain=str(data["domain"]),
+            status=DomainStatus.parse(data.get("status")),
+            expires_at=expiry_to_epoch(data.get("ssl_expiration")),
+            issuer=str(data.get("ssl_issuer") or NOT_AVAILABLE),
+            extra=extra,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "domain": self.domain,
+            "status": self.status.value,
+            "ssl_expiration": self.ssl_expiration,
+            "ssl_issuer": self.issuer,
+        }
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, DomainRecord):
+            return NotImplemented
+        return (self.domain, self.status, self.expires_at, self.issuer, self.extra) == \
+               (other.domain, other.status, other.expires_at, other.issuer, other.extra)
+
+    __hash__ = None
+
+    def merged(self, result: "DomainRecord") -> "DomainRecord":
+        """
+        This record with the scanned fields (status, expiry, issuer) of
+        `result`; the domain spelling and any other `extra` fields are kept.
+        The extra fields probes report (PROBE_FIELDS) are replaced as a
+        whole: one the new probe did not report is cleared, not kept stale.
+        With nothing of this record to keep, `result` itself is returned, so
+        one probe result is shared by every list it is merged into (records
+        are never modified once built).
+        """
+        kept = {k: v for k, v in self.extra.items() if k not in PROBE_FIELDS} if self.extra else None
+        if not kept and self.domain == result.domain:
+            return result
+        extra = {**kept, **result.extra} if kept and result.extra else kept or result.extra
+        return DomainRecord(self.domain, result.status, result.expires_at, result.issuer, extra)
+
+    def __repr__(self) -> str:
+        return f"DomainRecord({self.to_dict()!r})"
+
+
+_DICT_FIELDS = ("domain", "status", "ssl_expiration", "ssl_issuer")
+
+# Extra fields owned by the probes: each scan result replaces all of them
+PROBE_FIELDS = ("http_status",)
+
+
+def _key(domain: str) -> str:
+    return domain.lower()
+
+
+# Sort orders available for paging; "domain" is the primary order of SortedDomainList
+SORT_KEYS = ("domain", "status", "expiry")
+_NO_EXPIRY = 2 ** 62      # unknown expiries sort after every real one
+
+
+def sort_key(record: DomainRecord, sort: str) -> Tuple:
+    """Total-order key of `record` under `sort` (ties broken by domain)."""
+    if sort == "status":
+        return (record.status.code, _key(record.domain))
+    if sort == "expiry":
+        return (record.expires_at or _NO_EXPIRY, _key(record.domain))
+    return (_key(record.domain),)
+
+
+def is_sorted(records: List[DomainRecord]) -> bool:
+    """O(n) check that records are already ordered by domain (case-insensitive)."""
+    return all(_key(records[i - 1].domain) <= _key(records[i].domain) for i in range(1, len(records)))
+
+
+def sort_records(records: List[DomainRecord]) -> List[DomainRecord]:
+    """Return records ordered by domain, skipping the O(n log n) sort when they already are."""
+    return records if is_sorted(records) else sorted(records, key=lambda x: _key(x.domain))
+
+
+class SortedDomainList:
+    """
+    A user's domain records kept ordered by domain.
+
+    Ordered keys live in a bisect-maintained list and records in a dict index,
+    so membership and lookup are O(1), finding a position is O(log n), and
+    adding or removing one domain never re-sorts the whole list.
+
+    Secondary orders (status, expiry) are built on first use by page() and
+    then maintained on every change, so paging any order is a binary search
+    plus one slice.
+    """
+
+    __slots__ = ("_keys", "_index", "_secondary")
+
+    def __init__(self, records: Iterable[DomainRecord] = ()):
+        self._keys: List[str] = []
+        self._index: Dict[str, DomainRecord] = {}
+        self._secondary: Dict[str, List[Tuple]] = {}
+        self.reset(records)
+
+    def reset(self, records: Iterable[DomainRecord]) -> None:
+        """Replace the whole content (later duplicates of a domain win)."""
+        index = {}
+        for record in records:
+            index[_key(record.domain)] = record
+        keys = list(index)
+        # Stored lists are normally sorted already, so this is usually a linear check
+        if any(keys[i - 1] > keys[i] for i in range(1, len(keys))):
+            keys.sort()
+        self._keys, self._index = keys, index
+        self._secondary = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, domain: str) -> bool:
+        return _key(domain) in self._index
+
+    def __iter__(self) -> Iterator[DomainRecord]:
+        index = self._index
+        return (index[k] for k in self._keys)
+
+    def get(self, domain: str) -> Optional[DomainRecord]:
+        return self._index.get(_key(domain))
+
+    def add(self, record: DomainRecord) -> bool:
+        """Insert a record whose domain is not present yet; return False for duplicates."""
+        key = _key(record.domain)
+        if key in self._index:
+            return False
+        self._keys.insert(bisect_left(self._keys, key), key)
+        self._index[key] = record
+        for sort, keys in self._secondary.items():
+            k = sort_key(record, sort)
+            keys.insert(bisect_left(keys, k), k)
+        return True
+
+    def replace(self, record: DomainRecord) -> bool:
+        """Overwrite the record stored for the same domain; return False if it is not present."""
+        key = _key(record.domain)
+        old = self._index.get(key)
+        if old is None:
+            return False
+        self._index[key] = record
+        for sort, keys in self._secondary.items():
+            old_k, new_k = sort_key(old, sort), sort_key(record, sort)
+            if old_k != new_k:
+                del keys[bisect_left(keys, old_k)]
+                keys.insert(bisect_left(keys, new_k), new_k)
+        return True
+
+    def merge(self, result: DomainRecord) -> Optional[DomainRecord]:
+        """
+        Merge a scan result into the stored record of the same domain.
+        Returns the new record, or None if the domain is not present or
+        nothing changed (the stored record is then left untouched).
+        """
+        old = self._index.get(_key(result.domain))
+        if old is None:
+            return None
+        record = old.merged(result)
+        if record == old:
+            return None
+        self.replace(record)
+        return record
+
+    def remove(self, domain: str) -> Optional[DomainRecord]:
+        """Remove a domain; return its record, or None if it was not present."""
+        key = _key(domain)
+        record = self._index.pop(key, None)
+        if record is not None:
+            del self._keys[bisect_left(self._keys, key)]
+            for sort, keys in self._secondary.items():
+                del keys[bisect_left(keys, sort_key(record, sort))]
+        return record
+
+    def records(self) -> List[DomainRecord]:
+        """Return the records as a new list, in domain order."""
+        index = self._index
+        return [index[k] for k in self._keys]
+
+    def _order(self, sort: str) -> List[Tuple]:
+        """Sorted keys of a secondary order, built on first use."""
+        keys = self._secondary.get(sort)
+        if keys is None:
+            keys = self._secondary[sort] = sorted(sort_key(r, sort) for r in self._index.values())
+        return keys
+
+    @staticmethod
+    def _walk(keys: List, lo: int, hi: int, after: Any, descending: bool) -> Iterator:
+        """Yield keys[lo:hi] in the requested direction, starting after `after`."""
+        if descending:
+            end = hi if after is None else min(hi, bisect_left(keys, after, lo, hi))
+            return (keys[i] for i in range(end - 1, lo - 1, -1))
+        start = lo if after is None else max(lo, bisect_right(keys, after, lo, hi))
+        return (keys[i] for i in range(start, hi))
+
+    def page(self, sort: str = "domain", after: Optional[Tuple] = None, limit: int = 100,
+             descending: bool = False, statuses: Optional[Set[DomainStatus]] = None,
+             horizon: Optional[int] = None) -> Tuple[List[DomainRecord], Optional[Tuple]]:
+        """
+        Return up to `limit` records in `sort` order that come after the
+        sort_key() `after`, optionally only with one of `statuses` and/or a
+        known expiry up to `horizon` (epoch), plus the key to continue from
+        (None on the last page).
+
+        Index ranges are used where they cover a filter: status filters read
+        the status order per wanted status, and the expiry order stops at the
+        horizon. Other filter/order combinations skip non-matching entries.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        index = self._index
+
+        if sort == "domain" and statuses:
+            # Per-status ranges of the status order are already in domain order: merge them
+            keys = self._order("status")
+            ranges = []
+            for code in sorted(s.code for s in statuses):
+                lo, hi = bisect_left(keys, (code,)), bisect_left(keys, (code + 1,))
+                start = None if after is None else (code, after[0])
+                ranges.append((k[1] for k in self._walk(keys, lo, hi, start, descending)))
+            candidates = merge(*ranges, reverse=descending)
+            lookup = index.__getitem__
+        elif sort == "domain":
+            candidates = self._walk(self._keys, 0, len(self._keys),
+                                    None if after is None else after[0], descending)
+            lookup = index.__getitem__
+        else:
+            keys = self._order(sort)
+            lo, hi = 0, len(keys)
+            if sort == "status" and statuses:
+                codes = [s.code for s in statuses]
+                lo, hi = bisect_left(keys, (min(codes),)), bisect_left(keys, (max(codes) + 1,))
+            if sort == "expiry" and horizon is not None:
+                hi = bisect_right(keys, (horizon, "\uffff"))
+            candidates = self._walk(keys, lo, hi, after, descending)
+            lookup = lambda k: index[k[-1]]
+
+        out: List[DomainRecord] = []
+        for key in candidates:
+            record = lookup(key)
+            if statuses and record.status not in statuses:
+                continue
+            if horizon is not None and not 0 < record.expires_at <= horizon:
+                continue
+            if len(out) == limit:
+                return out, sort_key(out[-1], sort)
+            out.append(record)
+        return out, None
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+import DomainExport
+from DomainModel import SORT_KEYS
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Query parameters that switch /my_domains from the full list to a page
+PAGE_PARAMS = ("limit", "cursor", "sort", "order", "status", "expires_within")
+
+
+class PagingError(ValueError):
+    """Raised for malformed paging parameters or cursors."""
+
+
+def encode_cursor(sort: str, descending: bool, after: Optional[Tuple]) -> Optional[str]:
+    """Opaque, URL-safe cursor pointing just after the sort key `after` (None = no more pages)."""
+    if after is None:
+        return None
+    raw = json.dumps([sort, "desc" if descending else "asc", list(after)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, sort: str, descending: bool) -> Tuple:
+    """Return the sort key stored in `token`; it must belong to the same sort order."""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor_sort, order, after = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise PagingError("Malformed cursor")
+    if cursor_sort != sort or order != ("desc" if descending else "asc") or not isinstance(after, list):
+        raise PagingError("Cursor does not match the requested sort order")
+    # The key is compared with sort_key() values: (domain,) or (int, domain)
+    types = (str,) if sort == "domain" else (int, str)
+    if len(after) != len(types) or not all(
+            isinstance(value, kind) and not isinstance(value, bool) for value, kind in zip(after, types)):
+        raise PagingError("Malformed cursor")
+    return tuple(after)
+
+
+def parse_args(args: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Turn request query parameters into SortedDomainList.page() arguments:
+    sort (domain|status|expiry), order (asc|desc), limit, cursor, status
+    (comma separated) and expires_within (days).
+    """
+    sort = (args.get("sort") or "domain").lower()
+    if sort not in SORT_KEYS:
+        raise PagingError(f"Unsupported sort key: {sort}")
+
+    order = (args.get("order") or "asc").lower()
+    if order not in ("asc", "desc"):
+        raise PagingError("'order' must be 'asc' or 'desc'")
+    descending = order == "desc"
+
+    try:
+        limit = int(args.get("limit") or DEFAULT_PAGE_SIZE)
+    except ValueError:
+        raise PagingError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise PagingError(f"'limit' must be between 1 and {MAX_PAGE_SIZE}")
+
+    statuses = args.get("status")
+    try:
+        wanted = DomainExport.parse_statuses(statuses.split(",") if statuses else None)
+        horizon = DomainExport.parse_horizon(args.get("expires_within"))
+    except DomainExport.ExportError as e:
+        raise PagingError(str(e))
+
+    cursor = args.get("cursor")
+    return {
+        "sort": sort,
+        "descending": descending,
+        "limit": limit,
+        "after": decode_cursor(cursor, sort, descending) if cursor else None,
+        "statuses": wanted or None,
+        "horizon": horizon,
+    }
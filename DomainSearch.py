@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, insort
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+SEARCH_MODES = ("suffix", "prefix", "substring")
+
+
+class SearchError(ValueError):
+    """Raised for unknown search modes or empty queries."""
+
+
+class _Node:
+    __slots__ = ("children", "labels", "terminal", "size")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.labels: List[str] = []       # keys of `children`, kept sorted
+        self.terminal = False
+        self.size = 0            # domains in this subtree, including this node
+
+
+class DomainTrie:
+    """
+    One user's domains in a trie over reversed DNS labels.
+
+    "api.example.co.il" is stored under il -> co -> example -> api, so every
+    domain under a suffix lives in one subtree and suffix/wildcard queries
+    walk only the query's labels plus the results (children are kept in
+    label order, so no query sorts anything). Subtree sizes give suffix
+    counts in O(labels). Prefix queries bisect a sorted list of the names and
+    substring queries search one newline-joined blob (rebuilt lazily after
+    changes), so both run at C speed and stop at the limit.
+    """
+
+    def __init__(self, domains: Iterable[str] = ()):
+        self._root = _Node()
+        self._sorted: List[str] = []
+        self._blob: Optional[str] = None
+        added = [d for d in domains if self._insert(d)]
+        self._sorted = sorted(added)
+
+    def __len__(self) -> int:
+        return len(self._sorted)
+
+    def domains(self) -> List[str]:
+        return list(self._sorted)
+
+    @staticmethod
+    def _labels(domain: str) -> List[str]:
+        return domain.split(".")[::-1]
+
+    def _find(self, labels: List[str]) -> Optional[_Node]:
+        node = self._root
+        for label in labels:
+            node = node.children.get(label)
+            if node is None:
+                return None
+        return node
+
+    def _insert(self, domain: str) -> bool:
+        """Add `domain` to the trie only (not to the sorted name list)."""
+        labels = self._labels(domain)
+        node = self._find(labels)
+        if node is not None and node.terminal:
+            return False
+        node = self._root
+        node.size += 1
+        for label in labels:
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = _Node()
+                insort(node.labels, label)
+            node = child
+            node.size += 1
+        node.terminal = True
+        return True
+
+    def add(self, domain: str) -> bool:
+        if not self._insert(domain):
+            return False
+        insort(self._sorted, domain)
+        self._blob = None
+        return True
+
+    def remove(self, domain: str) -> bool:
+        labels = self._labels(domain)
+        node = self._find(labels)
+        if node is None or not node.terminal:
+            return False
+        node.terminal = False
+        path = [self._root]
+        for label in labels:
+            path.append(path[-1].children[label])
+        for visited in path:
+            visited.size -= 1
+        # Prune branches that no longer hold any domain
+        for parent, label, child in reversed(list(zip(path, labels, path[1:]))):
+            if child.size == 0:
+                del parent.children[label]
+                del parent.labels[bisect_left(parent.labels, label)]
+        del self._sorted[bisect_left(self._sorted, domain)]
+        self._blob = None
+        return True
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def suffix(self, suffix: str, limit: int, subdomains_only: bool = False) -> Tuple[List[str], int]:
+        """
+        Domains equal to or under `suffix` (only under it with
+        `subdomains_only`, i.e. "*.suffix"), in label order; returns up to
+        `limit` names and the total number of matches.
+        """
+        labels = self._labels(suffix)
+        node = self._find(labels)
+        if node is None:
+            return [], 0
+        total = node.size - (1 if subdomains_only and node.terminal else 0)
+
+        out: List[str] = []
+        if node.terminal and not subdomains_only and limit > 0:
+            out.append(".".join(reversed(labels)))
+        # Pre-order walk with one label iterator per open node: it stops at
+        # the limit without touching the siblings it did not reach
+        stack = [(node, labels, iter(node.labels))]
+        while stack and len(out) < limit:
+            current, path, pending = stack[-1]
+            label = next(pending, None)
+            if label is None:
+                stack.pop()
+                continue
+            child, child_path = current.children[label], path + [label]
+            if child.terminal:
+                out.append(".".join(reversed(child_path)))
+            if child.labels:
+                stack.append((child, child_path, iter(child.labels)))
+        return out, total
+
+    def prefix(self, prefix: str, limit: int) -> Tuple[List[str], int]:
+        """Domains whose name starts with `prefix`, alphabetically."""
+        start = bisect_left(self._sorted, prefix)
+        end = bisect_left(self._sorted, prefix + "\uffff", start)
+        return self._sorted[start:min(end, start + limit)], end - start
+
+    def substring(self, text: str, limit: int) -> List[str]:
+        """Up to `limit` domains containing `text`, alphabetically."""
+        if self._blob is None:
+            self._blob = "\n" + "\n".join(self._sorted) + "\n"
+        blob, out, pos = self._blob, [], 0
+        while len(out) < limit:
+            hit = blob.find(text, pos)
+            if hit < 0:
+                break
+            start = blob.rfind("\n", 0, hit) + 1
+            end = blob.find("\n", hit)
+            out.append(blob[start:end])
+            pos = end           # continue after this name: one hit per domain
+        return out
+
+
+class DomainSearchIndex:
+    """
+    Per-user DomainTries, built on a user's first search and afterwards kept
+    in step with adds and removals by the engine.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tries: Dict[str, DomainTrie] = {}
+
+    def trie(self, owner: str, loader: Callable[[], Iterable[str]]) -> DomainTrie:
+        """Return the user's trie, building it from `loader()` the first time."""
+        with self._lock:
+            trie = self._tries.get(owner)
+        if trie is None:
+            built = DomainTrie(loader())
+            with self._lock:
+                trie = self._tries.setdefault(owner, built)
+        return trie
+
+    def add(self, owner: str, domains: Iterable[str]) -> None:
+        with self._lock:
+            trie = self._tries.get(owner)
+            if trie is not None:
+                for domain in domains:
+                    trie.add(domain)
+
+    def remove(self, owner: str, domains: Iterable[str]) -> None:
+        with self._lock:
+            trie = self._tries.get(owner)
+            if trie is not None:
+                for domain in domains:
+                    trie.remove(domain)
+
+    def sync(self, owner: str, domains: Iterable[str]) -> None:
+        """Make an already built trie hold exactly `domains` (e.g. after external edits)."""
+        with self._lock:
+            trie = self._tries.get(owner)
+            if trie is None:
+                return
+            wanted, current = set(domains), set(trie.domains())
+            for domain in current - wanted:
+                trie.remove(domain)
+            for domain in wanted - current:
+                trie.add(domain)
+
+    def search(self, owner: str, loader: Callable[[], Iterable[str]], query: str,
+               mode: str = "suffix", limit: int = 100) -> Dict[str, object]:
+        """
+        Run one query: "suffix" (a leading "*." matches subdomains only),
+        "prefix" or "substring". Returns {"results": [...], "total": n} where
+        total is None for substring queries (they stop at the limit).
+        """
+        if mode not in SEARCH_MODES:
+            raise SearchError(f"Unsupported search mode: {mode}")
+        query = (query or "").strip().lower().rstrip(".")
+        if mode == "suffix":
+            subdomains_only = query.startswith("*.")
+            query = query[2:] if subdomains_only else query.lstrip(".")
+        if not query:
+            raise SearchError("Search query must not be empty")
+
+        trie = self.trie(owner, loader)
+        with self._lock:
+            if mode == "suffix":
+                results, total = trie.suffix(query, limit, subdomains_only)
+            elif mode == "prefix":
+                results, total = trie.prefix(query, limit)
+            else:
+                results, total = trie.substring(query, limit), None
+        return {"results": results, "total": total}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"users": len(self._tries), "domains": sum(len(t) for t in self._tries.values())}
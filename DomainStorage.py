@@ -0,0 +1,488 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import concurrent.futures
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from logger import setup_logger
+import GroupCommit
+from DomainModel import DomainRecord, DomainStatus, SortedDomainList, SORT_KEYS, expiry_to_epoch, sort_key, \
+    sort_records
+
+logger = setup_logger("DomainStorage")
+
+DOMAINS_SUFFIX = "_domains.json"
+
+
+def user_key(username: str) -> str:
+    """File/row-safe user key (same rule the per-user JSON file names always used)."""
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", username.strip())
+
+
+class DomainStorage:
+    """
+    Storage interface used by DomainManagementEngine.
+
+    Records are DomainRecord objects, ordered by domain. Callers are expected
+    to serialise writes for the same user; implementations only guarantee that
+    each call is applied as a whole.
+    """
+
+    def load(self, username: str) -> List[DomainRecord]:
+        """Return the user's records sorted by domain, initializing the user if missing."""
+        raise NotImplementedError
+
+    def save(self, username: str, records: List[DomainRecord]) -> None:
+        """Replace the user's whole record list."""
+        raise NotImplementedError
+
+    def insert(self, username: str, records: List[DomainRecord]) -> List[str]:
+        """Add records whose domain is not stored yet; return the inserted domains."""
+        raise NotImplementedError
+
+    def update(self, username: str, records: List[DomainRecord]) -> List[DomainRecord]:
+        """
+        Merge scan results into the already stored records (matched by
+        domain, see DomainRecord.merged) and write only those that changed.
+        Returns the changed records as stored; nothing is written if empty.
+        """
+        raise NotImplementedError
+
+    def delete(self, username: str, domains: Iterable[str]) -> List[str]:
+        """Remove the given domains; return the ones that existed."""
+        raise NotImplementedError
+
+    def apply_changes(self, username: str, changes: Dict[str, Optional[DomainRecord]]) -> None:
+        """
+        Write per-domain changes keyed by lower-cased domain, on top of
+        whatever is stored: a record is stored as given (replacing the same
+        domain), None removes the domain.
+        """
+        current = SortedDomainList(self.load(username))
+        for domain, record in changes.items():
+            current.remove(domain)
+            if record is not None:
+                current.add(record)
+        self.save(username, current.records())
+
+    def list_users(self) -> List[str]:
+        """Return the keys of all users known to the storage, sorted."""
+        raise NotImplementedError
+
+    def fingerprint(self, username: str) -> Any:
+        """
+        Cheap token that changes whenever the user's stored list changes,
+        including changes made by other processes (None if unknown/missing).
+        """
+        return None
+
+    def page(self, username: str, **query: Any) -> Tuple[List[DomainRecord], Optional[Tuple], int]:
+        """
+        Return one page of the user's records (see SortedDomainList.page for
+        the query arguments), the key to continue from and the total count.
+        """
+        domains = SortedDomainList(self.load(username))
+        records, after = domains.page(**query)
+        return records, after, len(domains)
+
+
+# ----------------------------
+# JSON files (default)
+# ----------------------------
+def _records_from_json(data: List[Any]) -> List[DomainRecord]:
+    """Convert a parsed JSON list into records, skipping malformed entries."""
+    return [DomainRecord.from_dict(d) for d in data if isinstance(d, dict) and d.get("domain")]
+
+
+class JsonStorage(DomainStorage):
+    """
+    One pretty-printed JSON list per user: <data_dir>/<user>_domains.json.
+
+    Files are replaced atomically (temp file + rename) through a
+    GroupCommitWriter, so a crash never leaves a half-written list behind and
+    bursts of writes for the same user are merged into one commit.
+    """
+
+    def __init__(self, data_dir: str, writer: Optional[GroupCommit.GroupCommitWriter] = None):
+        self.data_dir = data_dir
+        self.writer = writer or GroupCommit.from_env()
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def path(self, username: str) -> str:
+        return os.path.join(self.data_dir, f"{user_key(username)}{DOMAINS_SUFFIX}")
+
+    def _quarantine(self, path: str, reason: str) -> None:
+        """Move an unreadable file aside so the next save cannot overwrite the evidence."""
+        target = f"{path}.corrupt-{int(time.time())}"
+        try:
+            os.replace(path, target)
+            logger.error(f"{path} is corrupt ({reason}); moved to {target}")
+        except OSError as e:
+            logger.error(f"{path} is corrupt ({reason}) and could not be moved aside: {e}")
+
+    def load(self, username: str) -> List[DomainRecord]:
+        path = self.path(username)
+        payload = self.writer.pending_payload(path)
+        if payload is None:
+            if not os.path.exists(path):
+                self.writer.write(path, b"[]")
+                return []
+            with open(path, "rb") as f:
+                payload = f.read()
+
+        try:
+            data = json.loads(payload)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self._quarantine(path, str(e))
+            return []
+        if not isinstance(data, list):
+            self._quarantine(path, "not a JSON list")
+            return []
+        return sort_records(_records_from_json(data))
+
+    def save(self, username: str, records: List[DomainRecord]) -> None:
+        payload = json.dumps([r.to_dict() for r in sort_records(records)], ensure_ascii=False, indent=2)
+        self.writer.write(self.path(username), payload.encode("utf-8"))
+
+    def insert(self, username: str, records: List[DomainRecord]) -> List[str]:
+        current = SortedDomainList(self.load(username))
+        inserted = [r.domain for r in records if current.add(r)]
+        if inserted:
+            self.save(username, current.records())
+        return inserted
+
+    def update(self, username: str, records: List[DomainRecord]) -> List[DomainRecord]:
+        current = SortedDomainList(self.load(username))
+        changed = [r for r in (current.merge(result) for result in records) if r is not None]
+        if changed:
+            self.save(username, current.records())
+        return changed
+
+    def delete(self, username: str, domains: Iterable[str]) -> List[str]:
+        current = SortedDomainList(self.load(username))
+        removed = [r.domain for r in (current.remove(d) for d in set(domains)) if r is not None]
+        if removed:
+            self.save(username, current.records())
+        return removed
+
+    def list_users(self) -> List[str]:
+        names = os.listdir(self.data_dir) if os.path.isdir(self.data_dir) else []
+        return sorted(n[:-len(DOMAINS_SUFFIX)] for n in names if n.endswith(DOMAINS_SUFFIX))
+
+    def writer_stats(self) -> Dict[str, Any]:
+        return self.writer.stats()
+
+    def fingerprint(self, username: str) -> Any:
+        # Queued writes count as done: conditional GETs never wait for the disk
+        return self.writer.fingerprint(self.path(username))
+
+
+# ----------------------------
+# SQLite (WAL)
+# ----------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    version  INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS domains (
+    username       TEXT NOT NULL,
+    domain         TEXT NOT NULL,
+    status         TEXT NOT NULL DEFAULT 'Pending',
+    ssl_expiration TEXT NOT NULL DEFAULT 'N/A',
+    ssl_issuer     TEXT NOT NULL DEFAULT 'N/A',
+    extra          TEXT,
+    status_code    INTEGER NOT NULL DEFAULT 0,
+    expires_at     INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (username, domain)
+) WITHOUT ROWID;
+"""
+
+# status_code / expires_at hold the sort_key() values (unknown expiries are
+# stored as the "sorts last" sentinel), so every page is an index range scan
+_INDEXES = """
+DROP INDEX IF EXISTS idx_domains_status;
+DROP INDEX IF EXISTS idx_domains_ssl_expiration;
+CREATE INDEX IF NOT EXISTS idx_domains_user_domain ON domains (username, domain COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_domains_user_status ON domains (username, status_code, domain COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_domains_user_expiry ON domains (username, expires_at, domain COLLATE NOCASE);
+"""
+
+_COLUMNS = "username, domain, status, ssl_expiration, ssl_issuer, extra, status_code, expires_at"
+_INSERT = f"INTO domains ({_COLUMNS}) VALUES ({', '.join('?' * len(_COLUMNS.split(', ')))})"
+
+
+def _to_row(username: str, record: DomainRecord) -> Tuple[Any, ...]:
+    return (
+        username,
+        record.domain,
+        record.status.value,
+        record.ssl_expiration,
+        record.issuer,
+        json.dumps(record.extra, ensure_ascii=False) if record.extra else None,
+        sort_key(record, "status")[0],
+        sort_key(record, "expiry")[0],
+    )
+
+
+# Columns of the sort_key() orders; domains are stored lower-cased by the
+# engine, and NOCASE keeps older mixed-case rows in the same order
+_DOMAIN_KEY = "domain COLLATE NOCASE"
+_SORT_COLUMNS = {
+    "domain": (_DOMAIN_KEY,),
+    "status": ("status_code", _DOMAIN_KEY),
+    "expiry": ("expires_at", _DOMAIN_KEY),
+}
+
+
+def _from_row(row: Tuple[Any, ...]) -> DomainRecord:
+    domain, status, ssl_expiration, ssl_issuer, extra = row
+    return DomainRecord(domain, DomainStatus.parse(status), expiry_to_epoch(ssl_expiration),
+                        ssl_issuer, json.loads(extra) if extra else None)
+
+
+class SqliteStorage(DomainStorage):
+    """
+    All users in one SQLite database in WAL mode, so readers never block the
+    writer and several processes can share the same file. Every change is a
+    row-level statement instead of a whole-list rewrite.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(users)")}
+            if "version" not in columns:
+                conn.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            columns = {r[1] for r in conn.execute("PRAGMA table_info(domains)")}
+            if "status_code" not in columns:
+                self._add_sort_columns(conn)
+            conn.executescript(_INDEXES)
+
+    @staticmethod
+    def _add_sort_columns(conn: sqlite3.Connection) -> None:
+        """Add and backfill status_code / expires_at on a database created before they existed."""
+        conn.execute("ALTER TABLE domains ADD COLUMN status_code INTEGER NOT NULL DEFAULT 0")
+        conn.execute("ALTER TABLE domains ADD COLUMN expires_at INTEGER NOT NULL DEFAULT 0")
+        rows = conn.execute("SELECT username, domain, status, ssl_expiration, ssl_issuer, extra FROM domains")
+        conn.executemany(
+            "UPDATE domains SET status_code = ?, expires_at = ? WHERE username = ? AND domain = ?",
+            [_to_row(r[0], _from_row(r[1:]))[6:] + r[:2] for r in rows.fetchall()],
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection (sqlite3 connections are not shared across threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ensure_user(self, conn: sqlite3.Connection, key: str) -> None:
+        conn.execute("INSERT OR IGNORE INTO users (username) VALUES (?)", (key,))
+
+    def _bump_version(self, conn: sqlite3.Connection, key: str) -> None:
+        conn.execute("UPDATE users SET version = version + 1 WHERE username = ?", (key,))
+
+    def load(self, username: str) -> List[DomainRecord]:
+        key = user_key(username)
+        conn = self._conn()
+        with conn:
+            self._ensure_user(conn, key)
+        rows = conn.execute(
+            "SELECT domain, status, ssl_expiration, ssl_issuer, extra FROM domains "
+            f"WHERE username = ? ORDER BY {_DOMAIN_KEY}",
+            (key,),
+        )
+        return [_from_row(r) for r in rows]
+
+    def page(self, username: str, sort: str = "domain", after: Optional[Tuple] = None, limit: int = 100,
+             descending: bool = False, statuses: Optional[Iterable[DomainStatus]] = None,
+             horizon: Optional[int] = None) -> Tuple[List[DomainRecord], Optional[Tuple], int]:
+        """Same pages as SortedDomainList.page, read with a keyset query instead of loading the list."""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key: {sort}")
+        key = user_key(username)
+        columns = _SORT_COLUMNS[sort]
+        where, params = ["username = ?"], [key]
+        if after is not None:
+            where.append(f"({', '.join(columns)}) {'<' if descending else '>'} ({', '.join('?' * len(columns))})")
+            params.extend(after)
+        if statuses:
+            codes = sorted({s.code for s in statuses})
+            where.append(f"status_code IN ({', '.join('?' * len(codes))})")
+            params.extend(codes)
+        if horizon is not None:
+            where.append("expires_at <= ?")
+            params.append(horizon)
+        direction = " DESC" if descending else ""
+        conn = self._conn()
+        rows = conn.execute(
+            "SELECT domain, status, ssl_expiration, ssl_issuer, extra FROM domains "
+            f"WHERE {' AND '.join(where)} ORDER BY {', '.join(c + direction for c in columns)} LIMIT ?",
+            params + [limit + 1],
+        ).fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM domains WHERE username = ?", (key,)).fetchone()[0]
+        records = [_from_row(r) for r in rows[:limit]]
+        more = len(rows) > limit
+        return records, sort_key(records[-1], sort) if more else None, total
+
+    def save(self, username: str, records: List[DomainRecord]) -> None:
+        key = user_key(username)
+        with self._conn() as conn:
+            self._ensure_user(conn, key)
+            conn.execute("DELETE FROM domains WHERE username = ?", (key,))
+            conn.executemany(
+                f"INSERT OR REPLACE {_INSERT}",
+                [_to_row(key, r) for r in records],
+            )
+            self._bump_version(conn, key)
+
+    def insert(self, username: str, records: List[DomainRecord]) -> List[str]:
+        key = user_key(username)
+        inserted = []
+        with self._conn() as conn:
+            self._ensure_user(conn, key)
+            for record in records:
+                cur = conn.execute(f"INSERT OR IGNORE {_INSERT}", _to_row(key, record))
+                if cur.rowcount:
+                    inserted.append(record.domain)
+            if inserted:
+                self._bump_version(conn, key)
+        return inserted
+
+    def update(self, username: str, records: List[DomainRecord]) -> List[DomainRecord]:
+        key = user_key(username)
+        results = {r.domain: r for r in records}
+        changed = []
+        with self._conn() as conn:
+            stored = conn.execute(
+                "SELECT domain, status, ssl_expiration, ssl_issuer, extra FROM domains WHERE username = ?",
+                (key,),
+            )
+            for old in map(_from_row, stored):
+                result = results.get(old.domain)
+                if result is not None:
+                    record = old.merged(result)
+                    if record != old:
+                        changed.append(record)
+            if changed:
+                conn.executemany(
+                    "UPDATE domains SET status = ?, ssl_expiration = ?, ssl_issuer = ?, extra = ?, "
+                    "status_code = ?, expires_at = ? "
+                    "WHERE username = ? AND domain = ?",
+                    [_to_row(key, r)[2:] + (key, r.domain) for r in changed],
+                )
+                self._bump_version(conn, key)
+        return changed
+
+    def delete(self, username: str, domains: Iterable[str]) -> List[str]:
+        key = user_key(username)
+        removed = []
+        with self._conn() as conn:
+            for domain in set(domains):
+                cur = conn.execute("DELETE FROM domains WHERE username = ? AND domain = ?", (key, domain))
+                if cur.rowcount:
+                    removed.append(domain)
+            if removed:
+                self._bump_version(conn, key)
+        return removed
+
+    def apply_changes(self, username: str, changes: Dict[str, Optional[DomainRecord]]) -> None:
+        key = user_key(username)
+        with self._conn() as conn:
+            self._ensure_user(conn, key)
+            conn.executemany("DELETE FROM domains WHERE username = ? AND domain = ? COLLATE NOCASE",
+                             [(key, domain) for domain in changes])
+            conn.executemany(f"INSERT {_INSERT}", [_to_row(key, r) for r in changes.values() if r is not None])
+            self._bump_version(conn, key)
+
+    def list_users(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT username FROM users ORDER BY username")]
+
+    def fingerprint(self, username: str) -> Any:
+        row = self._conn().execute("SELECT version FROM users WHERE username = ?",
+                                   (user_key(username),)).fetchone()
+        return row[0] if row else None
+
+
+# ----------------------------
+# Factory & migration
+# ----------------------------
+def create_storage(data_dir: str, backend: Optional[str] = None,
+                   db_path: Optional[str] = None) -> DomainStorage:
+    """
+    Build the configured storage backend.
+    DOMAIN_STORAGE selects "json" (default) or "sqlite";
+    DOMAIN_DB_PATH overrides the SQLite file (default <data_dir>/domains.db).
+    """
+    backend = (backend or os.environ.get("DOMAIN_STORAGE") or "json").lower()
+    if backend == "json":
+        return JsonStorage(data_dir)
+    if backend == "sqlite":
+        db_path = db_path or os.environ.get("DOMAIN_DB_PATH") or os.path.join(data_dir, "domains.db")
+        return SqliteStorage(db_path)
+    raise ValueError(f"Unknown domain storage backend: {backend}")
+
+
+def _read_user_file(path: str) -> Tuple[str, List[DomainRecord]]:
+    """Parse one per-user JSON file (runs in a worker process)."""
+    key = os.path.basename(path)[:-len(DOMAINS_SUFFIX)]
+    with open(path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            data = None
+    if not isinstance(data, list):
+        raise ValueError(f"{path} does not contain a JSON list")
+    return key, _records_from_json(data)
+
+
+def migrate_json_to_sqlite(data_dir: str, db_path: str, workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    One-shot migration of every <user>_domains.json under `data_dir` into `db_path`.
+    Files are parsed in parallel worker processes; the parent is the single
+    SQLite writer and replaces each user's rows in its own transaction, so
+    re-running the migration is safe.
+    """
+    target = SqliteStorage(db_path)
+    paths = [os.path.join(data_dir, n) for n in sorted(os.listdir(data_dir)) if n.endswith(DOMAINS_SUFFIX)]
+
+    users, domains, failed = 0, 0, []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_read_user_file, p): p for p in paths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                key, records = future.result()
+            except Exception as e:
+                logger.error(f"Migration skipped {futures[future]}: {e}")
+                failed.append(os.path.basename(futures[future]))
+                continue
+            target.save(key, records)
+            users += 1
+            domains += len(records)
+
+    summary = {"users": users, "domains": domains, "failed": failed}
+    logger.info(f"JSON -> SQLite migration finished: {summary}")
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrate per-user JSON domain files to SQLite.")
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "UsersData"))
+    parser.add_argument("--db", default=None, help="SQLite file (default: <data-dir>/domains.db)")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: CPU count)")
+    args = parser.parse_args()
+
+    print(migrate_json_to_sqlite(args.data_dir, args.db or os.path.join(args.data_dir, "domains.db"), args.workers))
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, insort
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from DomainModel import DomainRecord
+
+DAY = 86400
+
+
+class ExpiryCalendar:
+    """
+    Certificate expiries bucketed by UTC day.
+
+    Each day with at least one expiry has a bucket of keys, kept sorted on
+    insert (keys of one day come out by name, so pages are stable); the
+    bucket days are kept in a sorted list, so the next expiry is its first
+    element and walking forward from any date visits only non-empty days.
+    Returning the next k expiries therefore costs O(k) plus one binary search.
+    """
+
+    __slots__ = ("_buckets", "_days", "_day_of")
+
+    def __init__(self):
+        self._buckets: Dict[int, List[Any]] = {}
+        self._days: List[int] = []
+        self._day_of: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._day_of)
+
+    def keys(self) -> List[Hashable]:
+        return list(self._day_of)
+
+    def day_count(self) -> int:
+        return len(self._days)
+
+    def set(self, key: Hashable, expires_at: int) -> None:
+        """Index `key` under `expires_at` (epoch); 0 (unknown) removes it."""
+        day = expires_at // DAY if expires_at > 0 else None
+        old = self._day_of.get(key)
+        if old == day:
+            return
+        if old is not None:
+            self.discard(key)
+        if day is None:
+            return
+        bucket = self._buckets.get(day)
+        if bucket is None:
+            bucket = self._buckets[day] = []
+            insort(self._days, day)
+        insort(bucket, key)
+        self._day_of[key] = day
+
+    def discard(self, key: Hashable) -> None:
+        day = self._day_of.pop(key, None)
+        if day is None:
+            return
+        bucket = self._buckets[day]
+        del bucket[bisect_left(bucket, key)]
+        if not bucket:
+            del self._buckets[day]
+            del self._days[bisect_left(self._days, day)]
+
+    def next_day(self) -> Optional[int]:
+        """Epoch (midnight UTC) of the earliest indexed expiry, if any."""
+        return self._days[0] * DAY if self._days else None
+
+    def upcoming(self, since: int, limit: int, until: Optional[int] = None) -> List[Tuple[int, Hashable]]:
+        """Return up to `limit` (expires_at, key) pairs expiring on/after `since` (and before/on `until`)."""
+        out: List[Tuple[int, Hashable]] = []
+        last_day = until // DAY if until is not None else None
+        for i in range(bisect_left(self._days, since // DAY), len(self._days)):
+            day = self._days[i]
+            if len(out) >= limit or (last_day is not None and day > last_day):
+                break
+            out.extend((day * DAY, key) for key in self._buckets[day][:limit - len(out)])
+        return out[:limit]
+
+
+class ExpiryIndex:
+    """
+    Upcoming certificate expirations for every user and globally.
+
+    Keeps one ExpiryCalendar per user (keyed by domain) and a global one
+    (keyed by (username, domain)). The engine feeds it whenever records are
+    loaded, added, removed or updated with scan results.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global = ExpiryCalendar()
+        self._users: Dict[str, ExpiryCalendar] = {}
+
+    def _set(self, owner: str, domain: str, expires_at: int) -> None:
+        calendar = self._users.get(owner)
+        if calendar is None:
+            calendar = self._users[owner] = ExpiryCalendar()
+        calendar.set(domain, expires_at)
+        self._global.set((owner, domain), expires_at)
+
+    def update(self, owner: str, records: Iterable[DomainRecord]) -> None:
+        with self._lock:
+            for record in records:
+                self._set(owner, record.domain, record.expires_at)
+
+    def remove(self, owner: str, domains: Iterable[str]) -> None:
+        with self._lock:
+            calendar = self._users.get(owner)
+            if calendar is None:
+                return
+            for domain in domains:
+                calendar.discard(domain)
+                self._global.discard((owner, domain))
+
+    def replace_user(self, owner: str, records: Iterable[DomainRecord]) -> None:
+        """Make `owner`'s indexed expiries exactly those of `records`."""
+        with self._lock:
+            old = self._users.pop(owner, None)
+            if old is not None:
+                for domain in old.keys():
+                    self._global.discard((owner, domain))
+            for record in records:
+                self._set(owner, record.domain, record.expires_at)
+
+    def upcoming(self, since: int, limit: int, until: Optional[int] = None,
+                 owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Next `limit` expirations on/after `since` (epoch), for `owner` or for
+        everybody, as {"username", "domain", "expires_at"} soonest first.
+        """
+        with self._lock:
+            if owner is not None:
+                calendar = self._users.get(owner)
+                if calendar is None:
+                    return []
+                return [{"username": owner, "domain": domain, "expires_at": expires_at}
+                        for expires_at, domain in calendar.upcoming(since, limit, until)]
+            return [{"username": user, "domain": domain, "expires_at": expires_at}
+                    for expires_at, (user, domain) in self._global.upcoming(since, limit, until)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._global), "days": self._global.day_count(),
+                    "next_expiry": self._global.next_day()}
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+from logger import setup_logger
+
+logger = setup_logger("GroupCommit")
+
+# Durability levels:
+#   none        - writes are queued and committed by the background writer, no fsync
+#   batched     - callers wait for the group commit; one fsync per file per window
+#   every-write - every write is committed and fsynced synchronously by the caller
+DURABILITY_LEVELS = ("none", "batched", "every-write")
+
+
+def atomic_write(path: str, payload: bytes, fsync: bool = True) -> None:
+    """
+    Replace `path` with `payload` atomically: write a temp file in the same
+    directory, optionally fsync it, then rename it over the target. Readers
+    see either the old or the new content, never a truncated file.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+    # Persist the rename itself (directories cannot be opened on Windows)
+    if fsync and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class _PendingWrite:
+    __slots__ = ("payload", "seq", "done", "error")
+
+    def __init__(self, payload: bytes, seq: int):
+        self.payload = payload
+        self.seq = seq
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommitWriter:
+    """
+    Coalesces file writes issued within a short window.
+
+    Writes to the same path that arrive while an earlier one is still queued
+    replace its payload, so a burst of N updates for one user costs a single
+    write (+ fsync) instead of N. A single background thread commits each
+    group with atomic_write.
+    """
+
+    def __init__(self, durability: str = "batched", window: float = 0.005):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown durability level: {durability}")
+        self.durability = durability
+        self.window = window
+
+        self._pending: Dict[str, _PendingWrite] = {}
+        self._inflight: Dict[str, _PendingWrite] = {}
+        self._committed: Dict[str, Tuple[int, Tuple[int, int]]] = {}   # path -> (seq, file stat) of our last write
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._stats = {"requested": 0, "merged": 0, "written": 0, "fsyncs": 0, "groups": 0, "errors": 0}
+
+        if durability != "every-write":
+            threading.Thread(target=self._loop, name="group-commit-writer", daemon=True).start()
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def write(self, path: str, payload: bytes) -> None:
+        """Queue (or, for every-write, perform) a full replacement of `path`."""
+        if self.durability == "every-write":
+            atomic_write(path, payload, fsync=True)
+            stat = self._stat(path)
+            with self._cond:
+                self._seq += 1
+                self._committed[path] = (self._seq, stat)
+                self._stats["requested"] += 1
+                self._stats["written"] += 1
+                self._stats["fsyncs"] += 1
+            return
+
+        with self._cond:
+            self._stats["requested"] += 1
+            self._seq += 1
+            pending = self._pending.get(path)
+            if pending is not None:
+                pending.payload = payload
+                pending.seq = self._seq
+                self._stats["merged"] += 1
+            else:
+                pending = self._pending[path] = _PendingWrite(payload, self._seq)
+            self._cond.notify()
+
+        if self.durability == "batched":
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+
+    def pending_payload(self, path: str) -> Optional[bytes]:
+        """Return the newest not-yet-committed payload for `path`, if any."""
+        with self._cond:
+            pending = self._pending.get(path) or self._inflight.get(path)
+            return pending.payload if pending is not None else None
+
+    def fingerprint(self, path: str) -> Any:
+        """
+        Token that changes with every write of `path`, without waiting for
+        queued writes: the sequence number of our newest write, queued or
+        committed (it stays the same when the write reaches disk), or the
+        file's (mtime, size) once something else has replaced the file since;
+        None if there is no file.
+        """
+        with self._cond:
+            pending = self._pending.get(path) or self._inflight.get(path)
+            if pending is not None:
+                return pending.seq
+            committed = self._committed.get(path)
+        stat = self._stat(path)
+        if committed is not None and committed[1] == stat:
+            return committed[0]
+        return stat
+
+    def wait(self, path: str) -> None:
+        """Block until every queued write for `path` is on disk."""
+        while True:
+            with self._cond:
+                pending = self._pending.get(path) or self._inflight.get(path)
+            if pending is None:
+                return
+            pending.done.wait()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Let concurrent writers join this group before committing it
+            time.sleep(self.window)
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+
+            fsync = self.durability == "batched"
+            committed = {}
+            for path, pending in batch.items():
+                try:
+                    atomic_write(path, pending.payload, fsync=fsync)
+                    committed[path] = (pending.seq, self._stat(path))
+                except Exception as e:
+                    logger.error(f"Group commit failed for {path}: {e}")
+                    pending.error = e
+            with self._cond:
+                self._committed.update(committed)
+                self._inflight = {}
+                self._stats["groups"] += 1
+                self._stats["written"] += sum(1 for p in batch.values() if p.error is None)
+                self._stats["errors"] += sum(1 for p in batch.values() if p.error is not None)
+                if fsync:
+                    self._stats["fsyncs"] += sum(1 for p in batch.values() if p.error is None)
+            for pending in batch.values():
+                pending.done.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return request/merge/write counters; `saved` is requested minus written."""
+        with self._cond:
+            return {**self._stats, "durability": self.durability,
+                    "saved": self._stats["requested"] - self._stats["written"]}
+
+
+def from_env() -> GroupCommitWriter:
+    """Build a writer from DOMAIN_DURABILITY and DOMAIN_WRITE_WINDOW_MS."""
+    return GroupCommitWriter(
+        durability=(os.environ.get("DOMAIN_DURABILITY") or "batched").lower(),
+        window=float(os.environ.get("DOMAIN_WRITE_WINDOW_MS", "5")) / 1000,
+    )
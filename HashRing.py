@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import bisect
+import concurrent.futures
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from DomainModel import DomainRecord
+from logger import setup_logger
+
+logger = setup_logger("HashRing")
+
+PEER_TOKEN_HEADER = "X-Peer-Token"
+
+
+def _point(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent-hash ring: every node owns the arcs before its `vnodes`
+    points, and a key belongs to the node of the first point at or after
+    the key's hash. Adding or removing a node only moves the keys of its
+    own arcs (about 1/N of them); the rest keep their owner.
+    """
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 160):
+        self.nodes = sorted(set(nodes))
+        self.vnodes = vnodes
+        points = sorted((_point(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._points = [p for p, _ in points]
+        self._owners = [n for _, n in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        i = bisect.bisect_left(self._points, _point(key.lower()))
+        return self._owners[i % len(self._owners)]
+
+
+def _normalize(url: str) -> str:
+    return url.strip().rstrip("/")
+
+
+class Membership:
+    """
+    This instance's slice of the monitored hosts.
+
+    The app instances are listed as base URLs, either statically or in a
+    membership file that is re-read when it changes. Each host belongs to
+    one instance on a HashRing, and only that instance probes it. A scan
+    sends the hosts it does not own to their owners (POST /internal/probe).
+    The owner reuses its own recent result when it has one. So every host
+    is probed about once per PROBE_REUSE_SECONDS, however many replicas
+    its users hit, and total probe load does not grow with the replicas.
+
+    If an owner cannot be reached, the scan probes that owner's hosts itself.
+    """
+
+    def __init__(self, self_url: str, peers: Optional[Sequence[str]] = None, path: Optional[str] = None,
+                 vnodes: int = 160, reload_seconds: float = 5.0, token: Optional[str] = None,
+                 timeout: float = 120.0, chunk: int = 500):
+        self.self_url = _normalize(self_url)
+        self.path = path
+        self.vnodes = vnodes
+        self.reload_seconds = reload_seconds
+        self.token = token
+        self.timeout = timeout
+        self.chunk = chunk
+        self._lock = threading.Lock()
+        self._ring = HashRing([_normalize(p) for p in peers or () if p.strip()], vnodes)
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="peer")
+        self._stats = {"forwarded": 0, "forward_failures": 0, "served": 0, "ring_changes": 0}
+
+    # ----------------------------
+    # Ring
+    # ----------------------------
+    def _read_file(self) -> Optional[List[str]]:
+        try:
+            mtime = os.stat(self.path).st_mtime
+            if mtime == self._mtime:
+                return None
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().splitlines()
+        except OSError as e:
+            logger.warning(f"Membership file {self.path} unreadable: {e}")
+            return None
+        self._mtime = mtime
+        return [_normalize(line) for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+    def ring(self) -> HashRing:
+        """The current ring (the membership file is checked every `reload_seconds`)."""
+        with self._lock:
+            if self.path and time.monotonic() - self._checked >= self.reload_seconds:
+                self._checked = time.monotonic()
+                nodes = self._read_file()
+                if nodes is not None and sorted(set(nodes)) != self._ring.nodes:
+                    logger.info(f"Scan ring members: {', '.join(sorted(set(nodes))) or '(none)'}")
+                    self._ring = HashRing(nodes, self.vnodes)
+                    self._stats["ring_changes"] += 1
+            return self._ring
+
+    def split(self, records: List[DomainRecord]) -> Tuple[List[DomainRecord], Dict[str, List[DomainRecord]]]:
+        """(records this instance owns, {peer: records it owns})."""
+        ring = self.ring()
+        if not ring.nodes:
+            return records, {}                         # no membership (yet): probe everything here
+        local, remote = [], {}
+        for record in records:
+            owner = ring.owner(record.domain)
+            if owner == self.self_url:
+                local.append(record)
+            else:
+                remote.setdefault(owner, []).append(record)
+        return local, remote
+
+    # ----------------------------
+    # Forwarding
+    # ----------------------------
+    def _post(self, peer: str, records: List[DomainRecord]) -> List[Tuple[DomainRecord, Optional[float], bool]]:
+        items = [(r.domain, r.extra.get("probe_profile") if r.extra else None) for r in records]
+        request = urllib.request.Request(
+            f"{peer}/internal/probe", data=json.dumps({"domains": items}).encode("utf-8"), method="POST",
+            headers={"Content-Type": "application/json", PEER_TOKEN_HEADER: self.token or ""},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            body = json.load(response)
+        return [(DomainRecord.from_dict(r), latency, reused) for r, latency, reused in body["results"]]
+
+    def forward(self, remote: Dict[str, List[DomainRecord]]) -> List[Tuple[List[DomainRecord],
+                                                                          concurrent.futures.Future]]:
+        """
+        Send each peer its records, in chunks, in the background. Returns
+        (records, future) pairs; a future's result is a list of (record,
+        latency, reused) and it raises if the peer could not be reached.
+        """
+        pending = []
+        for peer, records in remote.items():
+            for start in range(0, len(records), self.chunk):
+                chunk = records[start:start + self.chunk]
+                pending.append((chunk, self._executor.submit(self._post, peer, chunk)))
+        with self._lock:
+            self._stats["forwarded"] += sum(len(r) for r in remote.values())
+        return pending
+
+    def failed(self, peer_error: Exception, records: List[DomainRecord]) -> None:
+        with self._lock:
+            self._stats["forward_failures"] += len(records)
+        logger.warning(f"Peer probe of {len(records)} domains failed ({peer_error}); probing them locally")
+
+    def authorized(self, token: Optional[str]) -> bool:
+        # Without a shared token nobody is a peer: /internal/probe would be an open probe relay
+        return bool(self.token) and hmac.compare_digest(token or "", self.token)
+
+    def served(self, count: int) -> None:
+        with self._lock:
+            self._stats["served"] += count
+
+    def stats(self) -> Dict[str, Any]:
+        ring = self.ring()
+        with self._lock:
+            return {"self": self.self_url, "members": ring.nodes, "member": self.self_url in ring.nodes,
+                    **self._stats}
+
+
+# Errors that mean "the peer could not answer": its hosts are probed locally instead
+PEER_ERRORS = (OSError, urllib.error.URLError, ValueError, KeyError, TypeError)
+
+
+def from_env() -> Optional[Membership]:
+    """
+    Membership from SCAN_SELF_URL (this instance's base URL as listed) and
+    SCAN_PEERS (comma-separated base URLs) or SCAN_MEMBERSHIP_FILE (one per
+    line, re-read when changed); None when neither is set. Peers
+    authenticate with SCAN_PEER_TOKEN, which is required: without it any
+    client could have this instance probe hosts and ports of its choosing.
+    SCAN_PEER_TIMEOUT (120 s) bounds a
+    forwarded request and SCAN_RING_VNODES (160) sets the ring's points
+    per instance.
+    """
+    peers = [p for p in (os.environ.get("SCAN_PEERS") or "").split(",") if p.strip()]
+    path = os.environ.get("SCAN_MEMBERSHIP_FILE") or None
+    if not peers and not path:
+        return None
+    self_url = os.environ.get("SCAN_SELF_URL")
+    if not self_url:
+        raise ValueError("SCAN_SELF_URL must be set with SCAN_PEERS or SCAN_MEMBERSHIP_FILE")
+    token = os.environ.get("SCAN_PEER_TOKEN")
+    if not token:
+        raise ValueError("SCAN_PEER_TOKEN must be set with SCAN_PEERS or SCAN_MEMBERSHIP_FILE")
+    return Membership(
+        self_url, peers=peers, path=path,
+        vnodes=int(os.environ.get("SCAN_RING_VNODES", "160")),
+        token=token,
+        timeout=float(os.environ.get("SCAN_PEER_TIMEOUT", "120")),
+    )
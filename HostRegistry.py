@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import hashlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from DomainModel import PROBE_FIELDS, DomainRecord
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no deletes; rebuild to forget)."""
+
+    def __init__(self, capacity: int = 100_000, hashes: int = 7):
+        self.size = max(8, capacity * 10)          # ~1% false positives at `capacity` items
+        self.hashes = hashes
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class HostEntry:
+    """
+    One unique host: its id, subscriber count and current record (the latest
+    probe result, or the stored state until it is probed). The record object
+    itself is shared by every user list whose entry for the host is equal.
+    """
+
+    __slots__ = ("host_id", "host", "subscribers", "record", "checked_at")
+
+    def __init__(self, host_id: int, host: str):
+        self.host_id = host_id
+        self.host = host
+        self.subscribers = 0
+        self.record = DomainRecord(host)
+        self.checked_at = 0.0
+
+    def set_result(self, record: DomainRecord, checked_at: float) -> None:
+        self.record = record
+        self.checked_at = checked_at
+
+
+def _shareable(record: DomainRecord) -> bool:
+    """True if `record` holds nothing user-specific (only probe fields besides the scan columns)."""
+    return not record.extra or all(k in PROBE_FIELDS for k in record.extra)
+
+
+class HostRegistry:
+    """
+    Process-wide table of unique monitored hosts shared by all users.
+
+    Every host is stored once with a numeric id, a reference count of the
+    users subscribed to it and its current record; each user only keeps the
+    set of host ids it subscribes to. Probe state lives only in that record:
+    scans merge it into user lists as the very same object (see
+    DomainRecord.merged) and share() swaps equal loaded records for it, so
+    cached lists reference one record per host instead of a copy per user.
+    A Bloom filter in front answers the common "is anyone monitoring this
+    host?" miss without touching the table.
+
+    Results of hosts nobody here subscribes to (probed for another instance
+    that forwarded them) are kept by host name in a small LRU, so the next
+    forward of the same host is answered without probing it again.
+    """
+
+    def __init__(self, bloom_capacity: int = 100_000, peer_results: int = 10_000):
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._entries: Dict[int, HostEntry] = {}
+        self._subscriptions: Dict[str, Set[int]] = {}
+        self._next_id = 1
+        self._bloom_capacity = bloom_capacity
+        self._bloom = BloomFilter(bloom_capacity)
+        self._bloom_items = 0
+        self._peer_results: "OrderedDict[str, HostEntry]" = OrderedDict()
+        self._peer_capacity = peer_results
+
+    # ----------------------------
+    # Subscriptions
+    # ----------------------------
+    def _subscribe(self, subs: Set[int], record: DomainRecord) -> int:
+        host = record.domain
+        host_id = self._ids.get(host)
+        if host_id is None:
+            host = sys.intern(host)
+            host_id = self._next_id
+            self._next_id += 1
+            self._ids[host] = host_id
+            entry = self._entries[host_id] = HostEntry(host_id, host)
+            probed = self._peer_results.pop(host, None)
+            if probed is not None:
+                entry.set_result(probed.record, probed.checked_at)
+            elif _shareable(record):
+                # Not probed here yet: the subscriber's stored state is the best known one
+                entry.record = record
+            self._bloom_add(host)
+        if host_id not in subs:
+            subs.add(host_id)
+            self._entries[host_id].subscribers += 1
+        return host_id
+
+    def _unsubscribe(self, subs: Set[int], host: str) -> None:
+        host_id = self._ids.get(host)
+        if host_id is None or host_id not in subs:
+            return
+        subs.discard(host_id)
+        entry = self._entries[host_id]
+        entry.subscribers -= 1
+        if entry.subscribers <= 0:
+            del self._entries[host_id]
+            del self._ids[host]
+
+    def _bloom_add(self, host: str) -> None:
+        self._bloom.add(host)
+        self._bloom_items += 1
+        # Rebuild once full: this grows the filter and forgets hosts nobody monitors any more
+        if self._bloom_items > self._bloom_capacity:
+            self._bloom_capacity = max(self._bloom_capacity, 2 * len(self._ids))
+            self._bloom = BloomFilter(self._bloom_capacity)
+            for known in self._ids:
+                self._bloom.add(known)
+            self._bloom_items = len(self._ids)
+
+    def is_loaded(self, user: str) -> bool:
+        with self._lock:
+            return user in self._subscriptions
+
+    def sync_user(self, user: str, records: Iterable[DomainRecord]) -> None:
+        """Make `user`'s subscriptions exactly the hosts of `records` (e.g. after loading its list)."""
+        wanted = {r.domain: r for r in records}
+        with self._lock:
+            subs = self._subscriptions.setdefault(user, set())
+            current = {self._entries[i].host for i in subs}
+            for host in current - wanted.keys():
+                self._unsubscribe(subs, host)
+            for host in wanted.keys() - current:
+                self._subscribe(subs, wanted[host])
+
+    def subscribe(self, user: str, records: Iterable[DomainRecord]) -> None:
+        with self._lock:
+            subs = self._subscriptions.setdefault(user, set())
+            for record in records:
+                self._subscribe(subs, record)
+
+    def unsubscribe(self, user: str, hosts: Iterable[str]) -> None:
+        with self._lock:
+            subs = self._subscriptions.get(user)
+            if subs is None:
+                return
+            for host in hosts:
+                self._unsubscribe(subs, host)
+
+    # ----------------------------
+    # Lookups
+    # ----------------------------
+    def is_monitored(self, host: str) -> bool:
+        """True if at least one user subscribes to `host`."""
+        if host not in self._bloom:
+            return False
+        with self._lock:
+            return host in self._ids
+
+    def host_id(self, host: str) -> Optional[int]:
+        with self._lock:
+            return self._ids.get(host)
+
+    def user_host_ids(self, user: str) -> Set[int]:
+        with self._lock:
+            return set(self._subscriptions.get(user, ()))
+
+    def subscribers(self, host: str) -> int:
+        with self._lock:
+            host_id = self._ids.get(host)
+            return self._entries[host_id].subscribers if host_id is not None else 0
+
+    def share(self, records: List[DomainRecord]) -> List[DomainRecord]:
+        """Return `records` with every one equal to its host's current record replaced by that shared object."""
+        with self._lock:
+            ids, entries = self._ids, self._entries
+            shared = []
+            for record in records:
+                host_id = ids.get(record.domain)
+                if host_id is not None and entries[host_id].record == record:
+                    record = entries[host_id].record
+                shared.append(record)
+            return shared
+
+    # ----------------------------
+    # Probe results
+    # ----------------------------
+    def record_probe(self, record: DomainRecord, checked_at: Optional[float] = None) -> None:
+        """Store `record` as the latest probe result of its host."""
+        checked_at = checked_at if checked_at is not None else time.time()
+        with self._lock:
+            host_id = self._ids.get(record.domain)
+            if host_id is not None:
+                self._entries[host_id].set_result(record, checked_at)
+                return
+            entry = self._peer_results.pop(record.domain, None) or HostEntry(0, record.domain)
+            entry.set_result(record, checked_at)
+            self._peer_results[record.domain] = entry
+            while len(self._peer_results) > self._peer_capacity:
+                self._peer_results.popitem(last=False)
+
+    def fresh_result(self, host: str, max_age: float) -> Optional[DomainRecord]:
+        """Return the latest probe result for `host` if it is younger than `max_age` seconds."""
+        with self._lock:
+            host_id = self._ids.get(host)
+            entry = self._entries[host_id] if host_id is not None else self._peer_results.get(host)
+            if entry is None or not entry.checked_at or time.time() - entry.checked_at > max_age:
+                return None
+            return entry.record
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "unique_hosts": len(self._ids),
+                "users": len(self._subscriptions),
+                "subscriptions": sum(len(s) for s in self._subscriptions.values()),
+                "bloom_bits": self._bloom.size,
+                "peer_results": len(self._peer_results),
+            }
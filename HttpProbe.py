@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import http.client
+import os
+import ssl
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from RateLimiter import ConnectionLimiter, SocketSlot
+
+USER_AGENT = "domain-monitor/1.0"
+MAX_BODY = 64 * 1024        # GET bodies up to this size are drained so the connection can be reused
+
+# A reused keep-alive connection the server already closed fails like this; retried once on a fresh one
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine, BrokenPipeError,
+                 ConnectionResetError, ConnectionAbortedError)
+
+
+class HttpResult:
+    """
+    Outcome of one HTTP(S) request: status code, time to first byte (from
+    sending the request to the response headers), connect time (None if a
+    pooled connection was reused) and the server certificate (HTTPS only).
+    `error` is set instead when no response was received.
+    """
+
+    __slots__ = ("status_code", "ttfb_ms", "connect_ms", "reused", "cert", "error")
+
+    def __init__(self, status_code: int = 0, ttfb_ms: Optional[float] = None,
+                 connect_ms: Optional[float] = None, reused: bool = False,
+                 cert: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        self.status_code = status_code
+        self.ttfb_ms = ttfb_ms
+        self.connect_ms = connect_ms
+        self.reused = reused
+        self.cert = cert
+        self.error = error
+
+    def __repr__(self) -> str:
+        return (f"HttpResult(status_code={self.status_code}, ttfb_ms={self.ttfb_ms}, "
+                f"connect_ms={self.connect_ms}, reused={self.reused}, error={self.error!r})")
+
+
+class _Pooled:
+    __slots__ = ("conn", "cert", "idle_since", "slot")
+
+    def __init__(self, conn: http.client.HTTPConnection, cert: Optional[Dict[str, Any]],
+                 slot: Optional[SocketSlot] = None):
+        self.conn = conn
+        self.cert = cert                 # captured at connect time, reused with the connection
+        self.idle_since = time.monotonic()
+        self.slot = slot                 # the connection's share of the limiter's socket budget
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP/HTTPS connections kept between probes.
+
+    Up to `per_host` idle connections are kept per (scheme, host). Across
+    all hosts at most `max_idle` are kept, and the least recently used are
+    closed first. Connections idle for longer than `idle_timeout` seconds
+    are not reused, because servers close them on their own. HEAD is used
+    by default. Servers that reject it (405/501) get a GET, whose body is
+    drained up to MAX_BODY so the connection stays reusable.
+
+    With a `limiter`, new connections wait for its rate limits and socket
+    budget; idle connections count against the budget and the least
+    recently used one is closed when the budget runs out.
+    """
+
+    def __init__(self, per_host: int = 2, max_idle: int = 256, idle_timeout: float = 30.0,
+                 timeout: float = 3.0, method: str = "HEAD", limiter: Optional[ConnectionLimiter] = None):
+        self.per_host = per_host
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.method = method
+        self.limiter = limiter
+        self._ssl = ssl.create_default_context()
+        self._lock = threading.Lock()
+        self._idle: "OrderedDict[Tuple[str, str], List[_Pooled]]" = OrderedDict()
+        self._idle_count = 0
+        self._stats = {"requests": 0, "reused": 0, "opened": 0, "closed": 0, "errors": 0}
+
+    # ----------------------------
+    # Pool
+    # ----------------------------
+    def _acquire(self, key: Tuple[str, str]) -> Optional[_Pooled]:
+        expired = []
+        pooled = None
+        with self._lock:
+            idle = self._idle.get(key)
+            while idle:
+                candidate = idle.pop()
+                self._idle_count -= 1
+                if time.monotonic() - candidate.idle_since < self.idle_timeout:
+                    pooled = candidate
+                    break
+                expired.append(candidate)
+            if idle is not None and not idle:
+                del self._idle[key]
+        for stale in expired:
+            self._close(stale)
+        return pooled
+
+    def _release(self, key: Tuple[str, str], pooled: _Pooled) -> None:
+        evicted = []
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+            if len(idle) >= self.per_host:
+                evicted.append(pooled)
+            else:
+                pooled.idle_since = time.monotonic()
+                idle.append(pooled)
+                self._idle_count += 1
+            while self._idle_count > self.max_idle:
+                oldest_key, oldest = next(iter(self._idle.items()))
+                evicted.append(oldest.pop(0))
+                self._idle_count -= 1
+                if not oldest:
+                    del self._idle[oldest_key]
+        for conn in evicted:
+            self._close(conn)
+
+    def _close(self, pooled: _Pooled) -> None:
+        pooled.conn.close()
+        if pooled.slot is not None:
+            pooled.slot.release()
+        with self._lock:
+            self._stats["closed"] += 1
+
+    def _reclaim(self) -> bool:
+        """Close the least recently used idle connection; False if there is none."""
+        with self._lock:
+            if not self._idle:
+                return False
+            oldest_key, oldest = next(iter(self._idle.items()))
+            pooled = oldest.pop(0)
+            self._idle_count -= 1
+            if not oldest:
+                del self._idle[oldest_key]
+        self._close(pooled)
+        return True
+
+    def _connect(self, scheme: str, host: str, address: Optional[str] = None) -> Tuple[_Pooled, float]:
+        # Raises RateLimited (not caught by probe()) when the limiter keeps refusing
+        slot = self.limiter.acquire(address or host, reclaim=self._reclaim) if self.limiter else None
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, timeout=self.timeout, context=self._ssl)
+        else:
+            conn = http.client.HTTPConnection(host, timeout=self.timeout)
+        started = time.perf_counter()
+        try:
+            conn.connect()
+        except BaseException:
+            conn.close()
+            if slot is not None:
+                slot.release()
+            raise
+        connect_ms = (time.perf_counter() - started) * 1000
+        cert = conn.sock.getpeercert() if scheme == "https" else None
+        with self._lock:
+            self._stats["opened"] += 1
+        return _Pooled(conn, cert, slot), connect_ms
+
+    # ----------------------------
+    # Probing
+    # ----------------------------
+    def _request(self, pooled: _Pooled, host: str, method: str) -> Tuple[http.client.HTTPResponse, float]:
+        started = time.perf_counter()
+        pooled.conn.request(method, "/", headers={"Host": host, "User-Agent": USER_AGENT,
+                                                  "Accept": "*/*", "Connection": "keep-alive"})
+        response = pooled.conn.getresponse()
+        ttfb_ms = (time.perf_counter() - started) * 1000
+        # Drain the body (nothing for HEAD) so the connection can carry the next request
+        response.read(MAX_BODY)
+        return response, ttfb_ms
+
+    def probe(self, host: str, scheme: str = "https", address: Optional[str] = None) -> HttpResult:
+        """
+        Send one request to `scheme://host/` over a pooled or new connection
+        (`address`, the host's resolved IP if known, keys the per-destination
+        rate limits).
+        """
+        key = (scheme, host)
+        pooled, connect_ms = self._acquire(key), None
+        reused = pooled is not None
+        try:
+            if pooled is None:
+                pooled, connect_ms = self._connect(scheme, host, address)
+            method = self.method
+            try:
+                response, ttfb_ms = self._request(pooled, host, method)
+            except _STALE_ERRORS:
+                if not reused:
+                    raise
+                # The server dropped the idle connection: retry once on a fresh one
+                self._close(pooled)
+                pooled, reused = None, False
+                pooled, connect_ms = self._connect(scheme, host, address)
+                response, ttfb_ms = self._request(pooled, host, method)
+            if method == "HEAD" and response.status in (405, 501):
+                if response.will_close or not response.isclosed():
+                    self._close(pooled)
+                    pooled = None
+                    pooled, connect_ms = self._connect(scheme, host, address)
+                response, ttfb_ms = self._request(pooled, host, "GET")
+        except (OSError, http.client.HTTPException) as e:
+            if pooled is not None:
+                self._close(pooled)
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["errors"] += 1
+            return HttpResult(connect_ms=connect_ms, reused=reused, error=f"{type(e).__name__}: {e}")
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["reused"] += reused
+        if response.will_close or not response.isclosed():
+            self._close(pooled)            # server asked to close, or the body was too large to drain
+        else:
+            self._release(key, pooled)
+        return HttpResult(response.status, round(ttfb_ms, 1),
+                          round(connect_ms, 1) if connect_ms is not None else None, reused, pooled.cert)
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            idle = [p for conns in self._idle.values() for p in conns]
+            self._idle.clear()
+            self._idle_count = 0
+        for pooled in idle:
+            self._close(pooled)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "idle": self._idle_count, "hosts": len(self._idle)}
+
+
+def from_env(limiter: Optional[ConnectionLimiter] = None) -> ConnectionPool:
+    """
+    Build a pool from PROBE_POOL_PER_HOST (2), PROBE_POOL_MAX_IDLE (256),
+    PROBE_POOL_IDLE_SECONDS (30), PROBE_HTTP_TIMEOUT (3 s) and
+    PROBE_HTTP_METHOD (HEAD), limited by `limiter` if given.
+    """
+    return ConnectionPool(
+        per_host=int(os.environ.get("PROBE_POOL_PER_HOST", "2")),
+        max_idle=int(os.environ.get("PROBE_POOL_MAX_IDLE", "256")),
+        idle_timeout=float(os.environ.get("PROBE_POOL_IDLE_SECONDS", "30")),
+        timeout=float(os.environ.get("PROBE_HTTP_TIMEOUT", "3")),
+        method=(os.environ.get("PROBE_HTTP_METHOD") or "HEAD").upper(),
+        limiter=limiter,
+    )
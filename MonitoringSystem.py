@@ -1,115 +1,239 @@
-import socket
-import ssl
+import os
+import time
 import concurrent.futures
-from datetime import datetime, timezone
-from typing import Dict, Any, List
+from typing import Iterator, List, Optional, Tuple
+import HttpProbe
 from logger import setup_logger
-from DomainManagementEngine import DomainManagementEngine
+from DomainManagementEngine import DomainManagementEngine, USERS_DATA_DIR
+from DomainModel import DomainRecord, DomainStatus
+import HashRing
+from ProbePipeline import ProbeProfiles
+import RateLimiter
+from ScanCheckpoint import ScanCheckpoints
+import ScanCoordinator
+import ShardedScanner
 
 logger = setup_logger("MonitoringSystem")
 
-SSL_CTX = ssl.create_default_context()
+# A probe result younger than this (seconds) is reused for every user watching
+# the same host instead of probing it again; 0 always probes.
+PROBE_REUSE_SECONDS = float(os.environ.get("PROBE_REUSE_SECONDS", "60"))
+
+# Default probe profile (see ProbePipeline.ProbeProfiles): "socket" checks TLS
+# on port 443 and falls back to port 80 (reachability only); "http" (or "web")
+# sends a real HTTP(S) request over pooled keep-alive connections and records
+# its status code and time to first byte. Domains can pick their own profile.
+PROBE_MODE = (os.environ.get("PROBE_MODE") or "socket").lower()
+
+# Every new probe connection waits for the global / per-IP / per-/24 rate
+# limits and the open-socket budget (see RateLimiter).
+limiter = RateLimiter.from_env()
+http_pool = HttpProbe.from_env(limiter)
+profiles = ProbeProfiles(http_pool, default="web" if PROBE_MODE == "http" else PROBE_MODE)
+
+# Scans probing at least SCAN_SHARD_MIN_DOMAINS domains are split across
+# SCAN_PROCESSES worker processes (see ShardedScanner); 0 keeps every scan
+# on this process's thread pool.
+sharded_scanner = ShardedScanner.from_env(profiles.default.name)
+
+# With SCAN_COORDINATOR set (and the coordinator started by app.py), scans
+# are handed out in leased batches to probe workers on other hosts
+# (python ScanCoordinator.py --connect ...) whenever any are connected.
+coordinator = ScanCoordinator.from_env()
+
+# With SCAN_PEERS or SCAN_MEMBERSHIP_FILE set, each app instance probes only
+# its consistent-hash slice of the hosts and asks the owning instance for the
+# rest (see HashRing.Membership).
+membership = HashRing.from_env()
+
+# Long scans commit their results in batches: every N results or T seconds,
+# whichever comes first. A scan interrupted less than SCAN_RESUME_SECONDS ago
+# is resumed from the domains it had not committed yet.
+SCAN_CHECKPOINT_RESULTS = int(os.environ.get("SCAN_CHECKPOINT_RESULTS", "100"))
+SCAN_CHECKPOINT_SECONDS = float(os.environ.get("SCAN_CHECKPOINT_SECONDS", "5"))
+checkpoints = ScanCheckpoints(
+    os.environ.get("SCAN_CHECKPOINT_DIR") or os.path.join(USERS_DATA_DIR, "scans"),
+    max_age=float(os.environ.get("SCAN_RESUME_SECONDS", "3600")),
+)
 
 class MonitoringSystem:
     @staticmethod
-    def _check_domain(domain: str) -> Dict[str, Any]:
+    def _check_domain(domain: str) -> DomainRecord:
         """
-        Check reachability and SSL certificate details using sockets.
-        Falls back to HTTP port 80 if SSL is unavailable.
-        Returns: Live / Expired SSL / Down
+        Check reachability and SSL certificate details with the default probe
+        profile. Returns a DomainRecord with status Live / Down.
         """
-        result = {
-            "domain": domain,
-            "status": "Down",
-            "ssl_expiration": "N/A",
-            "ssl_issuer": "N/A"
-        }
-
-        # Normalize host
-        host = domain.lower().strip().replace("http://", "").replace("https://", "").split("/")[0]
-
-        # DNS Check - no need to check further if the dns did not resolve the ip
-        try:
-            ip = socket.gethostbyname(host)
-        except Exception as e:
-            logger.warning(f"DNS failed to resolve the domain: {domain}")
-            return result
-
-        # --- Try HTTPS first ---
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(1)
-                if sock.connect_ex((host, 443)) == 0:
-                    with SSL_CTX.wrap_socket(sock, server_hostname=host) as ssock:
-                        cert = ssock.getpeercert()
-
-                        expiry_str = cert.get("notAfter")
-                        if expiry_str:
-                            expiry_date = datetime.strptime(expiry_str, "%b %d %H:%M:%S %Y %Z").replace(
-                                tzinfo=timezone.utc
-                            )
-                            result["ssl_expiration"] = expiry_date.strftime("%Y-%m-%d")
-
-                            result["status"] = "Live"
-
-                        issuer = next(
-                            (v for tup in cert.get("issuer", []) for k, v in tup if k == "organizationName"),
-                            None
-                        )
-                        result["ssl_issuer"] = issuer or "Unknown"
-
-                        return result 
-                else:
-                    logger.debug(f"HTTPS connection is unavailable for {domain}")
-
-        except (socket.timeout, ssl.SSLError) as e:
-            logger.warning(f"HTTPS failed for {domain}: {e}")
-        except Exception as e:
-            logger.error(f"HTTPS Error for {domain}: {e}")
-
-        # --- Fallback: try HTTP port 80 ---
-        try:   
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(1)
-                if sock.connect_ex((host, 80)) == 0:
-                    http_request = f"HEAD / HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n"
-                    sock.sendall(http_request.encode())
-                    response = sock.recv(512).decode(errors="ignore")
-
-                    if "HTTP" in response:
-                        result["status"] = "Live"
-                    else:
-                        result["status"] = "Down"
-                else:
-                    logger.debug(f"HTTP connection is unavailable for {domain}")
+        return profiles.probe(domain)[0]
 
-        except socket.timeout:
-            logger.warning(f"Timeout while checking HTTP for {domain}")
-        except Exception as e:
-            logger.warning(f"HTTP fallback failed for {domain}: {e}")
+    @staticmethod
+    def _probe(record: DomainRecord) -> Tuple[DomainRecord, Optional[float]]:
+        """
+        Probe one domain with its own profile ("probe_profile" field) or the
+        default one; return the result and its latency in ms (time to first
+        byte when an HTTP stage ran, else the duration of the probe).
+        """
+        profile = record.extra.get("probe_profile") if record.extra else None
+        return profiles.probe(record.domain, profile)
 
-        return result
+    @staticmethod
+    def _probe_batches(records: List[DomainRecord],
+                       max_workers: int) -> Iterator[List[Tuple[DomainRecord, Optional[float]]]]:
+        """
+        Probe `records` and yield their (result, latency) pairs as they
+        complete, or an empty list after SCAN_CHECKPOINT_SECONDS without any.
+        Remote workers get the work when connected (what they cannot probe
+        is probed here); otherwise large sets are sharded across worker
+        processes.
+        """
+        items = [(r.domain, r.extra.get("probe_profile") if r.extra else None) for r in records]
+        if coordinator is not None and records and coordinator.has_workers():
+            failed = yield from coordinator.scan(items, tick=SCAN_CHECKPOINT_SECONDS)
+            if not failed:
+                return
+            logger.warning(f"{len(failed)} domains could not be probed by remote workers; probing them locally")
+            failed_domains = {domain for domain, _ in failed}
+            records = [r for r in records if r.domain in failed_domains]
+        elif sharded_scanner.enabled_for(len(records)):
+            yield from sharded_scanner.scan(items, tick=SCAN_CHECKPOINT_SECONDS, metrics=profiles.metrics)
+            return
 
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {executor.submit(MonitoringSystem._probe, r) for r in records}
+            while pending:
+                completed, pending = concurrent.futures.wait(
+                    pending, timeout=SCAN_CHECKPOINT_SECONDS, return_when=concurrent.futures.FIRST_COMPLETED)
+                batch = []
+                for future in completed:
+                    try:
+                        batch.append(future.result())
+                    except Exception as e:
+                        logger.error(f"Domain check failed in worker: {e}")
+                yield batch
 
     @staticmethod
-    def scan_user_domains(username: str, dme: DomainManagementEngine, max_workers: int = 50) -> List[Dict[str, Any]]:
+    def probe_for_peer(items: List[Tuple[str, Optional[str]]], dme: DomainManagementEngine,
+                       max_workers: int = 50) -> List[Tuple[DomainRecord, Optional[float], bool]]:
+        """
+        Probe (domain, profile) pairs for another app instance's scan (this
+        instance owns them on the hash ring). A recent result of our own is
+        returned as shared (True) instead of probing the host again.
+        """
+        results, to_probe = [], []
+        for domain, profile in items:
+            fresh = dme.hosts.fresh_result(domain, PROBE_REUSE_SECONDS) if PROBE_REUSE_SECONDS > 0 else None
+            if fresh is not None:
+                results.append((fresh, None, True))
+            else:
+                to_probe.append(DomainRecord(domain, extra={"probe_profile": profile} if profile else None))
+        for completed in MonitoringSystem._probe_batches(to_probe, max_workers):
+            for result, latency in completed:
+                dme.hosts.record_probe(result)
+                results.append((result, latency, False))
+        return results
+
+    @staticmethod
+    def scan_user_domains(username: str, dme: DomainManagementEngine, max_workers: int = 50) -> List[DomainRecord]:
         """
         Run SSL and reachability checks for all domains concurrently.
+        Results are merged into the stored list in batches as they arrive, so
+        an interrupted scan keeps what it probed and the next one resumes.
+        A scan started while another one of the same user runs waits for it
+        (it must not take the running scan's checkpoint for an interrupted one).
         """
+        with checkpoints.scan_lock(username):
+            return MonitoringSystem._scan_user_domains(username, dme, max_workers)
+
+    @staticmethod
+    def _scan_user_domains(username: str, dme: DomainManagementEngine, max_workers: int) -> List[DomainRecord]:
         domains = dme.load_user_domains(username)
         if not domains:
             logger.info(f"No domains found for user {username}")
             return []
 
-        results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(MonitoringSystem._check_domain, d["domain"]): d for d in domains}
-            for future in concurrent.futures.as_completed(futures):
-                try:
-                    results.append(future.result())
-                except Exception as e:
-                    logger.error(f"Domain check failed in worker: {e}")
-
-        dme.save_user_domains(username, results)
-        logger.info(f"{len(results)} domains scanned for {username}")
+        # Domains an interrupted earlier run already committed are not probed again
+        done = checkpoints.resume(username)
+        results = [d for d in domains if d.domain in done]
+
+        # Hosts are shared between users: reuse results another scan produced recently
+        # (subscriptions and indexes are kept in step by load/add/remove, not per scan)
+        batch, to_probe = [], []
+        for d in domains:
+            if d.domain in done:
+                continue
+            fresh = dme.hosts.fresh_result(d.domain, PROBE_REUSE_SECONDS) if PROBE_REUSE_SECONDS > 0 else None
+            if fresh is not None:
+                batch.append(fresh)
+            else:
+                to_probe.append(d)
+
+        reused = len(batch)
+
+        # Hosts another app instance owns are probed (or reused) there
+        forwarded = []
+        if membership is not None and to_probe:
+            to_probe, remote = membership.split(to_probe)
+            forwarded = membership.forward(remote)
+
+        changed, probes = 0, []
+
+        def commit():
+            nonlocal changed, batch, probes
+            if probes:
+                # Only own probes go to the history; reused results were recorded by their scan
+                dme.history.record(probes)
+                probes = []
+            if batch:
+                # Merged into the current stored list: only domains whose results changed are written
+                changed += dme.update_domains(username, batch)
+                # The checkpoint must never list results the write-back cache has not saved yet
+                dme.flush(username)
+                checkpoints.commit(username, (r.domain for r in batch))
+                results.extend(batch)
+                batch = []
+            return time.monotonic()
+
+        last_commit = time.monotonic()
+
+        def accept(result: DomainRecord, latency: Optional[float]) -> None:
+            # Response times are only meaningful for hosts that answered
+            latency = latency if result.status == DomainStatus.LIVE else None
+            dme.hosts.record_probe(result)
+            dme.rolling.record(result, latency)
+            probes.append((result, latency))
+            batch.append(result)
+
+        def commit_if_due():
+            nonlocal last_commit
+            if len(batch) >= SCAN_CHECKPOINT_RESULTS or \
+                    time.monotonic() - last_commit >= SCAN_CHECKPOINT_SECONDS:
+                last_commit = commit()
+
+        for completed in MonitoringSystem._probe_batches(to_probe, max_workers):
+            for result, latency in completed:
+                accept(result, latency)
+            commit_if_due()
+
+        # Results of the peers; the domains of a peer that did not answer are probed here
+        unanswered = []
+        for records, future in forwarded:
+            try:
+                for result, latency, shared in future.result():
+                    if shared:
+                        batch.append(result)           # the owner's recent result, already recorded there
+                    else:
+                        accept(result, latency)
+            except HashRing.PEER_ERRORS as e:
+                membership.failed(e, records)
+                unanswered.extend(records)
+            commit_if_due()
+        for completed in MonitoringSystem._probe_batches(unanswered, max_workers):
+            for result, latency in completed:
+                accept(result, latency)
+            commit_if_due()
+
+        commit()
+        checkpoints.finish(username)
+        logger.info(f"{len(results)} domains scanned for {username} "
+                    f"({len(done)} resumed, {reused} shared results reused, "
+                    f"{sum(len(r) for r, _ in forwarded)} sent to peers, {changed} changed)")
         return results
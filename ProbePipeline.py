@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import calendar
+import concurrent.futures
+import os
+import socket
+import ssl
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import HttpProbe
+from DomainModel import DomainRecord, DomainStatus
+from RateLimiter import ConnectionLimiter, SocketSlot
+from logger import setup_logger
+
+logger = setup_logger("ProbePipeline")
+
+SSL_CTX = ssl.create_default_context()
+
+# getaddrinfo() has no timeout of its own: lookups run here and are waited for with one.
+# Sized above the scan's probe threads so lookups do not queue behind each other.
+_resolver = concurrent.futures.ThreadPoolExecutor(max_workers=int(os.environ.get("PROBE_DNS_THREADS", "64")),
+                                                  thread_name_prefix="dns")
+
+
+def apply_cert(record: DomainRecord, cert: Dict[str, Any]) -> None:
+    """Copy the certificate's expiry and issuer (organizationName) into `record`."""
+    issuer = next(
+        (v for tup in cert.get("issuer", []) for k, v in tup if k == "organizationName"),
+        None
+    )
+    record.issuer = sys.intern(issuer or "Unknown")
+
+    expiry_str = cert.get("notAfter")
+    if expiry_str:
+        expiry_date = datetime.strptime(expiry_str, "%b %d %H:%M:%S %Y %Z")
+        # Stored at day resolution (midnight UTC), like the "YYYY-MM-DD" it serialises to
+        record.expires_at = calendar.timegm(expiry_date.date().timetuple())
+
+
+class ProbeContext:
+    """State handed from stage to stage while probing one domain."""
+
+    __slots__ = ("host", "record", "addresses", "sock", "slot", "status", "latency_ms")
+
+    def __init__(self, domain: str):
+        self.host = domain.lower().strip().replace("http://", "").replace("https://", "").split("/")[0]
+        self.record = DomainRecord(domain, DomainStatus.DOWN)
+        self.addresses: List[str] = []
+        self.sock: Optional[socket.socket] = None     # open connection for the next stage, if any
+        self.slot: Optional[SocketSlot] = None        # its share of the limiter's socket budget
+        self.status: Optional[DomainStatus] = None    # set by stages that decide more than up/down
+        self.latency_ms: Optional[float] = None       # set by stages that measure a response time
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        if self.slot is not None:
+            self.slot.release()
+            self.slot = None
+
+
+class Stage:
+    """
+    One step of a probe. run() returns True if the check passed.
+
+    A failed stage ends the probe as Down unless it is `optional`, in which
+    case the next stage is tried instead (a fallback). A passed `final`
+    stage ends the probe as Live without running the remaining stages.
+    """
+
+    name = "stage"
+    reports: Tuple[str, ...] = ()      # extra fields (DomainModel.PROBE_FIELDS) the stage sets
+
+    def __init__(self, timeout: float, optional: bool = False, final: bool = False):
+        self.timeout = timeout
+        self.optional = optional
+        self.final = final
+
+    def run(self, ctx: ProbeContext) -> bool:
+        raise NotImplementedError
+
+
+class DnsStage(Stage):
+    """Resolve the host (IPv4 and IPv6)."""
+
+    name = "dns"
+
+    def run(self, ctx: ProbeContext) -> bool:
+        future = _resolver.submit(socket.getaddrinfo, ctx.host, None, 0, socket.SOCK_STREAM)
+        try:
+            infos = future.result(timeout=self.timeout)
+        except (OSError, concurrent.futures.TimeoutError):
+            return False
+        ctx.addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        return bool(ctx.addresses)
+
+
+class TcpStage(Stage):
+    """
+    Open a TCP connection to `port` on the first reachable address; it stays
+    open for the next stage. Each attempt waits for the limiter, if any.
+    """
+
+    def __init__(self, port: int, timeout: float, limiter: Optional[ConnectionLimiter] = None, **kwargs):
+        super().__init__(timeout, **kwargs)
+        self.port = port
+        self.limiter = limiter
+        self.name = f"tcp:{port}"
+
+    def run(self, ctx: ProbeContext) -> bool:
+        ctx.close()
+        for address in ctx.addresses or [ctx.host]:
+            # RateLimited propagates: the probe is skipped, not reported as Down
+            ctx.slot = self.limiter.acquire(address) if self.limiter else None
+            try:
+                ctx.sock = socket.create_connection((address, self.port), timeout=self.timeout)
+                return True
+            except OSError:
+                ctx.close()
+                continue
+        return False
+
+
+class TlsStage(Stage):
+    """TLS handshake over the open connection; records the certificate's expiry and issuer."""
+
+    name = "tls"
+
+    def run(self, ctx: ProbeContext) -> bool:
+        if ctx.sock is None:
+            return False
+        ctx.sock.settimeout(self.timeout)
+        try:
+            ctx.sock = SSL_CTX.wrap_socket(ctx.sock, server_hostname=ctx.host)
+            apply_cert(ctx.record, ctx.sock.getpeercert())
+        except (OSError, ValueError) as e:
+            logger.debug(f"TLS failed for {ctx.host}: {e}")
+            ctx.close()
+            return False
+        return True
+
+
+class HttpPeekStage(Stage):
+    """Send a bare HEAD over the open connection and accept anything that looks like HTTP."""
+
+    name = "http-peek"
+
+    def run(self, ctx: ProbeContext) -> bool:
+        if ctx.sock is None:
+            return False
+        ctx.sock.settimeout(self.timeout)
+        try:
+            ctx.sock.sendall(f"HEAD / HTTP/1.1\r\nHost: {ctx.host}\r\nConnection: close\r\n\r\n".encode())
+            return "HTTP" in ctx.sock.recv(512).decode(errors="ignore")
+        except OSError:
+            return False
+        finally:
+            ctx.close()
+
+
+class HttpStage(Stage):
+    """
+    Real HTTP(S) request over the shared keep-alive pool: records the status
+    code (5xx is Down), the certificate (HTTPS) and the time to first byte.
+    """
+
+    reports = ("http_status",)
+
+    def __init__(self, scheme: str, pool: HttpProbe.ConnectionPool, **kwargs):
+        super().__init__(pool.timeout, **kwargs)
+        self.scheme = scheme
+        self.pool = pool
+        self.name = scheme
+
+    def run(self, ctx: ProbeContext) -> bool:
+        response = self.pool.probe(ctx.host, self.scheme, ctx.addresses[0] if ctx.addresses else None)
+        if response.error is not None:
+            logger.debug(f"{self.scheme.upper()} probe failed for {ctx.host}: {response.error}")
+            return False
+        if response.cert:
+            apply_cert(ctx.record, response.cert)
+        ctx.record.extra = {"http_status": response.status_code}
+        ctx.status = DomainStatus.LIVE if response.status_code < 500 else DomainStatus.DOWN
+        ctx.latency_ms = response.ttfb_ms
+        return True
+
+
+class Pipeline:
+    """
+    An ordered list of stages run for one domain. It stops at the first
+    decisive result (a failed required stage or a passed final stage), so
+    a cheap profile costs only its first round trip. Every stage's runs,
+    failures and time are counted per stage name.
+    """
+
+    def __init__(self, name: str, stages: Sequence[Stage]):
+        self.name = name
+        self.stages = list(stages)
+
+    @property
+    def reports(self) -> Tuple[str, ...]:
+        """The extra fields (DomainModel.PROBE_FIELDS) results of this pipeline can carry."""
+        return tuple(sorted({field for stage in self.stages for field in stage.reports}))
+
+    def run(self, domain: str, metrics: "PipelineMetrics") -> Tuple[DomainRecord, Optional[float]]:
+        """Probe `domain`; return the result and its latency in ms (TTFB if measured, else probe time)."""
+        ctx = ProbeContext(domain)
+        started = time.perf_counter()
+        passed = False
+        try:
+            for stage in self.stages:
+                stage_started = time.perf_counter()
+                passed = stage.run(ctx)
+                metrics.count(stage.name, passed, (time.perf_counter() - stage_started) * 1000)
+                if not passed and not stage.optional:
+                    break
+                if passed and stage.final:
+                    break
+        finally:
+            ctx.close()
+        if passed:
+            ctx.record.status = ctx.status or DomainStatus.LIVE
+        latency = ctx.latency_ms if ctx.latency_ms is not None else (time.perf_counter() - started) * 1000
+        return ctx.record, latency
+
+
+class PipelineMetrics:
+    """Per stage: runs, failures and total time (ms)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: Dict[str, List[float]] = {}
+
+    def count(self, stage: str, passed: bool, elapsed_ms: float) -> None:
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += not passed
+            entry[2] += elapsed_ms
+
+    def snapshot(self) -> Dict[str, List[float]]:
+        """Raw counters ({stage: [runs, failures, total_ms]}), e.g. to merge() into another process's metrics."""
+        with self._lock:
+            return {name: list(entry) for name, entry in self._stages.items()}
+
+    def merge(self, snapshot: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for name, (runs, failures, total) in snapshot.items():
+                entry = self._stages.setdefault(name, [0, 0, 0.0])
+                entry[0] += runs
+                entry[1] += failures
+                entry[2] += total
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: {"runs": runs, "failures": failures, "avg_ms": round(total / runs, 2) if runs else None}
+                    for name, (runs, failures, total) in self._stages.items()}
+
+
+class ProbeProfiles:
+    """
+    Named pipelines, chosen per domain by its "probe_profile" field:
+
+    - "dns":        resolve only (parked domains)
+    - "tcp[:port]": resolve and connect to a port (default 443), e.g. "tcp:25"
+    - "tls":        resolve, connect to 443 and check the certificate
+    - "web":        resolve, then an HTTPS request, falling back to HTTP
+    - "socket":     resolve, TLS on 443, falling back to a HEAD peek on port 80
+    - "default":    whichever of these the deployment uses by default (PROBE_MODE)
+
+    Stage timeouts come from PROBE_DNS_TIMEOUT (2 s), PROBE_TCP_TIMEOUT (1 s)
+    and PROBE_TLS_TIMEOUT (1 s); HTTP stages use the pool's timeout. New
+    connections go through the pool's limiter (RateLimiter), if it has one.
+    """
+
+    NAMES = ("dns", "tcp", "tls", "web", "socket", "default")
+
+    def __init__(self, pool: HttpProbe.ConnectionPool, default: str = "socket"):
+        self.pool = pool
+        self.dns_timeout = float(os.environ.get("PROBE_DNS_TIMEOUT", "2"))
+        self.tcp_timeout = float(os.environ.get("PROBE_TCP_TIMEOUT", "1"))
+        self.tls_timeout = float(os.environ.get("PROBE_TLS_TIMEOUT", "1"))
+        self.metrics = PipelineMetrics()
+        self._lock = threading.Lock()
+        self._pipelines: Dict[str, Pipeline] = {}
+        default = (default or "").lower()
+        self.default = self._build(default if self.valid(default) and default != "default" else "socket")
+
+    @classmethod
+    def valid(cls, name: str) -> bool:
+        kind, _, port = (name or "").lower().partition(":")
+        if kind not in cls.NAMES:
+            return False
+        return not port or (kind == "tcp" and port.isdigit() and 0 < int(port) < 65536)
+
+    def _build(self, name: str) -> Pipeline:
+        kind, _, port = name.partition(":")
+        limiter = self.pool.limiter
+        dns = DnsStage(self.dns_timeout)
+        if kind == "dns":
+            return Pipeline(name, [dns])
+        if kind == "tcp":
+            return Pipeline(name, [dns, TcpStage(int(port or 443), self.tcp_timeout, limiter)])
+        if kind == "tls":
+            return Pipeline(name, [dns, TcpStage(443, self.tcp_timeout, limiter), TlsStage(self.tls_timeout)])
+        if kind == "web":
+            return Pipeline(name, [dns, HttpStage("https", self.pool, optional=True, final=True),
+                                   HttpStage("http", self.pool)])
+        return Pipeline(name, [
+            dns,
+            TcpStage(443, self.tcp_timeout, limiter, optional=True),
+            TlsStage(self.tls_timeout, optional=True, final=True),
+            TcpStage(80, self.tcp_timeout, limiter),
+            HttpPeekStage(self.tcp_timeout),
+        ])
+
+    def parse(self, name: Optional[str]) -> Pipeline:
+        """Pipeline for a profile name; unknown or empty names get the default."""
+        name = (name or "").lower()
+        if not self.valid(name) or name == "default":
+            return self.default
+        with self._lock:
+            pipeline = self._pipelines.get(name)
+            if pipeline is None:
+                pipeline = self._pipelines[name] = self._build(name)
+            return pipeline
+
+    def probe(self, domain: str, profile: Optional[str] = None) -> Tuple[DomainRecord, Optional[float]]:
+        return self.parse(profile).run(domain, self.metrics)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"default": self.default.name, "stages": self.metrics.stats()}
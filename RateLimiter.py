@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import ipaddress
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class RateLimited(Exception):
+    """
+    No connection could be started within the limiter's max wait. Not an
+    OSError on purpose: probe stages treat OSError as "Down", while a probe
+    we chose not to run has no result at all.
+    """
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`; rate 0 means unlimited."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until the next token is free (0 if one is now); refills first."""
+        if not self.rate:
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Reserve the next token; the balance goes negative while tokens are reserved ahead."""
+        if self.rate:
+            self.tokens -= 1
+
+
+def network_of(address: str) -> Optional[str]:
+    """The /24 of an IPv4 address (/64 for IPv6), or None for a host name."""
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return None
+    prefix = 24 if ip.version == 4 else 64
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+class SocketSlot:
+    """One socket of the budget, held while the connection is open; release() is idempotent."""
+
+    __slots__ = ("_limiter", "_released")
+
+    def __init__(self, limiter: "ConnectionLimiter"):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._limiter._release_socket()
+
+
+class ConnectionLimiter:
+    """
+    Limits the new outbound connections of the probes: token buckets for
+    all of them (global), for each destination IP and for each /24, plus a
+    budget of sockets open at once (file descriptors, ephemeral ports).
+
+    A connection first reserves a token of all three buckets and sleeps
+    until the latest of them is due (reservations are first come, first
+    served), then waits for a free socket. When the budget is full, the caller can reclaim an idle
+    socket (the HTTP pool closes its least recently used connection).
+    Waiting replaces failing: a burst of probes is spread over time instead
+    of tripping upstream rate limits or running out of ports. The wait is
+    capped at `max_wait` seconds, after which RateLimited is raised and the
+    probe is skipped rather than reported as Down.
+
+    Per-destination buckets are kept for the `max_keys` most recent
+    destinations. Every wait is counted by what caused it (the saturation
+    counters in stats()).
+    """
+
+    def __init__(self, rate: float = 300.0, burst: Optional[float] = None,
+                 per_ip_rate: float = 20.0, per_ip_burst: Optional[float] = None,
+                 per_net_rate: float = 100.0, per_net_burst: Optional[float] = None,
+                 max_sockets: int = 512, max_wait: float = 120.0, max_keys: int = 65536):
+        self.per_ip = (per_ip_rate, per_ip_burst if per_ip_burst is not None else 2 * per_ip_rate)
+        self.per_net = (per_net_rate, per_net_burst if per_net_burst is not None else 2 * per_net_rate)
+        self.max_sockets = max_sockets
+        self.max_wait = max_wait
+        self.max_keys = max_keys
+        self._global = TokenBucket(rate, burst if burst is not None else rate)
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._lock = threading.Condition()
+        self._open = 0
+        self._stats = {"connections": 0, "throttled": 0, "throttled_global": 0, "throttled_ip": 0,
+                       "throttled_net": 0, "wait_ms": 0.0, "max_wait_ms": 0.0, "socket_waits": 0,
+                       "reclaimed": 0, "timeouts": 0, "peak_sockets": 0}
+
+    def _bucket(self, key: str, limits: Tuple[float, float]) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*limits)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _reserve(self, address: str, deadline: float) -> float:
+        """Reserve a token of every bucket of `address`; return how long to wait for it. Caller holds the lock."""
+        net = network_of(address)
+        buckets: List[Tuple[str, TokenBucket]] = [("global", self._global)]
+        if self.per_ip[0]:
+            buckets.append(("ip", self._bucket(f"ip:{address}", self.per_ip)))
+        if net is not None and self.per_net[0]:
+            buckets.append(("net", self._bucket(f"net:{net}", self.per_net)))
+        now = time.monotonic()
+        wait, cause = max((bucket.wait_time(now), name) for name, bucket in buckets)
+        if wait > 0:
+            self._stats["throttled"] += 1
+            self._stats[f"throttled_{cause}"] += 1
+            if now + wait > deadline:
+                self._stats["timeouts"] += 1
+                raise RateLimited(f"Connection rate limit ({cause}) for {address}")
+        for _, bucket in buckets:
+            bucket.take()
+        return wait
+
+    def _take_socket(self, deadline: float, reclaim: Optional[Callable[[], bool]]) -> None:
+        counted = False
+        while self._open >= self.max_sockets:
+            if reclaim is not None:
+                # Closing an idle connection calls _release_socket, which takes the lock
+                self._lock.release()
+                try:
+                    reclaimed = reclaim()
+                finally:
+                    self._lock.acquire()
+                if reclaimed:
+                    self._stats["reclaimed"] += 1
+                    continue
+            if not counted:
+                counted = True
+                self._stats["socket_waits"] += 1
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._stats["timeouts"] += 1
+                raise RateLimited(f"Socket budget ({self.max_sockets}) exhausted")
+            self._lock.wait(remaining)
+        self._open += 1
+        self._stats["peak_sockets"] = max(self._stats["peak_sockets"], self._open)
+
+    def acquire(self, address: str, reclaim: Optional[Callable[[], bool]] = None) -> SocketSlot:
+        """
+        Wait until a new connection to `address` (an IP; a host name is
+        limited like an IP without a /24) may be opened; return its socket slot, to
+        release when the connection closes. `reclaim` is called to close an
+        idle socket when the budget is full; it returns False if it had none.
+        """
+        started = time.monotonic()
+        deadline = started + self.max_wait
+        with self._lock:
+            wait = self._reserve(address, deadline)
+        if wait > 0:
+            time.sleep(wait)
+        with self._lock:
+            if self.max_sockets:
+                self._take_socket(deadline, reclaim)
+            else:
+                self._open += 1
+            waited = (time.monotonic() - started) * 1000
+            self._stats["connections"] += 1
+            self._stats["wait_ms"] += waited
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited)
+        return SocketSlot(self)
+
+    def _release_socket(self) -> None:
+        with self._lock:
+            self._open -= 1
+            self._lock.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["wait_ms"] = round(stats["wait_ms"], 1)
+            stats["max_wait_ms"] = round(stats["max_wait_ms"], 1)
+            return {**stats, "open_sockets": self._open, "socket_budget": self.max_sockets,
+                    "rate": self._global.rate, "per_ip_rate": self.per_ip[0], "per_net_rate": self.per_net[0],
+                    "tracked_destinations": len(self._buckets)}
+
+
+def from_env(share: int = 1) -> ConnectionLimiter:
+    """
+    Build the limiter from PROBE_RATE (new connections per second, 300),
+    PROBE_RATE_PER_IP (20), PROBE_RATE_PER_NET (per /24, 100), their bursts
+    PROBE_BURST / PROBE_BURST_PER_IP / PROBE_BURST_PER_NET (the global rate,
+    twice the others), PROBE_SOCKET_BUDGET (512 open sockets) and
+    PROBE_LIMIT_MAX_WAIT (120 s). A rate or budget of 0 disables that limit.
+    The limits hold per process: `share` processes probing from the same
+    host each get 1/share of every rate and of the socket budget.
+    """
+    def rate(name: str, default: str) -> float:
+        return float(os.environ.get(name) or default) / share
+
+    def burst(name: str) -> Optional[float]:
+        value = os.environ.get(name)
+        return float(value) / share if value else None
+
+    budget = int(os.environ.get("PROBE_SOCKET_BUDGET") or "512")
+    return ConnectionLimiter(
+        rate=rate("PROBE_RATE", "300"),
+        burst=burst("PROBE_BURST"),
+        per_ip_rate=rate("PROBE_RATE_PER_IP", "20"),
+        per_ip_burst=burst("PROBE_BURST_PER_IP"),
+        per_net_rate=rate("PROBE_RATE_PER_NET", "100"),
+        per_net_burst=burst("PROBE_BURST_PER_NET"),
+        max_sockets=max(budget // share, 1) if budget else 0,
+        max_wait=float(os.environ.get("PROBE_LIMIT_MAX_WAIT") or "120"),
+    )
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import heapq
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from DomainModel import DomainRecord, DomainStatus
+
+HOUR = 3600
+DAY = 86400
+
+# Rolling windows as (name, slot length in seconds, slots); a window covers
+# its slots up to the current one, so it is exact to one slot length.
+WINDOWS = (("24h", 2 * HOUR, 12), ("7d", 12 * HOUR, 14), ("30d", 2 * DAY, 15))
+
+# Upper bounds (ms) of the latency histogram bins; the last bin holds slower probes
+LATENCY_BOUNDS = (10, 20, 35, 50, 75, 100, 150, 200, 300, 500, 750, 1000, 1500, 2500, 5000)
+BINS = len(LATENCY_BOUNDS) + 1
+UP_CODE = DomainStatus.LIVE.code
+
+
+def _bin(latency: float) -> int:
+    for i, bound in enumerate(LATENCY_BOUNDS):
+        if latency <= bound:
+            return i
+    return BINS - 1
+
+
+class _Ring:
+    """
+    Counters of one window: per-slot probe/up counts and latency histograms
+    in a ring, plus running totals over the whole ring. Adding a probe and
+    expiring a slot both adjust the totals, so reading a window is O(1).
+    """
+
+    __slots__ = ("size", "slots", "latest", "probes", "up", "hist", "total_probes", "total_up", "total_hist")
+
+    def __init__(self, size: int, slots: int):
+        self.size = size
+        self.slots = slots
+        self.latest = -1              # index (time // size) of the newest slot
+        self.probes = array("I", bytes(4 * slots))
+        self.up = array("I", bytes(4 * slots))
+        self.hist = array("I", bytes(4 * slots * BINS))
+        self.total_probes = 0
+        self.total_up = 0
+        self.total_hist = [0] * BINS
+
+    def _clear(self, pos: int) -> None:
+        if not self.probes[pos]:
+            return
+        self.total_probes -= self.probes[pos]
+        self.total_up -= self.up[pos]
+        self.probes[pos] = self.up[pos] = 0
+        base = pos * BINS
+        for b in range(BINS):
+            if self.hist[base + b]:
+                self.total_hist[b] -= self.hist[base + b]
+                self.hist[base + b] = 0
+
+    def advance(self, at: float) -> None:
+        """Expire the slots that fell out of the window by time `at`."""
+        index = int(at) // self.size
+        if index <= self.latest:
+            return
+        # Each step clears one slot, at most one full turn of the ring
+        for i in range(max(self.latest + 1, index - self.slots + 1), index + 1):
+            self._clear(i % self.slots)
+        self.latest = index
+
+    def add(self, at: float, up: bool, latency_bin: Optional[int]) -> None:
+        self.add_many(at, 1, int(up), latency_bin, 1)
+
+    def add_many(self, at: float, probes: int, up: int, latency_bin: Optional[int], timed: int) -> None:
+        """Count `probes` probes at `at`, `up` of them up and `timed` of them in `latency_bin`."""
+        self.advance(at)
+        index = int(at) // self.size
+        if index <= self.latest - self.slots:
+            return                    # older than the window
+        pos = index % self.slots
+        self.probes[pos] += probes
+        self.total_probes += probes
+        self.up[pos] += up
+        self.total_up += up
+        if latency_bin is not None and timed:
+            self.hist[pos * BINS + latency_bin] += timed
+            self.total_hist[latency_bin] += timed
+
+
+def _percentile(hist: List[int], fraction: float) -> Optional[int]:
+    """Upper bound (ms) of the histogram bin holding the `fraction` quantile."""
+    total = sum(hist)
+    if not total:
+        return None
+    rank, seen = fraction * total, 0
+    for b, count in enumerate(hist):
+        seen += count
+        if seen >= rank:
+            return LATENCY_BOUNDS[min(b, len(LATENCY_BOUNDS) - 1)]
+    return LATENCY_BOUNDS[-1]
+
+
+def _window_dict(probes: int, up: int, hist: List[int]) -> Dict[str, Any]:
+    return {
+        "probes": probes,
+        "uptime": round(100 * up / probes, 2) if probes else None,
+        "p50_ms": _percentile(hist, 0.50),
+        "p95_ms": _percentile(hist, 0.95),
+    }
+
+
+class RollingStats:
+    """
+    Per-host 24h/7d/30d uptime and response-time percentiles, maintained
+    incrementally on every probe.
+
+    Each host has one ring of time slots per window; a slot counts probes
+    and up probes and holds a small latency histogram (LATENCY_BOUNDS), and
+    each ring keeps running totals. A probe updates three slots and three
+    totals, and reading a host's aggregates is O(1): percentiles are read
+    from the window's histogram, to the precision of its bins.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Tuple[_Ring, ...]] = {}
+        self._probes = 0
+
+    def _rings(self, host: str) -> Tuple[_Ring, ...]:
+        rings = self._hosts.get(host)
+        if rings is None:
+            rings = self._hosts[host] = tuple(_Ring(size, slots) for _, size, slots in WINDOWS)
+        return rings
+
+    def _add(self, host: str, at: float, up: bool, latency: Optional[float]) -> None:
+        latency_bin = _bin(latency) if latency is not None else None
+        for ring in self._rings(host):
+            ring.add(at, up, latency_bin)
+        self._probes += 1
+
+    def record(self, record: DomainRecord, latency: Optional[float], at: Optional[float] = None) -> None:
+        """Count one probe result (latency in ms, None if not measured)."""
+        with self._lock:
+            self._add(record.domain, at if at is not None else time.time(),
+                      record.status.code == UP_CODE, latency)
+
+    def load(self, probes: Iterable[Tuple[str, float, int, Optional[float]]]) -> int:
+        """Replay (host, time, status code, latency) probes, oldest first; return how many."""
+        count = 0
+        with self._lock:
+            for host, at, code, latency in probes:
+                self._add(host, at, code == UP_CODE, latency)
+                count += 1
+        return count
+
+    def load_rollups(self, buckets: Iterable[Tuple[str, float, int, int, int, int]]) -> int:
+        """
+        Replay (host, bucket start, probes, up, timed probes, latency sum)
+        rollup buckets, oldest first; return how many probes they held. A
+        rollup keeps no latency distribution: its timed probes all count in
+        the bin of their average latency.
+        """
+        count = 0
+        with self._lock:
+            for host, at, probes, up, timed, total in buckets:
+                latency_bin = _bin(total / timed) if timed else None
+                for ring in self._rings(host):
+                    ring.add_many(at, probes, up, latency_bin, timed)
+                self._probes += probes
+                count += probes
+        return count
+
+    def discard(self, hosts: Iterable[str]) -> None:
+        """Forget hosts nobody monitors any more."""
+        with self._lock:
+            for host in hosts:
+                self._hosts.pop(host, None)
+
+    def _summary(self, rings: Tuple[_Ring, ...], now: float) -> Dict[str, Any]:
+        out = {}
+        for (name, _, _), ring in zip(WINDOWS, rings):
+            ring.advance(now)
+            out[name] = _window_dict(ring.total_probes, ring.total_up, ring.total_hist)
+        return out
+
+    def summaries(self, hosts: Iterable[str], now: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """{host: {window: {"probes", "uptime", "p50_ms", "p95_ms"}}} for the probed `hosts`."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            return {host: self._summary(rings, now) for host, rings in
+                    ((h, self._hosts.get(h)) for h in hosts) if rings is not None}
+
+    def overview(self, limit: int = 20, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Aggregates over every host per window, and the `limit` hosts with
+        the lowest 24h uptime.
+        """
+        now = now if now is not None else time.time()
+        totals = [[0, 0, [0] * BINS] for _ in WINDOWS]
+        with self._lock:
+            for rings in self._hosts.values():
+                for total, ring in zip(totals, rings):
+                    ring.advance(now)
+                    total[0] += ring.total_probes
+                    total[1] += ring.total_up
+                    for b, count in enumerate(ring.total_hist):
+                        total[2][b] += count
+            worst = heapq.nsmallest(
+                limit,
+                ((ring.total_up / ring.total_probes, host) for host, (ring, *_) in self._hosts.items()
+                 if ring.total_probes),
+            )
+            worst_hosts = {host: self._summary(self._hosts[host], now) for _, host in worst}
+        return {
+            "hosts": len(self._hosts),
+            "windows": {name: _window_dict(*total) for (name, _, _), total in zip(WINDOWS, totals)},
+            "worst": [{"domain": host, **worst_hosts[host]} for _, host in worst],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hosts": len(self._hosts), "probes": self._probes}
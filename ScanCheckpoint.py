@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, Iterable, Set
+
+from DomainStorage import user_key
+
+
+class ScanCheckpoints:
+    """
+    Progress of running scans, one append-only file per user:
+    <directory>/<user>_scan.log.
+
+    The first line holds the scan's start time (epoch); every batch of
+    results committed to storage appends its domains, one per line. A scan
+    that finds the file of an interrupted run younger than `max_age` seconds
+    resumes it and probes only the domains not listed there; a completed
+    scan removes the file. A torn last line (crash mid-append) is ignored.
+    Scans of the same user run one at a time (scan_lock), so a running
+    scan's file is never mistaken for an interrupted one.
+    """
+
+    def __init__(self, directory: str, max_age: float = 3600):
+        self.directory = directory
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._scans: Dict[str, threading.Lock] = {}
+        self._stats: Dict[str, int] = {"started": 0, "resumed": 0, "finished": 0, "committed": 0}
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, username: str) -> str:
+        return os.path.join(self.directory, f"{user_key(username)}_scan.log")
+
+    def scan_lock(self, username: str) -> threading.Lock:
+        """The lock a scan of `username` holds while it runs."""
+        with self._lock:
+            return self._scans.setdefault(user_key(username), threading.Lock())
+
+    def _read(self, path: str) -> Set[str]:
+        """Domains committed by the run in `path`, or an empty set if missing, stale or unreadable."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = f.read()
+        except OSError:
+            return set()
+        lines = data.split("\n")
+        try:
+            started = float(lines[0])
+        except ValueError:
+            return set()
+        if time.time() - started > self.max_age:
+            return set()
+        # Only newline-terminated lines were fully written
+        return {line for line in lines[1:-1] if line}
+
+    def resume(self, username: str) -> Set[str]:
+        """
+        Start a scan for `username`: return the domains an interrupted recent
+        run already committed (empty for a fresh scan, which starts a new file).
+        """
+        path = self.path(username)
+        with self._lock:
+            done = self._read(path)
+            if done:
+                self._stats["resumed"] += 1
+            else:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"{time.time():.3f}\n")
+                self._stats["started"] += 1
+            return done
+
+    def commit(self, username: str, domains: Iterable[str]) -> None:
+        """Record domains whose results have been written to storage."""
+        lines = "".join(f"{d}\n" for d in domains)
+        if not lines:
+            return
+        with self._lock:
+            with open(self.path(username), "a", encoding="utf-8") as f:
+                f.write(lines)
+            self._stats["committed"] += lines.count("\n")
+
+    def finish(self, username: str) -> None:
+        """The scan completed: forget its progress."""
+        with self._lock:
+            try:
+                os.remove(self.path(username))
+            except FileNotFoundError:
+                pass
+            self._stats["finished"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import hmac
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from DomainModel import DomainRecord
+from logger import setup_logger
+
+logger = setup_logger("ScanCoordinator")
+
+Item = Tuple[str, Optional[str]]                     # (domain, probe profile)
+Result = Tuple[DomainRecord, Optional[float]]
+
+
+class CoordinatorRefused(Exception):
+    """The coordinator rejected the worker (wrong token)."""
+
+
+# Longest a worker's lease request waits for work before it is told to ask again
+MAX_POLL_SECONDS = 10.0
+
+
+def parse_address(address: str) -> Tuple[int, Any]:
+    """"unix:/path/to.sock" or "host:port" -> (address family, socket address)."""
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    if not host or not port.isdigit():
+        raise ValueError(f"Invalid coordinator address: {address!r} (expected host:port or unix:/path)")
+    return socket.AF_INET, (host, int(port))
+
+
+class _Job:
+    """One scan handed to the workers: its result queue and the items that could not be probed remotely."""
+
+    def __init__(self, job_id: int, total: int):
+        self.job_id = job_id
+        self.outstanding = total       # items neither returned nor given up on
+        self.results: "queue.Queue[List[Result]]" = queue.Queue()
+        self.failed: List[Item] = []
+
+
+class _Lease:
+    __slots__ = ("lease_id", "job", "items", "attempts", "worker", "deadline")
+
+    def __init__(self, lease_id: int, job: _Job, items: List[Item], attempts: int, worker: str, deadline: float):
+        self.lease_id = lease_id
+        self.job = job
+        self.items = items
+        self.attempts = attempts
+        self.worker = worker
+        self.deadline = deadline
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """One worker connection: a JSON request per line, a JSON reply per line."""
+
+    def handle(self) -> None:
+        coordinator: ScanCoordinator = self.server.coordinator
+        try:
+            for line in self.rfile:
+                try:
+                    message = json.loads(line)
+                    if not isinstance(message, dict):
+                        raise ValueError("expected a JSON object")
+                    reply = coordinator.handle(message)
+                except (ValueError, TypeError, KeyError, AttributeError) as e:
+                    reply = {"ok": False, "error": f"Bad request: {e}"}
+                self.wfile.write(json.dumps(reply).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except ConnectionError:
+            pass                                       # the worker went away; its lease expires
+
+
+class _TcpServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+
+class ScanCoordinator:
+    """
+    Hands scan work to probe workers on other processes or hosts.
+
+    A scan submits its (domain, profile) items; they are queued in batches
+    of `batch` domains, shared fairly by every running scan. Workers
+    (this module run with --connect) ask for a batch over a TCP or Unix
+    socket, probe it and send the results back. Every batch handed out is
+    a lease: if its results are not back within `lease_seconds` (the
+    worker died, hung or lost its connection), the batch is queued again,
+    up to `retries` times. Items given up on, or all of them when no worker
+    is connected, are returned to the scan to probe locally.
+
+    Protocol: one JSON object per line each way.
+    {"op": "lease", "worker": id, "max": n, "wait": s}
+        -> {"ok": true, "lease": id|null, "items": [[domain, profile], ...], "ttl": s}
+    {"op": "complete", "worker": id, "lease": id, "results": [[record, latency_ms], ...]}
+        -> {"ok": true} or {"ok": false, "error": ...} if the lease already expired
+    Every request carries "token" when SCAN_COORDINATOR_TOKEN is set; it
+    is required on TCP, where any host that reaches the port could
+    otherwise lease work and send forged results. Results are only
+    accepted for the domains of their lease.
+    """
+
+    def __init__(self, address: str, batch: int = 100, lease_seconds: float = 60.0,
+                 retries: int = 2, token: Optional[str] = None):
+        if parse_address(address)[0] != socket.AF_UNIX and not token:
+            raise ValueError(f"A coordinator listening on TCP ({address}) needs SCAN_COORDINATOR_TOKEN")
+        self.address = address
+        self.batch = batch
+        self.lease_seconds = lease_seconds
+        self.retries = retries
+        self.token = token
+        self._lock = threading.Condition()
+        self._queue: Deque[Tuple[_Job, List[Item], int]] = collections.deque()
+        self._leases: Dict[int, _Lease] = {}
+        self._workers: Dict[str, float] = {}          # worker id -> last seen (monotonic)
+        self._ids = itertools.count(1)
+        self._server: Optional[socketserver.BaseServer] = None
+        self._stats = {"jobs": 0, "leases": 0, "completed": 0, "expired": 0, "retried": 0,
+                       "failed_items": 0, "results": 0}
+
+    # ----------------------------
+    # Server
+    # ----------------------------
+    def start(self) -> "ScanCoordinator":
+        """Listen for workers (in a background thread)."""
+        family, addr = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(addr):
+                os.remove(addr)                        # left over by a previous run
+            self._server = _UnixServer(addr, _Handler)
+        else:
+            self._server = _TcpServer(addr, _Handler)
+        self._server.coordinator = self
+        threading.Thread(target=self._server.serve_forever, name="scan-coordinator", daemon=True).start()
+        logger.info(f"Scan coordinator listening on {self.address}")
+        return self
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def handle(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one worker request (see the class docstring)."""
+        if self.token and not hmac.compare_digest(str(message.get("token", "")), self.token):
+            return {"ok": False, "error": "Unauthorized"}
+        worker = str(message.get("worker") or "?")
+        op = message.get("op")
+        if op == "lease":
+            wait = min(float(message.get("wait", MAX_POLL_SECONDS)), MAX_POLL_SECONDS)
+            lease = self.lease(worker, int(message.get("max") or self.batch), wait)
+            if lease is None:
+                return {"ok": True, "lease": None}
+            return {"ok": True, "lease": lease.lease_id, "items": lease.items, "ttl": self.lease_seconds}
+        if op == "complete":
+            results = [(DomainRecord.from_dict(r), ms) for r, ms in message["results"]]
+            if not self.complete(worker, int(message["lease"]), results):
+                return {"ok": False, "error": "Lease expired"}
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown op: {op!r}"}
+
+    # ----------------------------
+    # Leases
+    # ----------------------------
+    def _seen(self, worker: str) -> None:
+        self._workers[worker] = time.monotonic()
+
+    def _expire(self) -> None:
+        """Requeue (or give up on) the batches whose lease ran out. Caller holds the lock."""
+        now = time.monotonic()
+        for worker in [w for w, seen in self._workers.items() if seen < now - 10 * self.lease_seconds]:
+            del self._workers[worker]                  # long gone (workers get a new id when restarted)
+        for lease in [l for l in self._leases.values() if l.deadline <= now]:
+            del self._leases[lease.lease_id]
+            self._stats["expired"] += 1
+            logger.warning(f"Lease {lease.lease_id} of worker {lease.worker} expired "
+                           f"({len(lease.items)} domains, attempt {lease.attempts + 1})")
+            if lease.attempts < self.retries:
+                self._stats["retried"] += 1
+                self._queue.appendleft((lease.job, lease.items, lease.attempts + 1))
+                self._lock.notify()
+            else:
+                self._give_up(lease.job, lease.items)
+
+    def _give_up(self, job: _Job, items: List[Item]) -> None:
+        job.failed.extend(items)
+        job.outstanding -= len(items)
+        self._stats["failed_items"] += len(items)
+        job.results.put([])                            # wake the scan up
+
+    def lease(self, worker: str, max_items: int, wait: float = 0.0) -> Optional[_Lease]:
+        """Hand the next batch (up to `max_items` domains) to `worker`, waiting up to `wait` seconds for one."""
+        deadline = time.monotonic() + wait
+        with self._lock:
+            self._seen(worker)
+            self._expire()
+            while not self._queue:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._lock.wait(remaining)
+                self._seen(worker)
+            job, items, attempts = self._queue.popleft()
+            if len(items) > max_items:
+                self._queue.appendleft((job, items[max_items:], attempts))
+                items = items[:max_items]
+            lease = _Lease(next(self._ids), job, items, attempts, worker, time.monotonic() + self.lease_seconds)
+            self._leases[lease.lease_id] = lease
+            self._stats["leases"] += 1
+            return lease
+
+    def complete(self, worker: str, lease_id: int, results: List[Result]) -> bool:
+        """Accept a batch's results; False if its lease expired (the batch was handed out again)."""
+        with self._lock:
+            self._seen(worker)
+            lease = self._leases.pop(lease_id, None)
+            if lease is None:
+                return False
+            # Only results for the leased domains count, once each
+            leased = {domain for domain, _ in lease.items}
+            accepted: List[Result] = []
+            for record, latency in results:
+                if record.domain in leased:
+                    leased.discard(record.domain)
+                    accepted.append((record, latency))
+            self._stats["completed"] += 1
+            self._stats["results"] += len(accepted)
+            lease.job.outstanding -= len(accepted)
+            lease.job.results.put(accepted)
+            missing = [item for item in lease.items if item[0] in leased]
+            if missing:
+                self._give_up(lease.job, missing)
+            return True
+
+    def has_workers(self) -> bool:
+        """True if a worker asked for work within the last lease period."""
+        cutoff = time.monotonic() - self.lease_seconds
+        with self._lock:
+            return any(seen >= cutoff for seen in self._workers.values())
+
+    # ----------------------------
+    # Scans
+    # ----------------------------
+    def scan(self, items: Sequence[Item], tick: float = 5.0) -> Iterator[List[Result]]:
+        """
+        Probe `items` on the workers. Yields lists of (record, latency) as
+        batches come back, and an empty list every `tick` seconds without
+        results; returns the items that could not be probed remotely
+        (`failed = yield from coordinator.scan(...)`).
+        """
+        with self._lock:
+            job = _Job(next(self._ids), len(items))
+            for start in range(0, len(items), self.batch):
+                self._queue.append((job, list(items[start:start + self.batch]), 0))
+            self._stats["jobs"] += 1
+            self._lock.notify_all()
+        try:
+            while True:
+                with self._lock:
+                    if job.outstanding <= 0:
+                        break
+                try:
+                    yield job.results.get(timeout=tick)
+                    continue
+                except queue.Empty:
+                    pass
+                with self._lock:
+                    self._expire()
+                    if not any(seen >= time.monotonic() - self.lease_seconds for seen in self._workers.values()):
+                        # Nobody is left to probe the queued batches: hand them back
+                        queued = [entry for entry in self._queue if entry[0] is job]
+                        for entry in queued:
+                            self._queue.remove(entry)
+                            self._give_up(job, entry[1])
+                yield []
+            while not job.results.empty():
+                yield job.results.get_nowait()
+        finally:
+            with self._lock:
+                # An abandoned scan's batches are not handed out any more
+                for entry in [e for e in self._queue if e[0] is job]:
+                    self._queue.remove(entry)
+                for lease in [l for l in self._leases.values() if l.job is job]:
+                    del self._leases[lease.lease_id]
+        return job.failed
+
+    def stats(self) -> Dict[str, Any]:
+        cutoff = time.monotonic() - self.lease_seconds
+        with self._lock:
+            return {
+                "address": self.address,
+                "workers": sum(seen >= cutoff for seen in self._workers.values()),
+                "queued_batches": len(self._queue),
+                "active_leases": len(self._leases),
+                **self._stats,
+            }
+
+
+def from_env() -> Optional[ScanCoordinator]:
+    """
+    Coordinator for SCAN_COORDINATOR ("host:port" or "unix:/path"; unset:
+    scans never leave this machine), not yet listening (start() it in the
+    serving process). SCAN_LEASE_BATCH (100 domains),
+    SCAN_LEASE_SECONDS (60) and SCAN_LEASE_RETRIES (2) tune the leases;
+    SCAN_COORDINATOR_TOKEN must be sent by every worker (required unless
+    the address is a Unix socket).
+    """
+    address = os.environ.get("SCAN_COORDINATOR")
+    if not address:
+        return None
+    return ScanCoordinator(
+        address,
+        batch=int(os.environ.get("SCAN_LEASE_BATCH", "100")),
+        lease_seconds=float(os.environ.get("SCAN_LEASE_SECONDS", "60")),
+        retries=int(os.environ.get("SCAN_LEASE_RETRIES", "2")),
+        token=os.environ.get("SCAN_COORDINATOR_TOKEN") or None,
+    )
+
+
+# ----------------------------
+# Worker
+# ----------------------------
+class ScanWorker:
+    """
+    Probe worker: leases batches from a coordinator, probes them with its
+    own thread pool and probe profiles, and sends the results back. It
+    reconnects (with backoff) whenever the coordinator is unreachable.
+    """
+
+    def __init__(self, address: str, threads: int = 50, batch: int = 100,
+                 profile: str = "socket", token: Optional[str] = None):
+        import HttpProbe
+        import RateLimiter
+        from ProbePipeline import ProbeProfiles
+
+        self.address = address
+        self.threads = threads
+        self.batch = batch
+        self.token = token
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.profiles = ProbeProfiles(HttpProbe.from_env(RateLimiter.from_env()), default=profile)
+        self._stop = threading.Event()
+
+    def _request(self, stream, message: Dict[str, Any]) -> Dict[str, Any]:
+        message = {**message, "worker": self.worker_id}
+        if self.token:
+            message["token"] = self.token
+        stream.write(json.dumps(message).encode("utf-8") + b"\n")
+        stream.flush()
+        line = stream.readline()
+        if not line:
+            raise ConnectionError("Coordinator closed the connection")
+        return json.loads(line)
+
+    def _probe(self, item: List[Any]) -> Optional[Tuple[Dict[str, Any], Optional[float]]]:
+        try:
+            record, latency = self.profiles.probe(item[0], item[1])
+        except Exception as e:
+            logger.error(f"Domain check failed in worker: {e}")
+            return None
+        return record.to_dict(), latency
+
+    def _serve(self, stream, executor: concurrent.futures.Executor) -> None:
+        while not self._stop.is_set():
+            reply = self._request(stream, {"op": "lease", "max": self.batch, "wait": MAX_POLL_SECONDS})
+            if not reply.get("ok"):
+                raise CoordinatorRefused(reply.get("error"))
+            if reply.get("lease") is None:
+                continue
+            results = [r for r in executor.map(self._probe, reply["items"]) if r is not None]
+            done = self._request(stream, {"op": "complete", "lease": reply["lease"], "results": results})
+            if not done.get("ok"):
+                logger.warning(f"Results of lease {reply['lease']} not accepted: {done.get('error')}")
+
+    def run(self) -> None:
+        family, addr = parse_address(self.address)
+        backoff = 1.0
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while not self._stop.is_set():
+                try:
+                    with socket.socket(family, socket.SOCK_STREAM) as sock:
+                        sock.connect(addr)
+                        backoff = 1.0
+                        with sock.makefile("rwb") as stream:
+                            self._serve(stream, executor)
+                except (OSError, ConnectionError, ValueError) as e:
+                    logger.warning(f"Worker {self.worker_id}: coordinator {self.address} unavailable ({e}); "
+                                   f"retrying in {backoff:.0f}s")
+                    self._stop.wait(backoff)
+                    backoff = min(backoff * 2, 30.0)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scan worker: probes domain batches leased from a coordinator.")
+    parser.add_argument("--connect", required=True, help="coordinator address, host:port or unix:/path")
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--profile", default=os.environ.get("PROBE_MODE") or "socket",
+                        help="default probe profile for domains without their own")
+    args = parser.parse_args()
+    profile = "web" if args.profile.lower() == "http" else args.profile
+    try:
+        ScanWorker(args.connect, args.threads, args.batch, profile,
+                   token=os.environ.get("SCAN_COORDINATOR_TOKEN") or None).run()
+    except CoordinatorRefused as e:
+        sys.exit(f"Coordinator refused this worker: {e}")
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import concurrent.futures
+import json
+import os
+import selectors
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from DomainModel import DomainRecord
+from logger import setup_logger
+
+logger = setup_logger("ShardedScanner")
+
+Result = Tuple[DomainRecord, Optional[float]]
+
+
+def shard_of(domain: str, shards: int) -> int:
+    """Stable shard of a domain: the same host always goes to the same worker (and its connection pool)."""
+    return zlib.crc32(domain.lower().encode("utf-8")) % shards
+
+
+class ShardedScanner:
+    """
+    Probes a large domain set across several worker processes.
+
+    One process is GIL-bound on TLS parsing and result handling long before
+    the network is, so big scans are split by domain hash into one shard per
+    process. Each worker (this module run with --worker) probes its shard
+    with its own thread pool and ProbeProfiles, and streams the results back
+    over its stdout pipe as NDJSON, a batch at a time; the scanning process
+    only decodes them and commits them as usual. Workers are started per
+    scan as fresh interpreters, so nothing of the web app (locks, storage
+    handles, threads) is inherited. A worker that dies only loses the
+    results it had not sent yet; the scan checkpoint resumes the rest.
+    """
+
+    def __init__(self, processes: int = 0, threads: int = 50, min_domains: int = 5000,
+                 default_profile: str = "socket", batch: int = 200, flush_seconds: float = 1.0):
+        self.processes = processes
+        self.threads = threads
+        self.min_domains = min_domains
+        self.default_profile = default_profile
+        self.batch = batch
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._stats = {"scans": 0, "workers": 0, "worker_failures": 0, "results": 0}
+
+    def enabled_for(self, count: int) -> bool:
+        """True if a scan probing `count` domains should be sharded."""
+        return self.processes > 1 and count >= self.min_domains
+
+    def _start(self, shard: Sequence[Tuple[str, Optional[str]]]) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--worker",
+             "--threads", str(self.threads), "--profile", self.default_profile,
+             "--batch", str(self.batch), "--flush", str(self.flush_seconds), "--share", str(self.processes)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+
+        def feed():
+            # Written from a thread so every worker is fed at once, whatever the pipe buffer size
+            try:
+                for domain, profile in shard:
+                    proc.stdin.write(json.dumps([domain, profile]).encode("utf-8") + b"\n")
+                proc.stdin.close()
+            except (BrokenPipeError, ValueError, OSError):
+                pass
+
+        threading.Thread(target=feed, name="shard-feed", daemon=True).start()
+        return proc
+
+    def scan(self, items: Sequence[Tuple[str, Optional[str]]], tick: float = 5.0,
+             metrics: Any = None) -> Iterator[List[Result]]:
+        """
+        Probe (domain, profile) pairs across the worker processes. Yields
+        lists of (record, latency) as batches arrive, and an empty list every
+        `tick` seconds without results so the caller can commit on time.
+        Worker stage counters are merged into `metrics` (a PipelineMetrics).
+        """
+        shards: List[List[Tuple[str, Optional[str]]]] = [[] for _ in range(self.processes)]
+        for item in items:
+            shards[shard_of(item[0], self.processes)].append(item)
+        procs = [self._start(shard) for shard in shards if shard]
+        with self._lock:
+            self._stats["scans"] += 1
+            self._stats["workers"] += len(procs)
+
+        # Raw reads with our own line buffers: a buffered readline() could hold
+        # lines the selector no longer reports as readable
+        selector = selectors.DefaultSelector()
+        buffers: Dict[int, bytearray] = {}
+        for proc in procs:
+            selector.register(proc.stdout, selectors.EVENT_READ, proc)
+            buffers[proc.pid] = bytearray()
+        open_pipes = len(procs)
+        try:
+            while open_pipes:
+                events = selector.select(timeout=tick)
+                batch: List[Result] = []
+                for key, _ in events:
+                    proc = key.data
+                    data = os.read(key.fd, 1 << 16)
+                    if not data:
+                        selector.unregister(proc.stdout)
+                        open_pipes -= 1
+                        if proc.wait() != 0:
+                            with self._lock:
+                                self._stats["worker_failures"] += 1
+                            logger.error(f"Scan worker {proc.pid} exited with code {proc.returncode}")
+                        continue
+                    buffer = buffers[proc.pid]
+                    buffer += data
+                    end = buffer.rfind(b"\n")
+                    if end < 0:
+                        continue
+                    lines = bytes(buffer[:end]).split(b"\n")
+                    del buffer[:end + 1]
+                    for line in lines:
+                        message = json.loads(line)
+                        if "metrics" in message:
+                            if metrics is not None:
+                                metrics.merge(message["metrics"])
+                            continue
+                        batch.extend((DomainRecord.from_dict(r), ms) for r, ms in message["results"])
+                with self._lock:
+                    self._stats["results"] += len(batch)
+                yield batch
+        finally:
+            selector.close()
+            for proc in procs:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+                proc.stdout.close()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"processes": self.processes, "min_domains": self.min_domains, **self._stats}
+
+
+def from_env(default_profile: str = "socket") -> ShardedScanner:
+    """
+    Build a scanner from SCAN_PROCESSES (0: scans stay in-process),
+    SCAN_PROCESS_THREADS (50 probes in flight per worker) and
+    SCAN_SHARD_MIN_DOMAINS (5000: smaller scans are not worth the start-up).
+    """
+    processes = os.environ.get("SCAN_PROCESSES", "0")
+    return ShardedScanner(
+        processes=(os.cpu_count() or 1) if processes == "auto" else int(processes),
+        threads=int(os.environ.get("SCAN_PROCESS_THREADS", "50")),
+        min_domains=int(os.environ.get("SCAN_SHARD_MIN_DOMAINS", "5000")),
+        default_profile=default_profile,
+    )
+
+
+# ----------------------------
+# Worker process
+# ----------------------------
+def _worker(threads: int, profile: str, batch_size: int, flush_seconds: float, share: int) -> None:
+    """
+    Probe the (domain, profile) lines read from stdin; write result batches
+    to stdout. The connection limits are split evenly between the `share` workers.
+    """
+    import HttpProbe
+    import RateLimiter
+    from ProbePipeline import ProbeProfiles
+
+    profiles = ProbeProfiles(HttpProbe.from_env(RateLimiter.from_env(share)), default=profile)
+    out = sys.stdout
+    batch: List[Tuple[Dict[str, Any], Optional[float]]] = []
+
+    def flush():
+        if batch:
+            out.write(json.dumps({"results": batch}) + "\n")
+            out.flush()
+            batch.clear()
+        return time.monotonic()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=threads) as executor:
+        pending = set()
+        for line in sys.stdin:
+            domain, domain_profile = json.loads(line)
+            pending.add(executor.submit(profiles.probe, domain, domain_profile))
+        last_flush = time.monotonic()
+        while pending:
+            completed, pending = concurrent.futures.wait(
+                pending, timeout=flush_seconds, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in completed:
+                try:
+                    record, latency = future.result()
+                except Exception as e:
+                    logger.error(f"Domain check failed in worker: {e}")
+                    continue
+                batch.append((record.to_dict(), latency))
+            if len(batch) >= batch_size or time.monotonic() - last_flush >= flush_seconds:
+                last_flush = flush()
+    flush()
+    out.write(json.dumps({"metrics": profiles.metrics.snapshot()}) + "\n")
+    out.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Scan worker: probes domains read from stdin (NDJSON).")
+    parser.add_argument("--worker", action="store_true", required=True)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--profile", default="socket")
+    parser.add_argument("--batch", type=int, default=200)
+    parser.add_argument("--flush", type=float, default=1.0)
+    parser.add_argument("--share", type=int, default=1, help="workers sharing this host's connection limits")
+    args = parser.parse_args()
+    _worker(args.threads, args.profile, args.batch, args.flush, max(args.share, 1))
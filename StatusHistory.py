@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import calendar
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from DomainModel import STATUS_BY_CODE, DomainRecord, DomainStatus
+
+try:
+    import numpy as np
+except ImportError:      # optional: segments are then filtered with struct.iter_unpack
+    np = None
+
+DAY = 86400
+HOUR = 3600
+RESOLUTIONS = ("raw", "hour", "day")
+
+# One probe: time (epoch s), host id, status code, latency in ms (NO_LATENCY = none)
+PROBE = struct.Struct("<IIBH")
+# One rollup bucket: start (epoch s), host id, probes, up probes, timed probes,
+# latency sum (ms), max latency (ms)
+ROLLUP = struct.Struct("<IIIIIQH")
+NO_LATENCY = 0xFFFF
+UP_CODE = DomainStatus.LIVE.code
+
+if np is not None:
+    _PROBE_DTYPE = np.dtype([("ts", "<u4"), ("host", "<u4"), ("status", "u1"), ("latency", "<u2")])
+    _ROLLUP_DTYPE = np.dtype([("ts", "<u4"), ("host", "<u4"), ("probes", "<u4"), ("up", "<u4"),
+                              ("timed", "<u4"), ("latency_sum", "<u8"), ("latency_max", "<u2")])
+else:
+    _PROBE_DTYPE = _ROLLUP_DTYPE = None
+
+
+def _read(path: str, layout: struct.Struct, dtype: Any,
+          host_id: Optional[int] = None) -> List[Tuple]:
+    """
+    Records of one segment (only those of `host_id` if given), read through
+    a memory map. A torn record at the end (crash mid-append) is ignored.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return []
+    with f:
+        count = os.fstat(f.fileno()).st_size // layout.size
+        if count == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            if dtype is not None and host_id is not None:
+                rows = np.frombuffer(m, dtype=dtype, count=count)
+                picked = rows[rows["host"] == host_id].tolist()
+                del rows            # release the buffer before the map is closed
+                return picked
+            with memoryview(m) as view, view[:count * layout.size] as data:
+                return [r for r in layout.iter_unpack(data) if host_id is None or r[1] == host_id]
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _fold_probes(rows: Iterable[Tuple], size: int) -> Dict[Tuple[int, int], List[int]]:
+    """Aggregate probe rows into (bucket start, host id) -> [probes, up, timed, latency sum, max]."""
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for ts, host_id, code, latency in rows:
+        b = buckets.setdefault((ts - ts % size, host_id), [0, 0, 0, 0, 0])
+        b[0] += 1
+        b[1] += code == UP_CODE
+        if latency != NO_LATENCY:
+            b[2] += 1
+            b[3] += latency
+            b[4] = max(b[4], latency)
+    return buckets
+
+
+def _fold_rollups(rows: Iterable[Tuple], size: int) -> Dict[Tuple[int, int], List[int]]:
+    """Merge rollup rows into coarser buckets of `size` seconds."""
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for ts, host_id, probes, up, timed, total, peak in rows:
+        b = buckets.setdefault((ts - ts % size, host_id), [0, 0, 0, 0, 0])
+        b[0] += probes
+        b[1] += up
+        b[2] += timed
+        b[3] += total
+        b[4] = max(b[4], peak)
+    return buckets
+
+
+def _pack(buckets: Dict[Tuple[int, int], List[int]]) -> bytes:
+    return b"".join(ROLLUP.pack(start, host_id, *values) for (start, host_id), values in sorted(buckets.items()))
+
+
+def _bucket_dict(start: int, probes: int, up: int, timed: int, total: int, peak: int) -> Dict[str, Any]:
+    return {
+        "start": start,
+        "probes": probes,
+        "up": up,
+        "uptime": round(100 * up / probes, 2) if probes else None,
+        "avg_latency_ms": round(total / timed, 1) if timed else None,
+        "max_latency_ms": peak if timed else None,
+    }
+
+
+class StatusHistory:
+    """
+    Append-only probe history on disk, a few bytes per probe.
+
+    Every probe is one fixed-width 11-byte record appended to the raw
+    segment of its UTC day (raw/YYYYMMDD.bin); hosts are numbered once in
+    hosts.txt so records stay fixed-width. Raw segments older than
+    `raw_days` are downsampled into hourly rollups (hourly/YYYYMMDD.bin) and
+    hourly segments older than `hourly_days` into daily rollups
+    (daily/YYYYMM.bin), 30 bytes per host and bucket. Queries memory-map
+    only the segments of the requested range, using the finest resolution
+    kept for each day.
+    """
+
+    def __init__(self, directory: str, raw_days: int = 7, hourly_days: int = 90):
+        self.directory = directory
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        for kind in ("raw", "hourly", "daily"):
+            os.makedirs(os.path.join(directory, kind), exist_ok=True)
+        self._lock = threading.Lock()
+        self._compact_lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._hosts_path = os.path.join(directory, "hosts.txt")
+        self._compacted_day: Optional[int] = None
+        self._stats = {"probes": 0, "rolled_up": 0}
+        self._load_hosts()
+
+    def _load_hosts(self) -> None:
+        try:
+            with open(self._hosts_path, "r+", encoding="utf-8", newline="\n") as f:
+                data = f.read()
+                complete = data.rfind("\n") + 1
+                if complete < len(data):
+                    # Drop a torn last line so line numbers stay the host ids
+                    f.truncate(len(data[:complete].encode("utf-8")))
+        except FileNotFoundError:
+            return
+        for host in data[:complete].split("\n")[:-1]:
+            self._ids.setdefault(host, len(self._ids))
+
+    def _host_id(self, host: str) -> int:
+        """Return the id of `host`, numbering it if new (lock held)."""
+        host_id = self._ids.get(host)
+        if host_id is None:
+            host_id = self._ids[host] = len(self._ids)
+            with open(self._hosts_path, "a", encoding="utf-8", newline="\n") as f:
+                f.write(f"{host}\n")
+        return host_id
+
+    def host_id(self, host: str) -> Optional[int]:
+        with self._lock:
+            return self._ids.get(host)
+
+    # ----------------------------
+    # Segments
+    # ----------------------------
+    def _path(self, kind: str, day: int) -> str:
+        fmt = "%Y%m" if kind == "daily" else "%Y%m%d"
+        name = datetime.fromtimestamp(day * DAY, tz=timezone.utc).strftime(fmt)
+        return os.path.join(self.directory, kind, f"{name}.bin")
+
+    def _days(self, kind: str) -> List[int]:
+        """Days that have a segment of `kind` (raw or hourly), oldest first."""
+        days = []
+        for name in os.listdir(os.path.join(self.directory, kind)):
+            try:
+                days.append(calendar.timegm(time.strptime(name, "%Y%m%d.bin")) // DAY)
+            except ValueError:
+                continue
+        return sorted(days)
+
+    # ----------------------------
+    # Writing
+    # ----------------------------
+    def record(self, probes: Iterable[Tuple[DomainRecord, Optional[float]]],
+               at: Optional[float] = None) -> int:
+        """
+        Append probe results, given as (record, latency in ms or None), taken
+        at `at` (epoch, default now). Returns the number of records written.
+        """
+        ts = int(at if at is not None else time.time())
+        day = ts // DAY
+        with self._lock:
+            data = b"".join(
+                PROBE.pack(ts, self._host_id(r.domain), r.status.code,
+                           NO_LATENCY if latency is None else min(int(latency), NO_LATENCY - 1))
+                for r, latency in probes
+            )
+            if not data:
+                return 0
+            # One write per batch on an O_APPEND file: concurrent batches never interleave
+            with open(self._path("raw", day), "ab") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size % PROBE.size:
+                    # Cut a record torn by a crash mid-append, or every later record is misaligned
+                    f.truncate(size - size % PROBE.size)
+                f.write(data)
+            self._stats["probes"] += len(data) // PROBE.size
+            roll = self._compacted_day != day
+            self._compacted_day = day
+        if roll:
+            self.compact(ts)
+        return len(data) // PROBE.size
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """Downsample segments that aged out of their resolution; return how many were rolled up."""
+        today = int(now if now is not None else time.time()) // DAY
+        rolled = 0
+        with self._compact_lock:
+            for day in self._days("raw"):
+                if day < today - self.raw_days:
+                    rows = _read(self._path("raw", day), PROBE, None)
+                    _write_atomic(self._path("hourly", day), _pack(_fold_probes(rows, HOUR)))
+                    os.remove(self._path("raw", day))
+                    rolled += 1
+            for day in self._days("hourly"):
+                if day < today - self.hourly_days:
+                    month = self._path("daily", day)
+                    start, end = day * DAY, (day + 1) * DAY
+                    # Rewrite the month without this day first, so a rerun after a crash cannot double count
+                    kept = [r for r in _read(month, ROLLUP, None) if not start <= r[0] < end]
+                    daily = _fold_rollups(_read(self._path("hourly", day), ROLLUP, None), DAY)
+                    _write_atomic(month, b"".join(ROLLUP.pack(*r) for r in kept) + _pack(daily))
+                    os.remove(self._path("hourly", day))
+                    rolled += 1
+        with self._lock:
+            self._stats["rolled_up"] += rolled
+        return rolled
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def samples(self, host: str, since: int, until: int) -> List[Dict[str, Any]]:
+        """Raw probes of `host` between `since` and `until` (epoch), oldest first."""
+        host_id = self.host_id(host)
+        if host_id is None:
+            return []
+        out = []
+        for day in range(since // DAY, until // DAY + 1):
+            for ts, _, code, latency in _read(self._path("raw", day), PROBE, _PROBE_DTYPE, host_id):
+                if since <= ts <= until:
+                    out.append({"time": ts, "status": STATUS_BY_CODE[code].value,
+                                "latency_ms": None if latency == NO_LATENCY else latency})
+        return out
+
+    def buckets(self, host: str, since: int, until: int, resolution: str = "hour") -> List[Dict[str, Any]]:
+        """
+        Uptime and latency of `host` per hour or day between `since` and
+        `until` (epoch). Days only kept as daily rollups yield daily buckets
+        even at hour resolution.
+        """
+        size = HOUR if resolution == "hour" else DAY
+        host_id = self.host_id(host)
+        if host_id is None:
+            return []
+        months: Dict[str, List[Tuple]] = {}
+        buckets: Dict[Tuple[int, int], List[int]] = {}
+        for day in range(since // DAY, until // DAY + 1):
+            raw = _read(self._path("raw", day), PROBE, _PROBE_DTYPE, host_id)
+            if raw:
+                folded = _fold_probes(raw, size)
+            else:
+                rows = _read(self._path("hourly", day), ROLLUP, _ROLLUP_DTYPE, host_id)
+                if not rows:
+                    month = self._path("daily", day)
+                    if month not in months:
+                        months[month] = _read(month, ROLLUP, _ROLLUP_DTYPE, host_id)
+                    rows = [r for r in months[month] if r[0] // DAY == day]
+                folded = _fold_rollups(rows, size)
+            buckets.update(folded)
+        return [_bucket_dict(start, *values) for (start, _), values in sorted(buckets.items())
+                if since - size < start <= until]
+
+    def replay(self, since: int) -> Iterator[Tuple[str, int, int, Optional[int]]]:
+        """Raw probes since `since` (epoch) as (host, time, status code, latency ms|None), oldest first."""
+        with self._lock:
+            names = list(self._ids)         # insertion order is the id order
+        for day in self._days("raw"):
+            if day < since // DAY:
+                continue
+            for ts, host_id, code, latency in _read(self._path("raw", day), PROBE, None):
+                if ts >= since and host_id < len(names):
+                    yield names[host_id], ts, code, None if latency == NO_LATENCY else latency
+
+    def replay_rollups(self, since: int) -> Iterator[Tuple[str, int, int, int, int, int]]:
+        """
+        Rollup buckets since `since` (epoch) of the days that no longer have
+        a raw segment, as (host, bucket start, probes, up, timed probes,
+        latency sum ms), oldest first: what replay() cannot cover any more.
+        """
+        with self._lock:
+            names = list(self._ids)
+        raw = set(self._days("raw"))
+        months: Dict[str, List[Tuple]] = {}
+        for day in range(since // DAY, int(time.time()) // DAY + 1):
+            if day in raw:
+                continue
+            rows = _read(self._path("hourly", day), ROLLUP, None)
+            if not rows:
+                month = self._path("daily", day)
+                if month not in months:
+                    months[month] = _read(month, ROLLUP, None)
+                rows = [r for r in months[month] if r[0] // DAY == day]
+            for start, host_id, probes, up, timed, total, _ in sorted(rows):
+                if host_id < len(names):
+                    yield names[host_id], start, probes, up, timed, total
+
+    def stats(self) -> Dict[str, Any]:
+        segments, size = {}, 0
+        for kind in ("raw", "hourly", "daily"):
+            folder = os.path.join(self.directory, kind)
+            names = [n for n in os.listdir(folder) if n.endswith(".bin")]
+            segments[kind] = len(names)
+            size += sum(os.path.getsize(os.path.join(folder, n)) for n in names)
+        with self._lock:
+            return {"hosts": len(self._ids), **self._stats, "segments": segments, "bytes": size}
+
+
+def from_env(directory: str) -> StatusHistory:
+    """
+    Build the history store in STATUS_HISTORY_DIR (default `directory`),
+    keeping raw probes HISTORY_RAW_DAYS days (7) and hourly rollups
+    HISTORY_HOURLY_DAYS days (90).
+    """
+    return StatusHistory(
+        os.environ.get("STATUS_HISTORY_DIR") or directory,
+        raw_days=int(os.environ.get("HISTORY_RAW_DAYS", "7")),
+        hourly_days=int(os.environ.get("HISTORY_HOURLY_DAYS", "90")),
+    )
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+from DomainModel import DomainRecord, DomainStatus, STATUS_BY_CODE
+
+try:  # NumPy is optional: with it, queries run vectorized over the column buffers
+    import numpy as np
+except ImportError:  # pragma: no cover - depends on the environment
+    np = None
+
+
+class StatusTable:
+    """
+    Column-oriented snapshot of every user's domain records.
+
+    One row per (owner, host) with five parallel array columns: host id,
+    owner id, status code, certificate expiry (epoch, 0 = unknown) and last
+    check (epoch, 0 = never). Rows are upserted as lists are loaded and scan
+    results arrive, and deleted by moving the last row into the hole, so the
+    columns stay dense. Filters and aggregates run over whole columns: with
+    NumPy via zero-copy views of the array buffers, otherwise in plain Python.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.host_ids = array("I")
+        self.owner_ids = array("I")
+        self.status = array("B")
+        self.expires_at = array("q")
+        self.checked_at = array("q")
+
+        self._hosts: List[str] = []
+        self._host_index: Dict[str, int] = {}
+        self._owners: List[str] = []
+        self._owner_index: Dict[str, int] = {}
+        self._owner_rows: Dict[int, Dict[int, int]] = {}  # owner id -> {host id: row}
+
+    # ----------------------------
+    # Dictionaries
+    # ----------------------------
+    def _host_id(self, host: str) -> int:
+        host_id = self._host_index.get(host)
+        if host_id is None:
+            host_id = self._host_index[host] = len(self._hosts)
+            self._hosts.append(host)
+        return host_id
+
+    def _owner_id(self, owner: str) -> int:
+        owner_id = self._owner_index.get(owner)
+        if owner_id is None:
+            owner_id = self._owner_index[owner] = len(self._owners)
+            self._owners.append(owner)
+            self._owner_rows[owner_id] = {}
+        return owner_id
+
+    # ----------------------------
+    # Row maintenance
+    # ----------------------------
+    def _upsert(self, owner_id: int, record: DomainRecord, checked_at: Optional[int]) -> None:
+        host_id = self._host_id(record.domain)
+        owned = self._owner_rows[owner_id]
+        row = owned.get(host_id)
+        if row is None:
+            row = owned[host_id] = len(self.host_ids)
+            self.host_ids.append(host_id)
+            self.owner_ids.append(owner_id)
+            self.status.append(record.status.code)
+            self.expires_at.append(record.expires_at)
+            self.checked_at.append(checked_at or 0)
+            return
+        self.status[row] = record.status.code
+        self.expires_at[row] = record.expires_at
+        if checked_at is not None:
+            self.checked_at[row] = checked_at
+
+    def _delete(self, owner_id: int, host_id: int) -> None:
+        row = self._owner_rows[owner_id].pop(host_id, None)
+        if row is None:
+            return
+        last = len(self.host_ids) - 1
+        if row != last:
+            for column in (self.host_ids, self.owner_ids, self.status, self.expires_at, self.checked_at):
+                column[row] = column[last]
+            self._owner_rows[self.owner_ids[row]][self.host_ids[row]] = row
+        for column in (self.host_ids, self.owner_ids, self.status, self.expires_at, self.checked_at):
+            column.pop()
+
+    def replace_user(self, owner: str, records: Iterable[DomainRecord]) -> None:
+        """Make `owner`'s rows exactly `records` (keeps last-check times of kept hosts)."""
+        with self._lock:
+            owner_id = self._owner_id(owner)
+            records = list(records)
+            keep = {self._host_id(r.domain) for r in records}
+            for host_id in [h for h in self._owner_rows[owner_id] if h not in keep]:
+                self._delete(owner_id, host_id)
+            for record in records:
+                self._upsert(owner_id, record, None)
+
+    def upsert(self, owner: str, records: Iterable[DomainRecord], checked_at: Optional[float] = None) -> None:
+        """Insert or update `owner`'s rows; scan results pass the time they were checked."""
+        stamp = int(checked_at) if checked_at is not None else None
+        with self._lock:
+            owner_id = self._owner_id(owner)
+            for record in records:
+                self._upsert(owner_id, record, stamp)
+
+    def update(self, owner: str, records: Iterable[DomainRecord],
+               checked_at: Optional[float] = None) -> List[DomainRecord]:
+        """Like upsert(), but only rows that already exist are touched; return their records."""
+        stamp = int(checked_at) if checked_at is not None else None
+        with self._lock:
+            owner_id = self._owner_index.get(owner)
+            if owner_id is None:
+                return []
+            owned, index = self._owner_rows[owner_id], self._host_index
+            matched = [r for r in records if index.get(r.domain) in owned]
+            for record in matched:
+                self._upsert(owner_id, record, stamp)
+            return matched
+
+    def remove(self, owner: str, hosts: Iterable[str]) -> None:
+        with self._lock:
+            owner_id = self._owner_index.get(owner)
+            if owner_id is None:
+                return
+            for host in hosts:
+                host_id = self._host_index.get(host)
+                if host_id is not None:
+                    self._delete(owner_id, host_id)
+
+    def __len__(self) -> int:
+        return len(self.host_ids)
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def _np_mask(self, codes: Optional[List[int]], horizon: Optional[int], owner_id: Optional[int]):
+        """Boolean NumPy mask of matching rows (the buffer views die with the call)."""
+        mask = np.ones(len(self.host_ids), dtype=bool)
+        if codes is not None:
+            mask &= np.isin(np.frombuffer(self.status, dtype=np.uint8), codes)
+        if horizon is not None:
+            expires = np.frombuffer(self.expires_at, dtype=np.int64)
+            mask &= (expires > 0) & (expires <= horizon)
+        if owner_id is not None:
+            mask &= np.frombuffer(self.owner_ids, dtype=np.uint32) == owner_id
+        return mask
+
+    def _match(self, statuses: Optional[Iterable[DomainStatus]], horizon: Optional[int],
+               owner_id: Optional[int]) -> List[int]:
+        """Return matching row numbers; soonest expiry first when filtering by expiry."""
+        codes = sorted({s.code for s in statuses}) if statuses else None
+
+        if np is not None:
+            rows = np.flatnonzero(self._np_mask(codes, horizon, owner_id))
+            if horizon is not None:
+                expires = np.frombuffer(self.expires_at, dtype=np.int64)
+                rows = rows[np.argsort(expires[rows], kind="stable")]
+                del expires
+            # Plain ints: no view may outlive the call, or the arrays could not grow
+            return rows.tolist()
+
+        rows = range(len(self.host_ids))
+        if owner_id is not None:
+            rows = sorted(self._owner_rows[owner_id].values())
+        if codes is not None:
+            status, wanted = self.status, set(codes)
+            rows = [i for i in rows if status[i] in wanted]
+        if horizon is not None:
+            expires = self.expires_at
+            rows = sorted((i for i in rows if 0 < expires[i] <= horizon), key=expires.__getitem__)
+        return list(rows)
+
+    def query(self, statuses: Optional[Iterable[DomainStatus]] = None,
+              expires_before: Optional[int] = None, owner: Optional[str] = None,
+              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Return matching rows as dicts (username, domain, status, expires_at,
+        checked_at). With `expires_before` (epoch, inclusive) only known
+        certificate expiries up to then match, soonest first.
+        """
+        with self._lock:
+            owner_id = self._owner_index.get(owner) if owner is not None else None
+            if owner is not None and owner_id is None:
+                return []
+            rows = self._match(statuses, expires_before, owner_id)
+            if limit is not None:
+                rows = rows[:limit]
+            return [{
+                "username": self._owners[self.owner_ids[i]],
+                "domain": self._hosts[self.host_ids[i]],
+                "status": STATUS_BY_CODE[self.status[i]].value,
+                "expires_at": self.expires_at[i],
+                "checked_at": self.checked_at[i],
+            } for i in rows]
+
+    def count(self, statuses: Optional[Iterable[DomainStatus]] = None,
+              expires_before: Optional[int] = None, owner: Optional[str] = None) -> int:
+        """Number of rows matching the same filters as query()."""
+        with self._lock:
+            owner_id = self._owner_index.get(owner) if owner is not None else None
+            if owner is not None and owner_id is None:
+                return 0
+            if np is not None:
+                codes = sorted({s.code for s in statuses}) if statuses else None
+                return int(np.count_nonzero(self._np_mask(codes, expires_before, owner_id)))
+            return len(self._match(statuses, expires_before, owner_id))
+
+    def status_counts(self) -> Dict[str, int]:
+        """Number of rows per status."""
+        with self._lock:
+            if np is not None:
+                counts = np.bincount(np.frombuffer(self.status, dtype=np.uint8),
+                                     minlength=len(STATUS_BY_CODE)).tolist()
+            else:
+                counts = [0] * len(STATUS_BY_CODE)
+                for code in self.status:
+                    counts[code] += 1
+            return {STATUS_BY_CODE[code].value: n for code, n in enumerate(counts)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rows": len(self.host_ids),
+                "hosts": len(self._hosts),
+                "owners": len(self._owners),
+                "vectorized": np is not None,
+            }
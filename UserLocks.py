@@ -0,0 +1,133 @@
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+
+class RWLock:
+    """
+    Writer-preferring readers/writer lock.
+
+    Any number of readers may hold the lock together; a writer holds it alone.
+    Both modes are re-entrant for the owning thread, and a thread holding the
+    write lock may also take the read lock (not the other way around).
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers: Dict[int, int] = {}   # thread id -> read depth
+        self._writer = None                  # owning thread id
+        self._write_depth = 0
+        self._writers_waiting = 0
+
+    def acquire_read(self) -> bool:
+        """Take the read lock; return True if the caller had to wait for it."""
+        me = threading.get_ident()
+        waited = False
+        with self._cond:
+            if self._writer == me or me in self._readers:
+                self._readers[me] = self._readers.get(me, 0) + 1
+                return False
+            while self._writer is not None or self._writers_waiting:
+                waited = True
+                self._cond.wait()
+            self._readers[me] = 1
+        return waited
+
+    def release_read(self) -> None:
+        me = threading.get_ident()
+        with self._cond:
+            depth = self._readers[me] - 1
+            if depth:
+                self._readers[me] = depth
+            else:
+                del self._readers[me]
+                if not self._readers:
+                    self._cond.notify_all()
+
+    def acquire_write(self) -> bool:
+        """Take the write lock; return True if the caller had to wait for it."""
+        me = threading.get_ident()
+        waited = False
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return False
+            if me in self._readers:
+                raise RuntimeError("Cannot upgrade a read lock to a write lock")
+            self._writers_waiting += 1
+            try:
+                while self._writer is not None or self._readers:
+                    waited = True
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writer = me
+            self._write_depth = 1
+        return waited
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._write_depth -= 1
+            if not self._write_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+
+class LockTable:
+    """
+    Fixed set of RWLocks striped by a hash of the username, so different users
+    rarely contend while memory stays bounded no matter how many users exist.
+    Records how often and how long callers wait, per mode.
+    """
+
+    def __init__(self, stripes: int = 64):
+        self._stripes = [RWLock() for _ in range(stripes)]
+        self._stats_lock = threading.Lock()
+        self._stats = {mode: {"acquired": 0, "contended": 0, "wait_total_ms": 0.0, "wait_max_ms": 0.0}
+                       for mode in ("read", "write")}
+
+    def _stripe(self, username: str) -> RWLock:
+        return self._stripes[zlib.crc32(username.encode("utf-8")) % len(self._stripes)]
+
+    def _record(self, mode: str, waited: bool, started: float) -> None:
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            s = self._stats[mode]
+            s["acquired"] += 1
+            if waited:
+                s["contended"] += 1
+                s["wait_total_ms"] += wait_ms
+                s["wait_max_ms"] = max(s["wait_max_ms"], wait_ms)
+
+    @contextmanager
+    def read(self, username: str) -> Iterator[None]:
+        lock = self._stripe(username)
+        started = time.perf_counter()
+        self._record("read", lock.acquire_read(), started)
+        try:
+            yield
+        finally:
+            lock.release_read()
+
+    @contextmanager
+    def write(self, username: str) -> Iterator[None]:
+        lock = self._stripe(username)
+        started = time.perf_counter()
+        self._record("write", lock.acquire_write(), started)
+        try:
+            yield
+        finally:
+            lock.release_write()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return acquisition and wait-time counters per lock mode."""
+        with self._stats_lock:
+            out = {"stripes": len(self._stripes)}
+            for mode, s in self._stats.items():
+                avg = s["wait_total_ms"] / s["contended"] if s["contended"] else 0.0
+                out[mode] = {**s, "wait_avg_ms": round(avg, 3),
+                             "wait_total_ms": round(s["wait_total_ms"], 3),
+                             "wait_max_ms": round(s["wait_max_ms"], 3)}
+            return out
@@ -1,4 +1,5 @@
 import json
+import os
 import re
 import logger
 from pathlib import Path
@@ -7,6 +8,8 @@ import DomainManagementEngine as DME
 logger = logger.setup_logger("UserManagementModule")
 USERS_CRED_PATH = "./UsersData/users.json"
 DATA_PATH = "./UsersData/"
+# Comma-separated usernames allowed to use admin-only endpoints (e.g. global export)
+ADMIN_USERS = {u.strip() for u in os.environ.get("ADMIN_USERS", "").split(",") if u.strip()}
 
 class UserManager:
     """
@@ -182,6 +185,12 @@ class UserManager:
             logger.error(f"Could not validate users credentials. {str(e)}")
             return False
 
+    def is_admin(self, username):
+        """
+        This method checks if the username is configured as an admin (ADMIN_USERS).
+        """
+        return bool(username) and username in ADMIN_USERS
+
     def remove_user(self, username):
         logger.info(f"deleting {username}'s details from users.json, and deletes its domains file if exists.")
         try:
@@ -1,8 +1,19 @@
-from flask import Flask, request, jsonify, session, redirect, render_template
+from flask import Flask, Response, request, jsonify, session, redirect, render_template, stream_with_context
 import os
+import threading
+import time
 from UserManagementModule import UserManager as UM
 from DomainManagementEngine import DomainManagementEngine as DME
-from MonitoringSystem import MonitoringSystem as MS
+from MonitoringSystem import (MonitoringSystem as MS, checkpoints as scan_checkpoints, http_pool,
+                              profiles as probe_profiles, sharded_scanner, coordinator as scan_coordinator,
+                              membership as scan_membership, limiter as probe_limiter)
+import BulkImport
+import DomainExport
+import DomainPaging
+import DomainSearch
+import HashRing
+import ProbePipeline
+import StatusHistory
 import logger
 
 logger = logger.setup_logger("app")
@@ -13,6 +24,9 @@ monitoring_system = MS()
 app = Flask(__name__)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "group2_devops_project")
 
+# Longest window /domain_history serves (days)
+MAX_HISTORY_DAYS = 400
+
 
 # ---------------------------
 # Helpers
@@ -25,6 +39,21 @@ def _get_payload():
     return (request.form or {}).to_dict()
 
 
+def _not_modified(etag):
+    """304 response if the client already has the representation tagged `etag`, else None."""
+    if request.if_none_match.contains(etag):
+        return _with_etag(Response(status=304), etag)
+    return None
+
+
+def _with_etag(response, etag):
+    """Tag a per-user response so clients revalidate it with If-None-Match."""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.vary.add("Cookie")
+    return response
+
+
 # ---------------------------
 # UI routes
 # ---------------------------
@@ -96,9 +125,25 @@ def dashboard():
         return redirect("/login")
 
     username = session['username']
-    domains = domain_engine.list_domains(username)
+    etag = domain_engine.domains_version(username)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    try:
+        query = DomainPaging.parse_args(request.args)
+    except DomainPaging.PagingError:
+        query = DomainPaging.parse_args({})
+    domains, after, total = domain_engine.page_domains(username, **query)
 
-    return render_template('dashboard.html', username=username, domains=domains)
+    page = render_template(
+        'dashboard.html', username=username, domains=domains, total=total,
+        next_cursor=DomainPaging.encode_cursor(query["sort"], query["descending"], after),
+        sort=query["sort"], order="desc" if query["descending"] else "asc",
+        status=request.args.get("status", ""), limit=query["limit"],
+        version=domain_engine.change_token(username),
+    )
+    return _with_etag(app.make_response(page), etag)
 
 
 @app.route('/logout', methods=['GET'])
@@ -146,32 +191,20 @@ def bulk_domains():
         return jsonify({"ok": False, "error": "File is required"}), 400
 
     filename = (f.filename or "").lower()
-    if not filename.endswith(".txt"):
-        return jsonify({"ok": False, "error": "Only .txt files are allowed"}), 400
-
-    added, duplicates, invalid = [], [], []
-    for raw in f.read().decode('utf-8', errors='ignore').splitlines():
-        raw = raw.strip()
-        if not raw:
-            continue
-
-        ok, domain, reason = domain_engine.validate_domain(raw)
+    fmt, _ = BulkImport.detect_format(filename)
+    if fmt is None:
+        allowed = ", ".join(BulkImport.SUPPORTED_EXTENSIONS)
+        return jsonify({"ok": False, "error": f"Only {allowed} files are allowed"}), 400
 
-        if not ok:
-            invalid.append({"input": raw, "reason": reason})
-            continue
+    # CSV column / NDJSON key selector (header name or 0-based index)
+    column = (request.form.get("column") or "").strip() or None
 
-        saved = domain_engine.add_domain(session["username"], domain)
-        (added if saved else duplicates).append(domain)
+    # Parse the upload straight from the request stream instead of reading it into memory
+    result = domain_engine.bulk_upload_stream(session["username"], f.stream, filename, column)
+    if not result.get("ok"):
+        return jsonify(result), 400
 
-    return jsonify({
-        "ok": True,
-        "summary": {
-            "added": added,
-            "duplicates": duplicates,
-            "invalid": invalid
-        }
-    }), 200
+    return jsonify(result), 200
 
 
 @app.route('/remove_domains', methods=['POST'])
@@ -181,6 +214,9 @@ def remove_domains():
 
     data = _get_payload()
     domains_to_remove = data.get("domains") or []
+    if data.get("all") is True:
+        # "Delete All" on a paged dashboard: the client only knows the visible rows
+        domains_to_remove = [d.domain for d in domain_engine.list_domains(session["username"])]
 
     if not isinstance(domains_to_remove, list) or not domains_to_remove:
         return jsonify({"ok": False, "error": "Request must include a non-empty 'domains' list"}), 400
@@ -190,13 +226,192 @@ def remove_domains():
     return jsonify({"ok": True, "summary": result}), 200
 
 
+@app.route('/domains/profile', methods=['POST'])
+def set_probe_profile():
+    """Choose the probe profile (e.g. "dns", "tcp:25", "tls", "web") of one of the user's domains."""
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+    data = _get_payload()
+    domain = (data.get("domain") or "").strip()
+    profile = (data.get("profile") or "").strip().lower()
+    if not ProbePipeline.ProbeProfiles.valid(profile):
+        allowed = ", ".join(ProbePipeline.ProbeProfiles.NAMES)
+        return jsonify({"ok": False, "error": f"Unknown probe profile: {profile!r} (one of {allowed})"}), 400
+
+    record = domain_engine.set_probe_profile(session["username"], domain, profile,
+                                             reported=probe_profiles.parse(profile).reports)
+    if record is None:
+        return jsonify({"ok": False, "error": "Domain not found"}), 404
+    return jsonify({"ok": True, "domain": record.to_dict()}), 200
+
+
 @app.route('/my_domains', methods=['GET'])
 def my_domains():
     if "username" not in session:
         return jsonify({"ok": False, "error": "Unauthorized"}), 401
 
-    data = domain_engine.list_domains(session["username"])
-    return jsonify({"ok": True, "data": data}), 200
+    username = session["username"]
+    etag = domain_engine.domains_version(username)
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    if not any(p in request.args for p in DomainPaging.PAGE_PARAMS):
+        data = [d.to_dict() for d in domain_engine.list_domains(username)]
+        return _with_etag(jsonify({"ok": True, "data": data}), etag), 200
+
+    try:
+        query = DomainPaging.parse_args(request.args)
+    except DomainPaging.PagingError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    domains, after, total = domain_engine.page_domains(username, **query)
+    return _with_etag(jsonify({
+        "ok": True,
+        "data": [d.to_dict() for d in domains],
+        "next_cursor": DomainPaging.encode_cursor(query["sort"], query["descending"], after),
+        "total": total,
+    }), etag), 200
+
+
+@app.route('/domains/changes', methods=['GET'])
+def domain_changes():
+    """Upserts and deletes since the client's `since` version (reset=True means reload)."""
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+    changes = domain_engine.changes_since(session["username"], request.args.get("since"))
+    return jsonify({"ok": True, **changes}), 200
+
+
+@app.route('/search_domains', methods=['GET'])
+def search_domains():
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+    try:
+        limit = int(request.args.get("limit", 100))
+    except ValueError:
+        return jsonify({"ok": False, "error": "'limit' must be an integer"}), 400
+
+    try:
+        result = domain_engine.search_domains(
+            session["username"],
+            request.args.get("q", ""),
+            mode=(request.args.get("mode") or "suffix").lower(),
+            limit=max(limit, 0),
+        )
+    except DomainSearch.SearchError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    return jsonify({"ok": True, **result}), 200
+
+
+# ---------------------------
+# Export
+# ---------------------------
+def _export_response(usernames, with_username):
+    """Stream the filtered domains of `usernames` as NDJSON or CSV."""
+    fmt = (request.args.get("format") or "ndjson").lower()
+    if fmt not in DomainExport.FORMATS:
+        return jsonify({"ok": False, "error": f"Unsupported format: {fmt}"}), 400
+
+    statuses = request.args.get("status")
+    try:
+        predicate = DomainExport.build_filter(
+            statuses.split(",") if statuses else None,
+            request.args.get("expires_within"),
+        )
+    except DomainExport.ExportError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    rows = DomainExport.iter_rows(domain_engine, usernames, predicate, with_username)
+    return Response(
+        stream_with_context(DomainExport.render(fmt, rows, with_username)),
+        mimetype=DomainExport.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename=domains.{fmt}"},
+    )
+
+
+@app.route('/export_domains', methods=['GET'])
+def export_domains():
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+    return _export_response([session["username"]], with_username=False)
+
+
+@app.route('/export_domains/all', methods=['GET'])
+def export_all_domains():
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+    if not user_manager.is_admin(session["username"]):
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+
+    return _export_response(domain_engine.list_users(), with_username=True)
+
+
+@app.route('/domains/overview', methods=['GET'])
+def domains_overview():
+    """Cross-user status counts and matching rows from the in-memory status table."""
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+    if not user_manager.is_admin(session["username"]):
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+
+    statuses = request.args.get("status")
+    try:
+        wanted = DomainExport.parse_statuses(statuses.split(",") if statuses else None)
+        horizon = DomainExport.parse_horizon(request.args.get("expires_within"))
+        limit = int(request.args.get("limit", 100))
+    except DomainExport.ExportError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except ValueError:
+        return jsonify({"ok": False, "error": "'limit' must be an integer"}), 400
+
+    table = domain_engine.status_table
+    return jsonify({
+        "ok": True,
+        "counts": table.status_counts(),
+        "matched": table.count(wanted, horizon),
+        "rows": table.query(wanted, horizon, limit=max(limit, 0)),
+    }), 200
+
+
+def _upcoming_response(username):
+    """Soonest certificate expirations (of `username`, or of everybody for None)."""
+    try:
+        horizon = DomainExport.parse_horizon(request.args.get("expires_within"))
+        limit = int(request.args.get("limit", 50))
+    except DomainExport.ExportError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    except ValueError:
+        return jsonify({"ok": False, "error": "'limit' must be an integer"}), 400
+
+    rows = domain_engine.upcoming_expirations(username, limit=max(limit, 0), until=horizon)
+    if username is not None:
+        for row in rows:
+            del row["username"]
+    return jsonify({"ok": True, "expirations": rows}), 200
+
+
+@app.route('/expirations/upcoming', methods=['GET'])
+def upcoming_expirations():
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+    return _upcoming_response(session["username"])
+
+
+@app.route('/expirations/upcoming/all', methods=['GET'])
+def upcoming_expirations_all():
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+    if not user_manager.is_admin(session["username"]):
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+
+    return _upcoming_response(None)
 
 
 # ---------------------------
@@ -215,6 +430,99 @@ def scan_domains():
         logger.error(f"Error during scan: {e}")
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route('/internal/probe', methods=['POST'])
+def internal_probe():
+    """Probe hosts this instance owns on the scan ring, for another instance's scan."""
+    if scan_membership is None:
+        return jsonify({"ok": False, "error": "Not found"}), 404
+    if not scan_membership.authorized(request.headers.get(HashRing.PEER_TOKEN_HEADER)):
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+
+    items = (request.get_json(silent=True) or {}).get("domains")
+    if not isinstance(items, list) or not all(
+            isinstance(i, list) and len(i) == 2 and isinstance(i[0], str) and isinstance(i[1], (str, type(None)))
+            for i in items):
+        return jsonify({"ok": False, "error": "'domains' must be a list of [domain, profile] pairs"}), 400
+    # Peers only send monitored domains: the same FQDN check as /add_domain (no IPs, ports or URLs)
+    invalid = [d for d, _ in items if domain_engine.validate_domain(d)[1] != d.lower()]
+    if invalid:
+        return jsonify({"ok": False, "error": "Invalid domains", "invalid": invalid[:20]}), 400
+
+    results = monitoring_system.probe_for_peer([(d, p) for d, p in items], domain_engine)
+    scan_membership.served(len(results))
+    return jsonify({"ok": True, "results": [[r.to_dict(), latency, shared] for r, latency, shared in results]}), 200
+
+@app.route('/domain_history', methods=['GET'])
+def domain_history():
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+    domain = request.args.get("domain", "")
+    resolution = (request.args.get("resolution") or "hour").lower()
+    if resolution not in StatusHistory.RESOLUTIONS:
+        return jsonify({"ok": False, "error": f"Unsupported resolution: {resolution}"}), 400
+    try:
+        days = int(request.args.get("days", 7))
+    except ValueError:
+        return jsonify({"ok": False, "error": "'days' must be an integer"}), 400
+    if not 1 <= days <= MAX_HISTORY_DAYS:
+        return jsonify({"ok": False, "error": f"'days' must be between 1 and {MAX_HISTORY_DAYS}"}), 400
+
+    until = int(time.time())
+    points = domain_engine.domain_history(session["username"], domain, until - days * 86400, until, resolution)
+    if points is None:
+        return jsonify({"ok": False, "error": "Domain not found"}), 404
+    return jsonify({"ok": True, "domain": domain, "resolution": resolution, "points": points}), 200
+
+@app.route('/domains/uptime', methods=['GET'])
+def domains_uptime():
+    """Rolling uptime/latency of the user's domains (all, or the comma separated `domains`)."""
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+
+    domains = request.args.get("domains")
+    wanted = [d.strip().lower() for d in domains.split(",") if d.strip()] if domains else None
+    return jsonify({"ok": True, "uptime": domain_engine.uptime(session["username"], wanted)}), 200
+
+
+@app.route('/domains/uptime/all', methods=['GET'])
+def domains_uptime_all():
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+    if not user_manager.is_admin(session["username"]):
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        return jsonify({"ok": False, "error": "'limit' must be an integer"}), 400
+    return jsonify({"ok": True, **domain_engine.uptime_overview(max(limit, 0))}), 200
+
+# ---------------------------
+# Engine statistics
+# ---------------------------
+@app.route('/stats', methods=['GET'])
+def engine_stats():
+    if "username" not in session:
+        return jsonify({"ok": False, "error": "Unauthorized"}), 401
+    if not user_manager.is_admin(session["username"]):
+        return jsonify({"ok": False, "error": "Forbidden"}), 403
+
+    return jsonify({
+        "ok": True,
+        "locks": domain_engine.lock_stats(),
+        "cache": domain_engine.cache_stats(),
+        "storage": domain_engine.storage_stats(),
+        "hosts": domain_engine.host_stats(),
+        "scans": scan_checkpoints.stats(),
+        "http_pool": http_pool.stats(),
+        "probes": probe_profiles.stats(),
+        "limits": probe_limiter.stats(),
+        "sharded_scans": sharded_scanner.stats(),
+        "coordinator": scan_coordinator.stats() if scan_coordinator else None,
+        "membership": scan_membership.stats() if scan_membership else None,
+    }), 200
+
 # -------------------------#
 #  Reload Users to Memory  #
 # -------------------------#
@@ -237,4 +545,9 @@ def static_files(filename):
 
 
 if __name__ == "__main__":
+    # Register every stored user's hosts in the shared registry in the background
+    threading.Thread(target=domain_engine.warm_hosts, name="host-registry-warmup", daemon=True).start()
+    # The debug reloader runs this file in two processes: only the serving one listens for scan workers
+    if scan_coordinator is not None and os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        scan_coordinator.start()
     app.run(debug=True, host="0.0.0.0", port=8080)
@@ -9,12 +9,12 @@ document.addEventListener("DOMContentLoaded", function () {
     el.classList.add("modal-status", `status-${type}`);
   }
 
-  async function finalizeModal(el, message, type = "success", modal, reload = true) {
+  async function finalizeModal(el, message, type = "success", modal, refresh = true) {
     showStatus(el, message, type);
     if (type === "success" && modal) {
       setTimeout(() => {
         closeModal(modal);
-        if (reload) location.reload();
+        if (refresh) applyChanges();
       }, 1200);
     }
   }
@@ -50,6 +50,12 @@ document.addEventListener("DOMContentLoaded", function () {
   const bulkActions = document.querySelector(".bulk-actions");
   const selectAllCheckbox = document.getElementById("selectAll");
 
+  const tablePaging = document.getElementById("tablePaging");
+  const tableBody = document.getElementById("domainTableBody");
+  const loadMoreBtn = document.getElementById("loadMoreBtn");
+  const pagingInfo = document.getElementById("pagingInfo");
+
+  const ALL_DOMAINS = "__all__";
   let domainsToDelete = [];
 
   // =======================
@@ -154,9 +160,10 @@ document.addEventListener("DOMContentLoaded", function () {
   });
 
   document.getElementById("deleteAllBtn")?.addEventListener("click", () => {
-    const all = Array.from(document.querySelectorAll(".select-domain")).map((cb) => cb.value);
-    if (!all.length) return alert("No domains available!");
-    openDeleteModal(all, `Delete ALL ${all.length} domains?`);
+    // Only one page is loaded, so ask the server to delete every domain
+    const total = Number(tablePaging?.dataset.total || 0);
+    if (!total) return alert("No domains available!");
+    openDeleteModal(ALL_DOMAINS, `Delete ALL ${total} domains?`);
   });
 
   cancelDeleteBtn?.addEventListener("click", () => {
@@ -172,10 +179,11 @@ document.addEventListener("DOMContentLoaded", function () {
     await new Promise(requestAnimationFrame);
 
     try {
+      const payload = domainsToDelete === ALL_DOMAINS ? { all: true } : { domains: domainsToDelete };
       const response = await fetch("/remove_domains", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ domains: domainsToDelete }),
+        body: JSON.stringify(payload),
       });
       const result = await response.json();
 
@@ -205,16 +213,175 @@ document.addEventListener("DOMContentLoaded", function () {
       cb.onchange = toggleBulkActions;
     });
 
-    selectAllCheckbox?.addEventListener("change", () => {
-      const allChecks = document.querySelectorAll(".select-domain");
-      allChecks.forEach((cb) => (cb.checked = selectAllCheckbox.checked));
-      toggleBulkActions();
-    });
+    // Re-run after "Load more" adds rows, so assign instead of adding listeners
+    if (selectAllCheckbox) {
+      selectAllCheckbox.onchange = () => {
+        const allChecks = document.querySelectorAll(".select-domain");
+        allChecks.forEach((cb) => (cb.checked = selectAllCheckbox.checked));
+        toggleBulkActions();
+      };
+    }
   }
 
   attachCheckboxHandlers();
   toggleBulkActions(); // initialize hidden
 
+  // =======================
+  // Paging (Load more)
+  // =======================
+  function buildRow(d) {
+    const tr = document.createElement("tr");
+    const badge = d.status.toLowerCase().replace(/ /g, "-");
+    tr.innerHTML = `
+      <td><input type="checkbox" class="select-domain"></td>
+      <td></td>
+      <td><span class="badge ${badge}"></span></td>
+      <td class="timestamp"></td>
+      <td></td>
+      <td class="uptime">&ndash;</td>
+      <td>
+        <button class="delete-domain-btn" title="Delete">
+          <img src="/static/dashboard/trash.png" alt="Delete" class="trash-icon">
+        </button>
+      </td>`;
+    // Values are set as text, never as HTML
+    tr.querySelector(".select-domain").value = d.domain;
+    tr.children[1].textContent = d.domain;
+    tr.querySelector(".badge").textContent = d.status;
+    tr.children[3].textContent = d.ssl_expiration;
+    tr.children[4].textContent = d.ssl_issuer;
+    tr.querySelector(".delete-domain-btn").setAttribute("data-domain", d.domain);
+    return tr;
+  }
+
+  loadMoreBtn?.addEventListener("click", async () => {
+    const cursor = tablePaging.dataset.nextCursor;
+    if (!cursor) return;
+    const params = new URLSearchParams({
+      cursor,
+      sort: tablePaging.dataset.sort,
+      order: tablePaging.dataset.order,
+      limit: tablePaging.dataset.limit,
+    });
+    if (tablePaging.dataset.status) params.set("status", tablePaging.dataset.status);
+
+    loadMoreBtn.disabled = true;
+    try {
+      const res = await fetch(`/my_domains?${params}`);
+      const result = await res.json();
+      if (!result.ok) throw new Error(result.error);
+
+      // Rows patched in by the change feed may already be on the page
+      result.data.forEach((d) => findRow(d.domain) || tableBody.appendChild(buildRow(d)));
+      tablePaging.dataset.nextCursor = result.next_cursor || "";
+      tablePaging.dataset.total = result.total;
+      pagingInfo.textContent = `Showing ${tableBody.querySelectorAll(".select-domain").length} of ${result.total}`;
+      loadMoreBtn.style.display = result.next_cursor ? "" : "none";
+      attachDeleteHandlers();
+      attachCheckboxHandlers();
+      refreshUptime();
+    } catch {
+      alert("Failed to load more domains.");
+    }
+    loadMoreBtn.disabled = false;
+  });
+
+  // =======================
+  // Rolling uptime (filled in after the rows are on the page)
+  // =======================
+  function formatUptime(w) {
+    return w && w.uptime !== null ? `${w.uptime}%` : "\u2013";
+  }
+
+  async function refreshUptime() {
+    const domains = Array.from(tableBody.querySelectorAll(".select-domain")).map((cb) => cb.value);
+    for (let i = 0; i < domains.length; i += 100) {
+      const params = new URLSearchParams({ domains: domains.slice(i, i + 100).join(",") });
+      try {
+        const res = await fetch(`/domains/uptime?${params}`);
+        const result = await res.json();
+        if (!result.ok) return;
+        Object.entries(result.uptime).forEach(([domain, w]) => {
+          const cell = findRow(domain)?.querySelector(".uptime");
+          if (!cell) return;
+          cell.textContent = [w["24h"], w["7d"], w["30d"]].map(formatUptime).join(" / ");
+          const day = w["24h"];
+          cell.title = day.p50_ms !== null
+            ? `Response time (24h): p50 ${day.p50_ms} ms, p95 ${day.p95_ms} ms`
+            : "No response times in the last 24h";
+        });
+      } catch {
+        return;
+      }
+    }
+  }
+
+  // =======================
+  // Change feed (patch the table instead of reloading)
+  // =======================
+  function findRow(domain) {
+    const cb = Array.from(tableBody.querySelectorAll(".select-domain")).find((c) => c.value === domain);
+    return cb ? cb.closest("tr") : null;
+  }
+
+  function insertRow(row, domain) {
+    tableBody.querySelector(".empty-row")?.closest("tr").remove();
+    const rows = Array.from(tableBody.querySelectorAll(".select-domain"));
+    const hasMore = Boolean(tablePaging.dataset.nextCursor);
+
+    if (tablePaging.dataset.sort !== "domain") {
+      tableBody.prepend(row);
+      return true;
+    }
+    const desc = tablePaging.dataset.order === "desc";
+    const next = rows.find((cb) => (desc ? cb.value < domain : cb.value > domain));
+    if (next) {
+      tableBody.insertBefore(row, next.closest("tr"));
+      return true;
+    }
+    // Past the last loaded row: "Load more" will bring it if there are more pages
+    if (hasMore) return false;
+    tableBody.appendChild(row);
+    return true;
+  }
+
+  async function applyChanges() {
+    if (!tablePaging) return location.reload();
+    try {
+      const params = new URLSearchParams({ since: tablePaging.dataset.version });
+      const res = await fetch(`/domains/changes?${params}`);
+      const result = await res.json();
+      if (!result.ok || result.reset) return location.reload();
+
+      let total = Number(tablePaging.dataset.total || 0);
+      result.deletes.forEach((domain) => {
+        const row = findRow(domain);
+        if (row) row.remove();
+        total -= 1;
+      });
+      const status = tablePaging.dataset.status.toLowerCase();
+      result.upserts.forEach((d) => {
+        const row = findRow(d.domain);
+        if (row) {
+          row.replaceWith(buildRow(d));
+        } else if (!status || status === d.status.toLowerCase()) {
+          insertRow(buildRow(d), d.domain);
+          total += 1;
+        }
+      });
+
+      tablePaging.dataset.version = result.version;
+      tablePaging.dataset.total = Math.max(total, 0);
+      pagingInfo.textContent = `Showing ${tableBody.querySelectorAll(".select-domain").length} of ${tablePaging.dataset.total}`;
+      attachDeleteHandlers();
+      attachCheckboxHandlers();
+      toggleBulkActions();
+      refreshUptime();
+    } catch {
+      location.reload();
+    }
+  }
+
   // =======================
   // Scan Now
   // =======================
@@ -223,7 +390,9 @@ document.addEventListener("DOMContentLoaded", function () {
     scanNowBtn.textContent = "Scanning...";
     try {
       await fetch("/scan_domains");
-      location.reload();
+      await applyChanges();
+      scanNowBtn.textContent = "Scan Now";
+      scanNowBtn.disabled = false;
     } catch {
       alert("Scan failed.");
       scanNowBtn.textContent = "Scan Now";
@@ -257,6 +426,8 @@ document.addEventListener("DOMContentLoaded", function () {
   // Auto-scan on page load
   // =======================
 
+  if (tableBody) refreshUptime();
+
   if (!sessionStorage.getItem("scanClicked")) {
     const scanBtn = document.getElementById("scanNowBtn");
     if (scanBtn) {
@@ -137,6 +137,18 @@ def remove_domains(domains, cookie):
     return response
 
 
+def set_probe_profile(domain, profile, cookie):
+    """Choose how one domain is probed."""
+    headers = {
+        "Content-Type": "application/json",
+        "Cookie": f"session={cookie}"
+    }
+    payload = {"domain": domain, "profile": profile}
+    response = post("/domains/profile", json=payload, headers=headers)
+    print_response(response)
+    return response
+
+
 def list_domains(cookie):
     """Get the current user's domain list."""
     headers = {"Cookie": f"session={cookie}"}
@@ -146,7 +158,7 @@ def list_domains(cookie):
 
 
 def bulk_upload_domains(file_path, cookie):
-    """Upload a .txt file with multiple domains."""
+    """Upload a file (.txt/.csv/.ndjson, optionally .gz) with multiple domains."""
     headers = {"Cookie": f"session={cookie}"}
     with open(file_path, "rb") as f:
         response = post("/bulk_domains", files={"file": f}, headers=headers)
@@ -154,6 +166,82 @@ def bulk_upload_domains(file_path, cookie):
     return response
 
 
+def bulk_upload_content(filename, content, cookie, column=None):
+    """Upload in-memory file content (any supported bulk format) as `filename`."""
+    headers = {"Cookie": f"session={cookie}"}
+    data = {"column": column} if column is not None else None
+    response = post("/bulk_domains", data=data, files={"file": (filename, content)}, headers=headers)
+    print_response(response)
+    return response
+
+
+def export_domains(cookie, path="/export_domains", **params):
+    """Stream the user's domains export (format/status/expires_within as query params)."""
+    headers = {"Cookie": f"session={cookie}"}
+    response = session.get(f"{BASE_URL}{path}", params=params, headers=headers)
+    print_response(response)
+    return response
+
+
+def conditional_get(path, cookie, etag=None, **params):
+    """GET `path`, sending If-None-Match when an ETag is given."""
+    headers = {"Cookie": f"session={cookie}"}
+    if etag:
+        headers["If-None-Match"] = etag
+    response = session.get(f"{BASE_URL}{path}", params=params, headers=headers)
+    print_response(response)
+    return response
+
+
+def domain_changes(cookie, since=None):
+    """Get the upserts/deletes made since a change-feed version."""
+    headers = {"Cookie": f"session={cookie}"}
+    params = {"since": since} if since else {}
+    response = session.get(f"{BASE_URL}/domains/changes", params=params, headers=headers)
+    print_response(response)
+    return response
+
+
+def domain_history(cookie, domain, **params):
+    """Get the probe history of one domain (days/resolution as query params)."""
+    headers = {"Cookie": f"session={cookie}"}
+    response = session.get(f"{BASE_URL}/domain_history", params={"domain": domain, **params}, headers=headers)
+    print_response(response)
+    return response
+
+
+def domains_uptime(cookie, path="/domains/uptime", **params):
+    """Get rolling uptime/latency aggregates (domains/limit as query params)."""
+    headers = {"Cookie": f"session={cookie}"}
+    response = session.get(f"{BASE_URL}{path}", params=params, headers=headers)
+    print_response(response)
+    return response
+
+
+def page_domains(cookie, **params):
+    """Get one page of the user's domains (limit/cursor/sort/order/status as query params)."""
+    headers = {"Cookie": f"session={cookie}"}
+    response = session.get(f"{BASE_URL}/my_domains", params=params, headers=headers)
+    print_response(response)
+    return response
+
+
+def search_domains(cookie, q, **params):
+    """Search the user's domains (mode/limit as query params)."""
+    headers = {"Cookie": f"session={cookie}"}
+    response = session.get(f"{BASE_URL}/search_domains", params={"q": q, **params}, headers=headers)
+    print_response(response)
+    return response
+
+
+def upcoming_expirations(cookie, path="/expirations/upcoming", **params):
+    """Get the soonest certificate expirations (limit/expires_within as query params)."""
+    headers = {"Cookie": f"session={cookie}"}
+    response = session.get(f"{BASE_URL}{path}", params=params, headers=headers)
+    print_response(response)
+    return response
+
+
 # -----------------------------------------------------
 # Domain Monitoring
 # -----------------------------------------------------
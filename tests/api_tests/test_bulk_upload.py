@@ -0,0 +1,93 @@
+import gzip
+import json
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(7)
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user for the bulk upload tests and remove it afterwards."""
+    username = f"test_bulk_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    login_resp = aux.check_login_user(username, password)
+    assert login_resp.status_code == 200
+    cookie = login_resp.cookies.get("session")
+    assert cookie is not None
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def test_1_bulk_upload_txt(session_cookie):
+    """Plain text upload keeps working: one domain per line."""
+    content = b"txt-one.example.com\ntxt-two.example.com\n\nnot a domain\n"
+    resp = aux.bulk_upload_content("domains.txt", content, session_cookie)
+    assert resp.status_code == 200
+    summary = resp.json()["summary"]
+    assert set(summary["added"]) == {"txt-one.example.com", "txt-two.example.com"}
+    assert len(summary["invalid"]) == 1
+
+
+def test_2_bulk_upload_csv_column_selector(session_cookie):
+    """CSV upload picks the requested column and skips the header row."""
+    content = b"owner,hostname\nops,csv-one.example.com\nops,csv-two.example.com\n"
+    resp = aux.bulk_upload_content("inventory.csv", content, session_cookie, column="hostname")
+    assert resp.status_code == 200
+    assert set(resp.json()["summary"]["added"]) == {"csv-one.example.com", "csv-two.example.com"}
+
+
+def test_3_bulk_upload_ndjson_gz(session_cookie):
+    """Gzip-compressed NDJSON upload accepts objects and bare strings."""
+    lines = [json.dumps({"domain": "nd-one.example.com"}), json.dumps("nd-two.example.com"),
+             json.dumps({"domain": "txt-one.example.com"})]
+    content = gzip.compress("\n".join(lines).encode())
+    resp = aux.bulk_upload_content("inventory.ndjson.gz", content, session_cookie)
+    assert resp.status_code == 200
+    summary = resp.json()["summary"]
+    assert set(summary["added"]) == {"nd-one.example.com", "nd-two.example.com"}
+    assert summary["duplicates"] == ["txt-one.example.com"]
+
+    listed = aux.list_domains(session_cookie).json()["data"]
+    assert {"nd-one.example.com", "csv-one.example.com"} <= {d["domain"] for d in listed}
+
+
+def test_4_bulk_upload_rejects_unsupported_and_corrupt(session_cookie):
+    """Unknown extensions and broken gzip payloads are rejected with 400."""
+    resp = aux.bulk_upload_content("domains.xlsx", b"x", session_cookie)
+    assert resp.status_code == 400
+    assert resp.json()["ok"] is False
+
+    resp = aux.bulk_upload_content("domains.txt.gz", b"definitely not gzip", session_cookie)
+    assert resp.status_code == 400
+    assert resp.json()["ok"] is False
+
+
+def test_5_bulk_upload_csv_without_header(session_cookie):
+    """A headerless CSV keeps its first row and reads the first column."""
+    content = b"headless-one.example.com,1\nheadless-two.example.com,2\n"
+    resp = aux.bulk_upload_content("domains.csv", content, session_cookie)
+    assert resp.status_code == 200
+    assert set(resp.json()["summary"]["added"]) == {"headless-one.example.com", "headless-two.example.com"}
+
+
+def test_6_bulk_upload_csv_numeric_column(session_cookie):
+    """A numeric column selector picks that column, first row included."""
+    content = b"ops,index-one.example.com\nops,index-two.example.com\n"
+    resp = aux.bulk_upload_content("domains.csv", content, session_cookie, column="1")
+    assert resp.status_code == 200
+    assert set(resp.json()["summary"]["added"]) == {"index-one.example.com", "index-two.example.com"}
+
+
+def test_7_bulk_upload_rejects_invalid_utf8(session_cookie):
+    """Bytes that are not UTF-8 reject the upload instead of being dropped silently."""
+    resp = aux.bulk_upload_content("domains.txt", b"utf8-one.example.com\nbad\xff.example.com\n", session_cookie)
+    assert resp.status_code == 400
+    assert resp.json()["ok"] is False
+    listed = aux.list_domains(session_cookie).json()["data"]
+    assert "utf8-one.example.com" not in {d["domain"] for d in listed}
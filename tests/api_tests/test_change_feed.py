@@ -0,0 +1,55 @@
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(13)
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user with one domain and remove it afterwards."""
+    username = f"test_changes_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    assert aux.add_domain("feed-one.example.com", cookie).status_code == 201
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def test_1_changes_unauthorized():
+    """The change feed requires a logged-in session."""
+    resp = aux.requests.get(f"{aux.BASE_URL}/domains/changes")
+    assert resp.status_code == 401
+
+
+def test_2_unknown_version_asks_for_reload(session_cookie):
+    """Without (or with a foreign) version the client is told to reload."""
+    for since in (None, "not-a-version"):
+        body = aux.domain_changes(session_cookie, since).json()
+        assert body["ok"] and body["reset"] is True
+        assert body["version"]
+
+
+def test_3_delta_after_changes(session_cookie):
+    """Only the domains changed after the version are returned."""
+    version = aux.domain_changes(session_cookie).json()["version"]
+    body = aux.domain_changes(session_cookie, version).json()
+    assert body == {"ok": True, "version": version, "reset": False, "upserts": [], "deletes": []}
+
+    assert aux.add_domain("feed-two.example.com", session_cookie).status_code == 201
+    aux.remove_domains(["feed-one.example.com"], session_cookie)
+
+    body = aux.domain_changes(session_cookie, version).json()
+    assert body["reset"] is False and body["version"] != version
+    assert [d["domain"] for d in body["upserts"]] == ["feed-two.example.com"]
+    assert body["upserts"][0]["status"] == "Pending"
+    assert body["deletes"] == ["feed-one.example.com"]
+
+    # Nothing changed since the newest version
+    latest = body["version"]
+    assert aux.domain_changes(session_cookie, latest).json()["upserts"] == []
@@ -0,0 +1,58 @@
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(12)
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user with one domain and remove it afterwards."""
+    username = f"test_etag_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    assert aux.add_domain("etag-one.example.com", cookie).status_code == 201
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def test_1_unchanged_list_is_not_modified(session_cookie):
+    """Repeating a request with the returned ETag answers 304 without a body."""
+    first = aux.conditional_get("/my_domains", session_cookie)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+
+    again = aux.conditional_get("/my_domains", session_cookie, etag)
+    assert again.status_code == 304
+    assert again.content == b""
+    assert again.headers["ETag"] == etag
+
+
+def test_2_changes_produce_a_new_etag(session_cookie):
+    """Adding or removing a domain invalidates the previous ETag."""
+    etag = aux.conditional_get("/my_domains", session_cookie).headers["ETag"]
+    assert aux.add_domain("etag-two.example.com", session_cookie).status_code == 201
+
+    resp = aux.conditional_get("/my_domains", session_cookie, etag)
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+    assert "etag-two.example.com" in [d["domain"] for d in resp.json()["data"]]
+
+    etag = resp.headers["ETag"]
+    aux.remove_domains(["etag-two.example.com"], session_cookie)
+    assert aux.conditional_get("/my_domains", session_cookie, etag).status_code == 200
+
+
+def test_3_paged_list_and_dashboard(session_cookie):
+    """Paged lists and the dashboard page are revalidated the same way."""
+    page = aux.conditional_get("/my_domains", session_cookie, limit=1)
+    assert aux.conditional_get("/my_domains", session_cookie, page.headers["ETag"], limit=1).status_code == 304
+
+    dashboard = aux.conditional_get("/dashboard", session_cookie)
+    assert dashboard.status_code == 200
+    assert aux.conditional_get("/dashboard", session_cookie, dashboard.headers["ETag"]).status_code == 304
@@ -0,0 +1,86 @@
+import os
+import sys
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
+from DomainModel import DomainRecord, DomainStatus
+from StatusHistory import StatusHistory
+
+pytestmark = pytest.mark.order(14)
+
+# Never resolves, so a scan records one quick "Down" probe
+DOMAIN = f"history-{uuid.uuid4().hex[:8]}.invalid"
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user, scan one unresolvable domain and remove the user afterwards."""
+    username = f"test_history_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    assert aux.add_domain(DOMAIN, cookie).status_code == 201
+    assert aux.check_scan_domains(session_cookie=cookie).status_code == 200
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def test_1_history_unauthorized():
+    """History requires a logged-in session."""
+    resp = aux.requests.get(f"{aux.BASE_URL}/domain_history", params={"domain": DOMAIN})
+    assert resp.status_code == 401
+
+
+def test_2_raw_history_has_the_probe(session_cookie):
+    """The scan's probe is stored as one raw sample."""
+    resp = aux.domain_history(session_cookie, DOMAIN, resolution="raw", days=1)
+    assert resp.status_code == 200
+    points = resp.json()["points"]
+    assert len(points) == 1
+    assert points[0]["status"] == "Down"
+    assert points[0]["latency_ms"] is None
+
+
+def test_3_hourly_history_rolls_up(session_cookie):
+    """Hourly buckets count probes and uptime."""
+    resp = aux.domain_history(session_cookie, DOMAIN)
+    assert resp.status_code == 200
+    points = resp.json()["points"]
+    assert len(points) == 1
+    assert points[0]["probes"] == 1
+    assert points[0]["up"] == 0
+    assert points[0]["uptime"] == 0
+
+
+def test_4_history_of_foreign_domain(session_cookie):
+    """Domains the user does not monitor are not found."""
+    resp = aux.domain_history(session_cookie, "not-mine.example.com")
+    assert resp.status_code == 404
+
+
+def test_5_history_invalid_parameters(session_cookie):
+    """Unknown resolutions and out-of-range windows are rejected."""
+    assert aux.domain_history(session_cookie, DOMAIN, resolution="minute").status_code == 400
+    assert aux.domain_history(session_cookie, DOMAIN, days="week").status_code == 400
+    assert aux.domain_history(session_cookie, DOMAIN, days=0).status_code == 400
+
+
+def test_6_append_after_torn_record(tmp_path):
+    """A record torn by a crash is cut off, so later appends stay aligned."""
+    history = StatusHistory(str(tmp_path))
+    at = 1_700_000_000
+    history.record([(DomainRecord("torn.example.com", DomainStatus.LIVE), 12)], at=at)
+    segment = history._path("raw", at // 86400)
+    with open(segment, "ab") as f:
+        f.write(b"\x01\x02\x03")                  # half a record, as left by a crash
+
+    history = StatusHistory(str(tmp_path))
+    history.record([(DomainRecord("torn.example.com", DomainStatus.DOWN), None)], at=at + 60)
+    points = history.samples("torn.example.com", at - 1, at + 61)
+    assert [(p["status"], p["latency_ms"]) for p in points] == [("Live", 12), ("Down", None)]
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(8)
+
+EXPORT_DOMAINS = ["export-one.example.com", "export-two.example.com"]
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user with a couple of domains and remove it afterwards."""
+    username = f"test_export_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    for domain in EXPORT_DOMAINS:
+        assert aux.add_domain(domain, cookie).status_code == 201
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def test_1_export_unauthorized():
+    """Export requires a logged-in session."""
+    resp = aux.requests.get(f"{aux.BASE_URL}/export_domains")
+    assert resp.status_code == 401
+
+
+def test_2_export_ndjson(session_cookie):
+    """Default export is NDJSON with one object per domain."""
+    resp = aux.export_domains(session_cookie)
+    assert resp.status_code == 200
+    assert resp.headers["Content-Type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in resp.text.splitlines()]
+    assert sorted(r["domain"] for r in rows) == EXPORT_DOMAINS
+    assert all(r["status"] == "Pending" for r in rows)
+
+
+def test_3_export_csv_with_filters(session_cookie):
+    """CSV export honours the status and expiry-window filters."""
+    resp = aux.export_domains(session_cookie, format="csv", status="pending")
+    assert resp.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(resp.text)))
+    assert sorted(r["domain"] for r in rows) == EXPORT_DOMAINS
+
+    # Pending domains have no certificate yet, so nothing expires within the window
+    resp = aux.export_domains(session_cookie, format="csv", expires_within=30)
+    assert resp.status_code == 200
+    assert list(csv.DictReader(io.StringIO(resp.text))) == []
+
+
+def test_4_export_invalid_parameters(session_cookie):
+    """Unknown formats, statuses and malformed windows are rejected."""
+    assert aux.export_domains(session_cookie, format="xml").status_code == 400
+    assert aux.export_domains(session_cookie, status="sleeping").status_code == 400
+    assert aux.export_domains(session_cookie, expires_within="soon").status_code == 400
+
+
+def test_5_export_all_requires_admin(session_cookie):
+    """The all-users export is reserved for ADMIN_USERS."""
+    resp = aux.export_domains(session_cookie, path="/export_domains/all")
+    assert resp.status_code == 403
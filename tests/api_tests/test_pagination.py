@@ -0,0 +1,90 @@
+import base64
+import json
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(10)
+
+PAGED_DOMAINS = [f"page{i:02d}.example.com" for i in range(25)]
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user with 25 domains and remove it afterwards."""
+    username = f"test_paging_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    resp = aux.bulk_upload_content("domains.txt", "\n".join(PAGED_DOMAINS), cookie)
+    assert resp.json()["ok"]
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def _collect(cookie, **params):
+    """Follow next_cursor until the last page; return all rows and the number of pages."""
+    rows, pages, cursor = [], 0, None
+    while True:
+        query = dict(params, cursor=cursor) if cursor else params
+        body = aux.page_domains(cookie, **query).json()
+        assert body["ok"] and body["total"] == len(PAGED_DOMAINS)
+        rows += body["data"]
+        pages += 1
+        cursor = body["next_cursor"]
+        if not cursor:
+            return rows, pages
+
+
+def test_1_full_list_without_paging_parameters(session_cookie):
+    """Without paging parameters /my_domains still returns the whole list."""
+    body = aux.page_domains(session_cookie).json()
+    assert [d["domain"] for d in body["data"]] == PAGED_DOMAINS
+    assert "next_cursor" not in body
+
+
+def test_2_cursor_pagination(session_cookie):
+    """Pages of 10 cover every domain exactly once, in domain order."""
+    rows, pages = _collect(session_cookie, limit=10)
+    assert pages == 3
+    assert [d["domain"] for d in rows] == PAGED_DOMAINS
+
+
+def test_3_descending_and_filtered(session_cookie):
+    """Descending order and status filters are applied on the server."""
+    rows, _ = _collect(session_cookie, limit=7, order="desc")
+    assert [d["domain"] for d in rows] == PAGED_DOMAINS[::-1]
+
+    rows, _ = _collect(session_cookie, limit=7, status="pending", sort="status")
+    assert len(rows) == len(PAGED_DOMAINS)
+    body = aux.page_domains(session_cookie, limit=7, status="live").json()
+    assert body["data"] == [] and body["next_cursor"] is None
+
+
+def test_4_invalid_paging_parameters(session_cookie):
+    """Unknown sort keys, bad limits and foreign cursors are rejected."""
+    assert aux.page_domains(session_cookie, sort="issuer").status_code == 400
+    assert aux.page_domains(session_cookie, limit=0).status_code == 400
+    assert aux.page_domains(session_cookie, cursor="not-a-cursor").status_code == 400
+
+    cursor = aux.page_domains(session_cookie, limit=5).json()["next_cursor"]
+    assert aux.page_domains(session_cookie, cursor=cursor, sort="expiry").status_code == 400
+
+    # Well-formed cursors whose key does not fit the sort order
+    for sort, after in (("domain", [1]), ("domain", [{"x": 1}]), ("domain", []), ("expiry", ["a", "b"]),
+                        ("status", [1])):
+        raw = json.dumps([sort, "asc", after]).encode()
+        crafted = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+        assert aux.page_domains(session_cookie, cursor=crafted, sort=sort).status_code == 400
+
+
+def test_5_delete_all(session_cookie):
+    """'Delete All' removes every domain, not just the loaded page."""
+    resp = aux.post("/remove_domains", json={"all": True}, headers={"Cookie": f"session={session_cookie}"})
+    assert resp.status_code == 200
+    assert sorted(resp.json()["summary"]["removed"]) == PAGED_DOMAINS
+    assert aux.page_domains(session_cookie).json()["data"] == []
@@ -0,0 +1,70 @@
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(16)
+
+# Never resolves, so every profile stops at its DNS stage
+DOMAIN = f"profile-{uuid.uuid4().hex[:8]}.invalid"
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user with one unresolvable domain and remove the user afterwards."""
+    username = f"test_profile_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    assert aux.add_domain(DOMAIN, cookie).status_code == 201
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def _stored(cookie):
+    return next(d for d in aux.list_domains(cookie).json()["data"] if d["domain"] == DOMAIN)
+
+
+def test_1_profile_unauthorized():
+    """Choosing a profile requires a logged-in session."""
+    resp = aux.requests.post(f"{aux.BASE_URL}/domains/profile", json={"domain": DOMAIN, "profile": "dns"})
+    assert resp.status_code == 401
+
+
+def test_2_set_profile(session_cookie):
+    """The chosen profile is stored with the domain."""
+    resp = aux.set_probe_profile(DOMAIN, "dns", session_cookie)
+    assert resp.status_code == 200
+    assert resp.json()["domain"]["probe_profile"] == "dns"
+    assert _stored(session_cookie)["probe_profile"] == "dns"
+
+
+def test_3_scan_keeps_profile(session_cookie):
+    """A scan probes with the profile and keeps it on the record."""
+    assert aux.check_scan_domains(session_cookie=session_cookie).status_code == 200
+    stored = _stored(session_cookie)
+    assert stored["status"] == "Down"
+    assert stored["probe_profile"] == "dns"
+
+
+def test_4_port_profile_and_reset(session_cookie):
+    """tcp takes a port; "default" goes back to the deployment's profile."""
+    assert aux.set_probe_profile(DOMAIN, "tcp:25", session_cookie).status_code == 200
+    assert _stored(session_cookie)["probe_profile"] == "tcp:25"
+    assert aux.set_probe_profile(DOMAIN, "default", session_cookie).status_code == 200
+    assert _stored(session_cookie)["probe_profile"] == "default"
+
+
+def test_5_invalid_profile(session_cookie):
+    """Unknown profiles and bad ports are rejected."""
+    assert aux.set_probe_profile(DOMAIN, "ping", session_cookie).status_code == 400
+    assert aux.set_probe_profile(DOMAIN, "tcp:99999", session_cookie).status_code == 400
+    assert aux.set_probe_profile(DOMAIN, "dns:53", session_cookie).status_code == 400
+
+
+def test_6_unknown_domain(session_cookie):
+    """Domains the user does not monitor are not found."""
+    assert aux.set_probe_profile("not-mine.example.com", "dns", session_cookie).status_code == 404
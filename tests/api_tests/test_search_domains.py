@@ -0,0 +1,68 @@
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(11)
+
+SEARCH_DOMAINS = ["example.co.il", "api.example.co.il", "www.example.co.il",
+                  "mail.other.co.il", "example.com"]
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user with a few related domains and remove it afterwards."""
+    username = f"test_search_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    resp = aux.bulk_upload_content("domains.txt", "\n".join(SEARCH_DOMAINS), cookie)
+    assert resp.json()["ok"]
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def test_1_search_unauthorized():
+    """Search requires a logged-in session."""
+    resp = aux.requests.get(f"{aux.BASE_URL}/search_domains", params={"q": "example.com"})
+    assert resp.status_code == 401
+
+
+def test_2_suffix_and_wildcard(session_cookie):
+    """A suffix matches the domain and its subdomains; '*.' only the subdomains."""
+    body = aux.search_domains(session_cookie, "example.co.il").json()
+    assert sorted(body["results"]) == ["api.example.co.il", "example.co.il", "www.example.co.il"]
+    assert body["total"] == 3
+
+    body = aux.search_domains(session_cookie, "*.example.co.il").json()
+    assert sorted(body["results"]) == ["api.example.co.il", "www.example.co.il"]
+
+    body = aux.search_domains(session_cookie, "co.il", limit=2).json()
+    assert len(body["results"]) == 2 and body["total"] == 4
+
+
+def test_3_prefix_and_substring(session_cookie):
+    """Prefix and substring modes match the domain name."""
+    body = aux.search_domains(session_cookie, "example", mode="prefix").json()
+    assert body["results"] == ["example.co.il", "example.com"]
+
+    body = aux.search_domains(session_cookie, "ample.co", mode="substring").json()
+    assert len(body["results"]) == 4
+
+
+def test_4_index_follows_changes(session_cookie):
+    """Added and removed domains show up in the next search."""
+    assert aux.add_domain("new.example.co.il", session_cookie).status_code == 201
+    assert "new.example.co.il" in aux.search_domains(session_cookie, "*.example.co.il").json()["results"]
+
+    aux.remove_domains(["api.example.co.il"], session_cookie)
+    assert "api.example.co.il" not in aux.search_domains(session_cookie, "example.co.il").json()["results"]
+
+
+def test_5_invalid_search(session_cookie):
+    """Empty queries and unknown modes are rejected."""
+    assert aux.search_domains(session_cookie, "").status_code == 400
+    assert aux.search_domains(session_cookie, "example", mode="regex").status_code == 400
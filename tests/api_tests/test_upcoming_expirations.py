@@ -0,0 +1,46 @@
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(9)
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user with one (not yet scanned) domain and remove it afterwards."""
+    username = f"test_expiry_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    assert aux.add_domain("expiry-one.example.com", cookie).status_code == 201
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def test_1_upcoming_unauthorized():
+    """Upcoming expirations require a logged-in session."""
+    resp = aux.requests.get(f"{aux.BASE_URL}/expirations/upcoming")
+    assert resp.status_code == 401
+
+
+def test_2_pending_domains_have_no_expiry(session_cookie):
+    """Domains that were never scanned have no certificate to expire."""
+    resp = aux.upcoming_expirations(session_cookie, limit=10)
+    assert resp.status_code == 200
+    assert resp.json() == {"ok": True, "expirations": []}
+
+
+def test_3_upcoming_invalid_parameters(session_cookie):
+    """Malformed windows and limits are rejected."""
+    assert aux.upcoming_expirations(session_cookie, expires_within="soon").status_code == 400
+    assert aux.upcoming_expirations(session_cookie, limit="many").status_code == 400
+
+
+def test_4_upcoming_all_requires_admin(session_cookie):
+    """The all-users view is reserved for ADMIN_USERS."""
+    resp = aux.upcoming_expirations(session_cookie, path="/expirations/upcoming/all")
+    assert resp.status_code == 403
@@ -0,0 +1,56 @@
+import uuid
+import pytest
+from tests.api_tests import Aux_Library as aux
+
+pytestmark = pytest.mark.order(15)
+
+# Never resolves, so a scan counts one "Down" probe
+DOMAIN = f"uptime-{uuid.uuid4().hex[:8]}.invalid"
+UNSCANNED = f"uptime-later-{uuid.uuid4().hex[:8]}.invalid"
+
+
+@pytest.fixture(scope="module")
+def session_cookie():
+    """Register a throwaway user, scan one unresolvable domain, then add another and clean up afterwards."""
+    username = f"test_uptime_user_{uuid.uuid4().hex[:8]}"
+    password = "StrongPass12"
+
+    assert aux.check_register_user(username, password, password).ok
+    cookie = aux.check_login_user(username, password).cookies.get("session")
+    assert cookie is not None
+    assert aux.add_domain(DOMAIN, cookie).status_code == 201
+    assert aux.check_scan_domains(session_cookie=cookie).status_code == 200
+    assert aux.add_domain(UNSCANNED, cookie).status_code == 201
+
+    yield cookie
+
+    aux.remove_user_from_running_app(username=username)
+
+
+def test_1_uptime_unauthorized():
+    """Uptime requires a logged-in session."""
+    resp = aux.requests.get(f"{aux.BASE_URL}/domains/uptime")
+    assert resp.status_code == 401
+
+
+def test_2_uptime_counts_the_scan(session_cookie):
+    """Every window counts the failed probe; there is no response time for it."""
+    resp = aux.domains_uptime(session_cookie)
+    assert resp.status_code == 200
+    uptime = resp.json()["uptime"]
+    assert set(uptime) == {DOMAIN}
+    for window in ("24h", "7d", "30d"):
+        assert uptime[DOMAIN][window] == {"probes": 1, "uptime": 0.0, "p50_ms": None, "p95_ms": None}
+
+
+def test_3_uptime_of_selected_domains(session_cookie):
+    """Only the requested domains of the user are returned."""
+    resp = aux.domains_uptime(session_cookie, domains=f"{UNSCANNED},not-mine.example.com")
+    assert resp.status_code == 200
+    assert resp.json()["uptime"] == {}
+
+
+def test_4_uptime_all_requires_admin(session_cookie):
+    """The all-hosts view is reserved for ADMIN_USERS."""
+    resp = aux.domains_uptime(session_cookie, path="/domains/uptime/all")
+    assert resp.status_code == 403
@@ -0,0 +1,84 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import ScanCoordinator
+
+
+# One coordinator and several local worker processes on a Unix socket; the
+# "domains" are loopback addresses probed with a TCP connect to a local
+# server. One worker is killed mid-scan: its lease expires and is retried.
+DOMAINS = int(os.environ.get("BENCH_DOMAINS", "5000"))
+WORKERS = 3
+LEASE_SECONDS = 3
+
+
+def serve(port, ready):
+    async def handle(reader, writer):
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "0.0.0.0", port, backlog=4096)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def start_worker(address):
+    return subprocess.Popen([sys.executable, "ScanCoordinator.py", "--connect", address, "--batch", "50"])
+
+
+if __name__ == "__main__":
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(port, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        address = f"unix:{os.path.join(tmp, 'coordinator.sock')}"
+        coordinator = ScanCoordinator.ScanCoordinator(address, batch=50, lease_seconds=LEASE_SECONDS).start()
+        workers = [start_worker(address) for _ in range(WORKERS)]
+        while not coordinator.has_workers():
+            time.sleep(0.1)
+
+        items = [(f"127.0.{i // 250 % 250}.{i % 250 + 1}", f"tcp:{port}") for i in range(DOMAINS)]
+        start = time.time()
+        received, killed = set(), False
+        scan = coordinator.scan(items, tick=1)
+        while True:
+            try:
+                batch = next(scan)
+            except StopIteration as done:
+                failed = done.value
+                break
+            received.update(record.domain for record, _ in batch)
+            if not killed and received:
+                workers[0].kill()
+                killed = True
+        elapsed = time.time() - start
+
+        print(f"{len(received)}/{DOMAINS} domains probed by {WORKERS} workers in {elapsed:.2f} Seconds "
+              f"(one killed mid-scan), {len(failed)} handed back to probe locally.")
+        print(coordinator.stats())
+        assert len(received) + len(failed) == DOMAINS
+
+        for worker in workers:
+            worker.kill()
+            worker.wait()
+        coordinator.close()
+    server.terminate()
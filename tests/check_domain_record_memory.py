@@ -0,0 +1,71 @@
+import os
+import sys
+import tracemalloc
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+from DomainModel import DomainRecord, DomainStatus
+
+
+# Realistic mix: a few issuers and statuses shared by many domains
+ROWS = 100_000
+ISSUERS = ["Google Trust Services", "DigiCert Inc", "Let's Encrypt", "Sectigo Limited", "N/A"]
+STATUSES = ["Live", "Live", "Live", "Down", "Pending"]
+
+
+def make_dicts():
+    # json.load creates a fresh string for every value, so build them the same way
+    return [{
+        "domain": f"host{i}.example.com",
+        "status": "".join(STATUSES[i % len(STATUSES)]),
+        "ssl_expiration": f"20{26 + i % 3}-0{1 + i % 9}-1{i % 10}",
+        "ssl_issuer": "".join(ISSUERS[i % len(ISSUERS)]),
+    } for i in range(ROWS)]
+
+
+def measure(build):
+    tracemalloc.start()
+    data = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return data, current
+
+
+dicts, dict_bytes = measure(make_dicts)
+del dicts
+# Only the records survive; the intermediate dicts are freed before measuring
+records, record_bytes = measure(lambda: [DomainRecord.from_dict(d) for d in make_dicts()])
+
+print(f"dict form:         {dict_bytes / ROWS:7.1f} bytes/domain ({dict_bytes / 2**20:.1f} MiB for {ROWS} domains)")
+print(f"DomainRecord form: {record_bytes / ROWS:7.1f} bytes/domain ({record_bytes / 2**20:.1f} MiB for {ROWS} domains)")
+print(f"saved: {100 * (1 - record_bytes / dict_bytes):.0f}%")
+
+
+# Users monitoring the same hosts: after a scan every list references the one
+# probe result of each host (DomainRecord.merged) instead of holding a copy
+USERS, PER_USER, UNIQUE = 1_000, 100, 10_000
+probe_results = {f"host{i}.example.com": DomainRecord(f"host{i}.example.com", DomainStatus.LIVE,
+                                                      1_800_000_000 + i, ISSUERS[i % len(ISSUERS)])
+                 for i in range(UNIQUE)}
+subscriptions = [[f"host{(u * 37 + j) % UNIQUE}.example.com" for j in range(PER_USER)] for u in range(USERS)]
+
+
+def copied_lists():
+    return [[DomainRecord(h, probe_results[h].status, probe_results[h].expires_at, probe_results[h].issuer)
+             for h in hosts] for hosts in subscriptions]
+
+
+def shared_lists():
+    return [[DomainRecord(h).merged(probe_results[h]) for h in hosts] for hosts in subscriptions]
+
+
+_, copied_bytes = measure(copied_lists)
+_, shared_bytes = measure(shared_lists)
+rows = USERS * PER_USER
+print(f"{USERS} users x {PER_USER} of {UNIQUE} hosts, copy per user:  {copied_bytes / rows:7.1f} bytes/subscription "
+      f"({copied_bytes / 2**20:.1f} MiB)")
+print(f"{USERS} users x {PER_USER} of {UNIQUE} hosts, shared records: {shared_bytes / rows:7.1f} bytes/subscription "
+      f"({shared_bytes / 2**20:.1f} MiB)")
@@ -0,0 +1,48 @@
+import os
+import sys
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+from DomainSearch import DomainTrie
+
+
+# One user with 100,000 domains spread over a few hundred registrable domains
+DOMAINS = 100_000
+TLDS = ["com", "co.il", "org", "net", "io"]
+
+
+def make_domains():
+    return [f"svc{i}.{['api', 'www', 'cdn', 'mail'][i % 4]}.brand{i % 400}.{TLDS[i % len(TLDS)]}"
+            for i in range(DOMAINS)]
+
+
+def timed(label, fn, repeat=20):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    if isinstance(result, tuple):
+        result, total = result
+        print(f"{label:45s} {best * 1000:7.3f} ms  -> {len(result)} results of {total}")
+    else:
+        print(f"{label:45s} {best * 1000:7.3f} ms  -> {len(result)} results")
+
+
+domains = make_domains()
+started = time.perf_counter()
+trie = DomainTrie(domains)
+print(f"built trie for {len(trie)} domains in {time.perf_counter() - started:.2f}s")
+
+timed("suffix brand7.org (limit 100)", lambda: trie.suffix("brand7.org", 100))
+timed("wildcard *.api.brand8.net (limit 100)", lambda: trie.suffix("api.brand8.net", 100, subdomains_only=True))
+timed("broad suffix com (limit 100)", lambda: trie.suffix("com", 100))
+timed("count under co.il (limit 0)", lambda: trie.suffix("co.il", 0))
+timed("prefix svc12 (limit 100)", lambda: trie.prefix("svc12", 100))
+trie.substring("warm-up", 1)
+timed("substring 99.mail (limit 100)", lambda: trie.substring("99.mail", 100))
+timed("full list scan for comparison", lambda: [d for d in domains if d.endswith(".brand7.org")][:100])
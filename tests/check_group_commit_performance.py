@@ -0,0 +1,47 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+from GroupCommit import DURABILITY_LEVELS, GroupCommitWriter
+
+
+# Simulated bursty scan: several threads rewriting a handful of user files
+THREADS = 16
+WRITES_PER_THREAD = 50
+USERS = 4
+RECORDS_PER_USER = 500
+
+payload = json.dumps(
+    [{"domain": f"host{i}.example.com", "status": "Live",
+      "ssl_expiration": "2030-01-01", "ssl_issuer": "Example CA"} for i in range(RECORDS_PER_USER)],
+    indent=2,
+).encode("utf-8")
+
+for durability in DURABILITY_LEVELS:
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = GroupCommitWriter(durability=durability, window=0.005)
+        paths = [os.path.join(tmp, f"user{u}_domains.json") for u in range(USERS)]
+
+        def burst(thread_id):
+            for i in range(WRITES_PER_THREAD):
+                writer.write(paths[(thread_id + i) % USERS], payload)
+
+        start = time.time()
+        threads = [threading.Thread(target=burst, args=(t,)) for t in range(THREADS)]
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        for path in paths:
+            writer.wait(path)
+        end = time.time()
+
+        stats = writer.stats()
+        print(f"{durability:>11}: {stats['requested']} writes requested, {stats['written']} written, "
+              f"{stats['fsyncs']} fsyncs, {stats['saved']} saved in {end-start:.2f} Seconds.")
@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+from HashRing import HashRing
+
+
+# 100,000 hosts over 2..8 app instances: how evenly they are spread, and how
+# many change owner when an instance joins or leaves
+HOSTS = [f"host{i}.example.com" for i in range(100_000)]
+
+
+def owners(ring):
+    return [ring.owner(h) for h in HOSTS]
+
+
+nodes = [f"http://app{i}:8080" for i in range(2)]
+ring = HashRing(nodes)
+current = owners(ring)
+while len(nodes) < 8:
+    nodes.append(f"http://app{len(nodes)}:8080")
+    start = time.time()
+    grown = HashRing(nodes)
+    after = owners(grown)
+    elapsed = time.time() - start
+    moved = sum(a != b for a, b in zip(current, after))
+    counts = [after.count(n) for n in nodes]
+    print(f"{len(nodes)} instances: {moved / len(HOSTS):6.1%} of hosts moved (ideal {1 / len(nodes):6.1%}), "
+          f"slice sizes {min(counts)}..{max(counts)} (ideal {len(HOSTS) // len(nodes)}), "
+          f"ring built and {len(HOSTS)} lookups in {elapsed:.2f} Seconds")
+    current = after
+
+# One instance leaves: only its hosts move
+removed = nodes.pop(3)
+after = owners(HashRing(nodes))
+moved = sum(a != b for a, b in zip(current, after))
+print(f"{removed} left: {moved} hosts moved, all of them its own: "
+      f"{all(b == removed for a, b in zip(after, current) if a != b)}")
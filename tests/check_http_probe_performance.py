@@ -0,0 +1,52 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import HttpProbe
+
+
+# Local keep-alive server; every request costs the same small server-side delay
+PROBES = 500
+SERVER_DELAY = 0.002
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        time.sleep(SERVER_DELAY)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+host = f"127.0.0.1:{server.server_address[1]}"
+
+for label, per_host in (("new connection per probe", 0), ("keep-alive pool", 2)):
+    pool = HttpProbe.ConnectionPool(per_host=per_host)
+    ttfb = []
+    start = time.time()
+    for _ in range(PROBES):
+        result = pool.probe(host, "http")
+        assert result.error is None, result.error
+        ttfb.append(result.ttfb_ms)
+    end = time.time()
+    ttfb.sort()
+    stats = pool.stats()
+    print(f"{label:>25}: {PROBES} probes in {end-start:.2f} Seconds, median TTFB {ttfb[len(ttfb) // 2]:.1f} ms, "
+          f"{stats['opened']} connections opened, {stats['reused']} reused.")
+    pool.close()
+
+server.shutdown()
@@ -0,0 +1,37 @@
+import os
+import sys
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+from DomainModel import DomainRecord, DomainStatus
+from MonitoringSystem import MonitoringSystem as MS
+from DomainManagementEngine import DomainManagementEngine as DME
+
+
+# Two instances forward the same hosts, which nobody on this (owner) instance
+# monitors: only the first forward should reach the network
+probed = []
+
+
+def fake_probe(record):
+    probed.append(record.domain)
+    time.sleep(0.01)
+    return DomainRecord(record.domain, DomainStatus.LIVE, int(time.time()) + 30 * 86400, "Test CA"), 10.0
+
+
+MS._probe = staticmethod(fake_probe)
+dme = DME()
+hosts = [f"peer-host{i}.example.com" for i in range(50)]
+
+for node in ("http://app1:8080", "http://app2:8080"):
+    start = time.time()
+    results = MS.probe_for_peer([(h, None) for h in hosts], dme)
+    shared = sum(1 for _, _, reused in results if reused)
+    print(f"forward from {node}: {len(results)} results, {shared} reused, {len(probed)} probes so far, "
+          f"{time.time() - start:.2f} Seconds")
+
+print(f"each host probed once: {sorted(probed) == sorted(hosts)}")
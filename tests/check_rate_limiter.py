@@ -0,0 +1,71 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import HttpProbe
+import RateLimiter
+from ProbePipeline import ProbeProfiles
+
+
+# A burst of 2,000 TCP probes from 100 threads against a local server:
+# 1,800 "domains" on 4 loopback /24s plus 200 on one shared IP (a CDN or
+# shared host), with and without the limiter
+DOMAINS = 2000
+SHARED_IP = 200
+THREADS = 100
+
+
+def serve(port, ready):
+    async def handle(reader, writer):
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "0.0.0.0", port, backlog=4096)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(port, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    domains = [f"127.0.{i % 4}.{i // 4 % 250 + 1}" for i in range(DOMAINS - SHARED_IP)] + ["127.0.9.9"] * SHARED_IP
+    for label, limiter in (
+        ("no limits", None),
+        ("500/s, 20/s per IP, 100/s per /24, 64 sockets",
+         RateLimiter.ConnectionLimiter(rate=500, per_ip_rate=20, per_net_rate=100, max_sockets=64, max_wait=30)),
+    ):
+        profiles = ProbeProfiles(HttpProbe.ConnectionPool(limiter=limiter), default=f"tcp:{port}")
+        start = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=THREADS) as executor:
+            futures = [executor.submit(profiles.probe, d) for d in domains]
+            outcomes = []
+            for future in futures:
+                try:
+                    outcomes.append(future.result()[0].status.value)
+                except RateLimiter.RateLimited:
+                    outcomes.append("skipped")
+        elapsed = time.time() - start
+        print(f"{label}: {DOMAINS} probes in {elapsed:.2f} Seconds ({DOMAINS / elapsed:,.0f}/s), "
+              f"Live {outcomes.count('Live')}, Down {outcomes.count('Down')}, skipped {outcomes.count('skipped')}")
+        if limiter is not None:
+            print(f"    {limiter.stats()}")
+
+    server.terminate()
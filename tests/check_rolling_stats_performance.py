@@ -0,0 +1,42 @@
+import os
+import sys
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+from DomainModel import DomainRecord, DomainStatus
+from RollingStats import RollingStats
+
+
+# 1,000 hosts probed every 30 minutes for 30 days (1.4M probes)
+HOSTS = 1_000
+INTERVAL = 1800
+DAYS = 30
+NOW = int(time.time())
+
+records = [DomainRecord(f"host{i}.example.com", DomainStatus.LIVE if i % 50 else DomainStatus.DOWN)
+           for i in range(HOSTS)]
+stats = RollingStats()
+
+started = time.perf_counter()
+probes = 0
+for at in range(NOW - DAYS * 86400, NOW, INTERVAL):
+    for i, record in enumerate(records):
+        stats.record(record, 30 + (at // INTERVAL * 37 + i * 11) % 400 if record.status == DomainStatus.LIVE else None, at=at)
+        probes += 1
+elapsed = time.perf_counter() - started
+print(f"recorded {probes} probes in {elapsed:.1f}s ({elapsed / probes * 1e6:.2f} us/probe)")
+
+hosts = [r.domain for r in records]
+for label, query in (
+    ("one domain", lambda: stats.summaries(hosts[:1], now=NOW)),
+    ("all 1,000 domains (one user)", lambda: stats.summaries(hosts, now=NOW)),
+    ("overview of all hosts", lambda: stats.overview(now=NOW)),
+):
+    started = time.perf_counter()
+    result = query()
+    print(f"{label:30s} {(time.perf_counter() - started) * 1000:8.2f} ms")
+print(stats.summaries(hosts[1:2], now=NOW))
@@ -0,0 +1,52 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+from DomainModel import NOT_AVAILABLE, DomainRecord, DomainStatus
+from DomainStorage import JsonStorage, SqliteStorage
+
+
+# Periodic scans of one user's list where ~2% of the domains change per scan
+DOMAINS = 2000
+SCANS = 20
+CHANGE_RATE = 0.02
+EXPIRY = 1893456000     # 2030-01-01
+
+random.seed(7)
+stored = [DomainRecord(f"host{i}.example.com", DomainStatus.LIVE, EXPIRY, "Example CA",
+                       extra={"owner_note": f"note {i}"}) for i in range(DOMAINS)]
+
+
+def scans():
+    """Yield the probe results of each scan (bare records, no extra fields)."""
+    current = {r.domain: r.status for r in stored}
+    for _ in range(SCANS):
+        for domain in random.sample(sorted(current), int(DOMAINS * CHANGE_RATE)):
+            current[domain] = DomainStatus.DOWN if current[domain] == DomainStatus.LIVE else DomainStatus.LIVE
+        yield [DomainRecord(d, s, EXPIRY if s == DomainStatus.LIVE else 0,
+                            "Example CA" if s == DomainStatus.LIVE else NOT_AVAILABLE)
+               for d, s in current.items()]
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    for name, storage in (("json", JsonStorage(os.path.join(tmp, "json"))),
+                          ("sqlite", SqliteStorage(os.path.join(tmp, "domains.db")))):
+        storage.save("user", stored)
+        scanned = written = 0
+        start = time.time()
+        for results in scans():
+            scanned += len(results)
+            written += len(storage.update("user", results))
+        end = time.time()
+
+        kept = all(r.extra for r in storage.load("user"))
+        print(f"{name:>6}: {scanned} results scanned, {written} records written "
+              f"({100 - 100 * written / scanned:.1f}% fewer), extra fields kept: {kept}, "
+              f"{end-start:.2f} Seconds.")
@@ -0,0 +1,64 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+import sys
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import ShardedScanner
+
+
+# 20,000 "domains" spread over loopback addresses (127.0.x.y), probed with a
+# TCP connect to a local server that accepts and closes every connection
+DOMAINS = int(os.environ.get("BENCH_DOMAINS", "20000"))
+THREADS = 50
+
+# Throughput, not the connection limits, is measured: the workers inherit these
+for limit in ("PROBE_RATE", "PROBE_RATE_PER_IP", "PROBE_RATE_PER_NET", "PROBE_SOCKET_BUDGET"):
+    os.environ[limit] = "0"
+
+
+def serve(port, ready):
+    async def handle(reader, writer):
+        writer.close()
+
+    async def main():
+        server = await asyncio.start_server(handle, "0.0.0.0", port, backlog=4096)
+        ready.set()
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(port, ready), daemon=True)
+    server.start()
+    ready.wait()
+
+    items = [(f"127.0.{i // 250 % 250}.{i % 250 + 1}", f"tcp:{port}") for i in range(DOMAINS)]
+    print(f"{DOMAINS} domains, {THREADS} probe threads per process, {os.cpu_count()} CPUs")
+
+    baseline = None
+    processes = 1
+    while processes <= max(2, os.cpu_count() or 1):
+        scanner = ShardedScanner.ShardedScanner(processes=processes, threads=THREADS, min_domains=0)
+        start = time.time()
+        results = sum(len(batch) for batch in scanner.scan(items, tick=1))
+        elapsed = time.time() - start
+        rate = results / elapsed
+        baseline = baseline or rate
+        print(f"{processes:3d} processes: {results} results in {elapsed:.2f} Seconds, "
+              f"{rate:,.0f} domains/s ({rate / baseline:.2f}x)")
+        processes *= 2
+
+    server.terminate()
@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import StatusHistory
+from DomainModel import DomainRecord, DomainStatus
+
+
+# 2,000 hosts probed every 5 minutes for 10 days (raw kept 7 days, older days rolled up hourly)
+HOSTS = 2000
+INTERVAL = 300
+DAYS = 10
+NOW = int(time.time()) // 86400 * 86400
+
+records = [DomainRecord(f"host{i}.example.com", DomainStatus.LIVE if i % 20 else DomainStatus.DOWN)
+           for i in range(HOSTS)]
+
+with tempfile.TemporaryDirectory() as tmp:
+    history = StatusHistory.StatusHistory(tmp, raw_days=7)
+
+    started = time.perf_counter()
+    for at in range(NOW - DAYS * 86400, NOW, INTERVAL):
+        history.record(((r, 40 + (at // INTERVAL + i) % 80) for i, r in enumerate(records)), at=at)
+    written = time.perf_counter() - started
+
+    stats = history.stats()
+    probes = stats["probes"]
+    print(f"recorded {probes} probes in {written:.1f}s (vectorized reads: {StatusHistory.np is not None})")
+    history.compact(NOW)
+    stats = history.stats()
+    print(f"on disk: {stats['bytes'] / 1e6:.1f} MB, {stats['bytes'] / probes:.2f} bytes/probe, "
+          f"segments {stats['segments']}")
+
+    host = "host1234.example.com"
+    for label, query in (
+        ("raw samples, last 24h", lambda: history.samples(host, NOW - 86400, NOW)),
+        ("hourly buckets, last 7 days", lambda: history.buckets(host, NOW - 7 * 86400, NOW, "hour")),
+        ("daily buckets, last 10 days", lambda: history.buckets(host, NOW - DAYS * 86400, NOW, "day")),
+    ):
+        started = time.perf_counter()
+        points = query()
+        print(f"{label:30s} {(time.perf_counter() - started) * 1000:8.1f} ms  -> {len(points)} points")
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+# The correct path for the modules
+module_path = os.path.abspath(".")
+if module_path not in sys.path:
+    sys.path.append(module_path)
+
+import StatusTable
+from DomainModel import DomainRecord, DomainStatus
+
+
+# One million rows spread over 10,000 users, with expiries over the next year
+ROWS = 1_000_000
+USERS = 10_000
+NOW = int(time.time())
+STATUSES = [DomainStatus.LIVE, DomainStatus.LIVE, DomainStatus.LIVE, DomainStatus.DOWN, DomainStatus.PENDING]
+
+
+def build():
+    table = StatusTable.StatusTable()
+    per_user = ROWS // USERS
+    for u in range(USERS):
+        table.upsert(f"user{u}", [
+            DomainRecord(f"host{(u * per_user + i) % 200_000}.example.com", STATUSES[i % len(STATUSES)],
+                         NOW + ((u * 7919 + i * 104729) % 365) * 86400)
+            for i in range(per_user)
+        ], checked_at=NOW)
+    return table
+
+
+def timed(label, fn, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:40s} {best * 1000:8.1f} ms  -> {result}")
+
+
+started = time.perf_counter()
+table = build()
+print(f"built {len(table)} rows in {time.perf_counter() - started:.1f}s "
+      f"(vectorized: {StatusTable.np is not None})")
+
+timed("count Down", lambda: table.count([DomainStatus.DOWN]))
+timed("count expiring within 14 days", lambda: table.count(expires_before=NOW + 14 * 86400))
+timed("status counts", table.status_counts)
+timed("first 100 expiring within 14 days",
+      lambda: len(table.query(expires_before=NOW + 14 * 86400, limit=100)))